@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cold-start regression check: time a fresh `import server` and a fresh
+uvicorn start until the first API response, each in a new interpreter.
+
+Exits non-zero when the median time to first response exceeds the budget,
+so it can gate CI. With --importtime it also prints the slowest top-level
+imports (from `python -X importtime`) to show what to make lazy next.
+
+Runs on SQLite in a scratch file so no database server is needed.
+
+Usage (from backend/):
+    python benchmarks/bench_cold_start.py [--runs 5] [--budget-ms 3000] [--importtime]
+    COLD_START_BUDGET_MS=2500 python benchmarks/bench_cold_start.py
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def bench_env(scratch: Path) -> dict:
+    env = dict(os.environ)
+    env.setdefault("STORAGE_BACKEND", "sqlite")
+    env["SQLITE_PATH"] = str(scratch / "cold_start.db")
+    env["DB_NAME"] = "tactical_panel_bench"
+    return env
+
+
+def time_import(env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return (time.perf_counter() - started) * 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_response(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/auth/check-first-run"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    response.read()
+                return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def top_imports(env: dict, limit: int) -> list:
+    """Slowest packages imported directly by server.py, by cumulative import time"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # Two spaces of indent per nesting level; level 1 is what server.py imports itself,
+        # deeper entries are already counted in their parent's cumulative time
+        name = parts[2][1:]
+        if not name.startswith("  ") or name.startswith("   "):
+            continue
+        top = name.strip().split(".")[0]
+        packages[top] = packages.get(top, 0) + int(parts[1])
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark panel cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("COLD_START_BUDGET_MS", "3000")))
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = bench_env(Path(tempfile.mkdtemp()))
+    # Warm the bytecode cache so every measured run is equally cold otherwise
+    time_import(env)
+
+    imports = [time_import(env) for _ in range(args.runs)]
+    first_responses = [time_first_response(env) for _ in range(args.runs)]
+
+    print(f"{'phase':<22}{'median':>10}{'min':>10}{'max':>10}")
+    for label, samples in (("import server", imports), ("first response", first_responses)):
+        print(f"{label:<22}{statistics.median(samples):>8.0f}ms{min(samples):>8.0f}ms{max(samples):>8.0f}ms")
+
+    if args.importtime:
+        print("\nSlowest imports (cumulative):")
+        for package, micros in top_imports(env, args.top):
+            print(f"  {package:<28}{micros / 1000:>8.1f}ms")
+
+    median = statistics.median(first_responses)
+    if median > args.budget_ms:
+        print(f"\nFAIL: median first response {median:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+        sys.exit(1)
+    print(f"\nOK: median first response {median:.0f}ms within budget {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
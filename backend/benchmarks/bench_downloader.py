@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark the streaming downloader against a local HTTP stand-in.
+
+Serves a generated .tar.gz from a local server that supports Range requests
+and can drop every connection after a number of bytes (--drop-every) or
+ignore Range (--ignore-range). Times the old approach (download the archive
+to a temp file, then extract it) against Downloader.fetch_tar_gz (extract
+while downloading, resuming after drops), and checks both produce the same
+files and that the checksum verified.
+
+Usage (from backend/):
+    python benchmarks/bench_downloader.py
+    python benchmarks/bench_downloader.py --size-mb 200 --drop-every 20000000 --runs 3
+"""
+
+import argparse
+import asyncio
+import hashlib
+import http.server
+import io
+import random
+import statistics
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from downloader import Downloader  # noqa: E402
+
+
+def build_archive(size_mb: int) -> bytes:
+    """A .tar.gz of a few files, half random (incompressible) and half text"""
+    rng = random.Random(1)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        per_file = size_mb * 1024 * 1024 // 8
+        for i in range(8):
+            if i % 2:
+                data = rng.randbytes(per_file)
+            else:
+                data = (b"steamcmd line %d\n" % i) * (per_file // 16)
+            info = tarfile.TarInfo(f"bundle/file{i}.bin")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        script = b"#!/bin/sh\necho steamcmd\n"
+        info = tarfile.TarInfo("steamcmd.sh")
+        info.size = len(script)
+        info.mode = 0o755
+        tar.addfile(info, io.BytesIO(script))
+    return buffer.getvalue()
+
+
+def serve(archive: bytes, drop_every: int, ignore_range: bool):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start = requested = 0
+            header = self.headers.get("Range")
+            if header:
+                requested = int(header.split("=")[1].split("-")[0])
+            if requested and not ignore_range:
+                start = requested
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(archive) - 1}/{len(archive)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(archive) - start))
+            self.end_headers()
+            # Drop drop_every bytes past what was asked for, so every attempt makes progress
+            end = len(archive) if not drop_every else min(len(archive), requested + drop_every)
+            self.wfile.write(archive[start:end])
+            if end < len(archive):
+                self.close_connection = True
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def baseline(url: str, target: Path) -> float:
+    """The previous approach: stream to a temp file, then extract in a second pass"""
+    started = time.perf_counter()
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as archive:
+        async with httpx.AsyncClient(timeout=60) as http:
+            async with http.stream("GET", url) as response:
+                async for chunk in response.aiter_bytes(256 * 1024):
+                    archive.write(chunk)
+        archive.flush()
+        await asyncio.to_thread(lambda: tarfile.open(archive.name, "r:gz").extractall(target, filter="data"))
+    return time.perf_counter() - started
+
+
+def tree_digest(root: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(root.rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(root)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--drop-every", type=int, default=0, help="close each connection after this many bytes")
+    parser.add_argument("--ignore-range", action="store_true")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    archive = build_archive(args.size_mb)
+    sha256 = hashlib.sha256(archive).hexdigest()
+    print(f"archive: {len(archive) / 1e6:.1f} MB, sha256 {sha256[:16]}...")
+
+    downloader = Downloader(retries=1000)
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch = Path(scratch)
+        clean = serve(archive, 0, False)
+        url = f"http://127.0.0.1:{clean.server_address[1]}/steamcmd_linux.tar.gz"
+        base_times = []
+        for run in range(args.runs):
+            target = scratch / f"base{run}"
+            base_times.append(await baseline(url, target))
+        expected = tree_digest(scratch / "base0")
+
+        faulty = serve(archive, args.drop_every, args.ignore_range)
+        url = f"http://127.0.0.1:{faulty.server_address[1]}/steamcmd_linux.tar.gz"
+        stream_times, results = [], []
+        for run in range(args.runs):
+            target = scratch / f"stream{run}"
+            started = time.perf_counter()
+            results.append(await downloader.fetch_tar_gz(url, target, expected_sha256=sha256))
+            stream_times.append(time.perf_counter() - started)
+            assert tree_digest(target) == expected, "extracted files differ"
+
+        clean.shutdown()
+        faulty.shutdown()
+
+    last = results[-1]
+    print(f"download then extract: median {statistics.median(base_times) * 1000:8.1f} ms (no faults)")
+    print(f"streaming extract:     median {statistics.median(stream_times) * 1000:8.1f} ms "
+          f"(resumes {last['resumes']}, first byte {last['first_byte_ms']} ms, {last['throughput_mbps']} Mbit/s)")
+    print("checksum verified, extracted trees identical")
+    print("downloader stats:", {k: v for k, v in downloader.status().items() if k != "recent"})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark hot-path lookups with and without the declared indexes.
+
+Seeds a scratch database with N users, servers and mods, times the queries the
+API makes on every request, then builds the indexes from db_indexes.py and
+times them again.
+
+Usage (from backend/, needs a reachable MongoDB):
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_index_lookups.py
+    python benchmarks/bench_index_lookups.py --sizes 10000 100000 --queries 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from db_indexes import ensure_indexes  # noqa: E402
+
+BENCH_DB = "tactical_panel_bench"
+BATCH_SIZE = 5000
+
+
+async def seed(db, size: int) -> dict:
+    """Insert size users, servers and mods; return sample keys to look up"""
+    await db.client.drop_database(BENCH_DB)
+
+    admin_ids = [str(uuid.uuid4()) for _ in range(max(1, size // 100))]
+    users, servers, mods = [], [], []
+    for i in range(size):
+        user_id = str(uuid.uuid4())
+        server_id = str(uuid.uuid4())
+        users.append({
+            "id": user_id,
+            "username": f"user{i}",
+            "is_admin": False,
+            "is_sub_admin": True,
+            "parent_admin_id": random.choice(admin_ids),
+        })
+        servers.append({"id": server_id, "user_id": user_id, "name": f"server{i}"})
+        mods.append({"id": str(uuid.uuid4()), "server_id": server_id, "workshop_id": str(i)})
+
+    for collection, docs in (("users", users), ("servers", servers), ("mods", mods)):
+        for start in range(0, len(docs), BATCH_SIZE):
+            await db[collection].insert_many(docs[start:start + BATCH_SIZE])
+
+    return {"users": users, "servers": servers, "admin_ids": admin_ids}
+
+
+async def time_queries(db, samples: dict, queries: int) -> dict:
+    """Median latency in ms of each hot query"""
+    cases = {
+        "users by username": lambda: db.users.find_one(
+            {"username": random.choice(samples["users"])["username"]}, {"_id": 0}),
+        "users by id": lambda: db.users.find_one(
+            {"id": random.choice(samples["users"])["id"]}, {"_id": 0}),
+        "server by id+owner": lambda: _server_lookup(db, random.choice(samples["servers"])),
+        "mods by server": lambda: db.mods.find(
+            {"server_id": random.choice(samples["servers"])["id"]}, {"_id": 0}).to_list(1000),
+        "sub-admins by parent": lambda: db.users.find(
+            {"parent_admin_id": random.choice(samples["admin_ids"]), "is_sub_admin": True},
+            {"_id": 0}).to_list(1000),
+    }
+
+    results = {}
+    for name, query in cases.items():
+        timings = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            await query()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def _server_lookup(db, server: dict):
+    return db.servers.find_one({"id": server["id"], "user_id": server["user_id"]}, {"_id": 0})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[BENCH_DB]
+
+    try:
+        for size in args.sizes:
+            print(f"\nSeeding {size} documents per collection...")
+            samples = await seed(db, size)
+            before = await time_queries(db, samples, args.queries)
+            await ensure_indexes(db)
+            after = await time_queries(db, samples, args.queries)
+
+            print(f"{'query':<24}{'no index ms':>14}{'indexed ms':>14}{'speedup':>10}")
+            for name in before:
+                speedup = before[name] / after[name] if after[name] else float("inf")
+                print(f"{name:<24}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measure GET /api/servers at 1k and 10k servers: the lean path (projection plus
+direct JSON encoding) against the previous response_model path, which
+validated every document through ServerInstance and re-serialized it.
+
+Runs on the configured storage backend (SQLite in a scratch file by default).
+
+Usage (from backend/):
+    python benchmarks/bench_list_serialization.py [--sizes 1000 10000] [--requests 20]
+    STORAGE_BACKEND=mongo MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_list_serialization.py
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", str(Path(tempfile.mkdtemp()) / "bench.db"))
+os.environ["DB_NAME"] = "tactical_panel_bench"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark list response serialization")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from fastapi import Depends
+    from fastapi.testclient import TestClient
+    import server
+
+    # The pre-optimization route, kept here only for comparison
+    @server.app.get("/bench/servers-validated", response_model=List[server.ServerInstance])
+    async def validated_servers(current_user: dict = Depends(server.get_current_user)):
+        return await server.db.servers.find(
+            {"user_id": current_user["user_id"]}, {"_id": 0}
+        ).sort("created_at", 1).to_list(None)
+
+    async def reset():
+        await server.client.drop_database(os.environ["DB_NAME"])
+
+    async def seed(user_id: str, count: int, start: int):
+        docs = [
+            server.ServerInstance(
+                name=f"bench-{i}", game_type="arma_reforger", port=2001 + i, max_players=64,
+                install_path=f"/opt/arma/{i}", user_id=user_id
+            ).model_dump()
+            for i in range(start, count)
+        ]
+        for offset in range(0, len(docs), 1000):
+            await server.db.servers.insert_many(docs[offset:offset + 1000])
+
+    with TestClient(server.app) as client:
+        client.portal.call(reset)
+        client.portal.call(server.init_database)
+        setup = client.post("/api/auth/first-time-setup", json={
+            "username": "benchadmin", "password": "Bench-Passw0rd!", "security_questions": {"q": "a"}
+        })
+        setup.raise_for_status()
+        token = setup.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = server.jwt.decode(token, options={"verify_signature": False})["sub"]
+
+        print(f"{'servers':>8}{'path':>12}{'median ms':>12}{'p95 ms':>10}{'bytes':>11}")
+        seeded = 0
+        for size in sorted(args.sizes):
+            client.portal.call(seed, user_id, size, seeded)
+            seeded = size
+            for label, url in (("validated", "/bench/servers-validated"), ("lean", "/api/servers")):
+                client.get(url, headers=headers).raise_for_status()
+                timings = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    response.raise_for_status()
+                timings.sort()
+                p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+                print(f"{size:>8}{label:>12}{statistics.median(timings):>12.1f}{p95:>10.1f}{len(response.content):>11}")
+
+        client.portal.call(reset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compare per-request API latency on the MongoDB and SQLite storage backends.
+
+Each backend runs in its own process against a scratch database: the script
+creates an admin, seeds servers and mods, then times the dashboard's hot
+requests through the ASGI app in-process (no network between client and app).
+
+Usage (from backend/):
+    python benchmarks/bench_storage_backends.py                  # both backends
+    python benchmarks/bench_storage_backends.py --backends sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_storage_backends.py --requests 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BENCH_DB = "tactical_panel_bench"
+
+
+def run_backend(requests: int, servers: int, mods: int) -> dict:
+    """Runs inside the child process with STORAGE_BACKEND already set"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+    import server
+
+    timings = {}
+
+    def timed(name, call):
+        start = time.perf_counter()
+        response = call()
+        timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        return response
+
+    with TestClient(server.app) as client:
+        setup = client.post("/api/auth/first-time-setup", json={
+            "username": "benchadmin",
+            "password": "Bench-Passw0rd!",
+            "security_questions": {"question1": "a"},
+        })
+        setup.raise_for_status()
+        headers = {"Authorization": f"Bearer {setup.json()['access_token']}"}
+
+        server_ids = []
+        for i in range(servers):
+            created = client.post("/api/servers", headers=headers, json={
+                "name": f"bench-{i}", "game_type": "arma_reforger",
+                "max_players": 64, "install_path": f"/tmp/bench/{i}",
+            })
+            server_ids.append(created.json()["id"])
+        mod_ids = []
+        for i in range(mods):
+            created = client.post(f"/api/servers/{server_ids[0]}/mods", headers=headers,
+                                  json={"workshop_id": str(i), "name": f"mod-{i}"})
+            mod_ids.append(created.json()["id"])
+
+        for i in range(requests):
+            server_id = server_ids[i % len(server_ids)]
+            timed("GET /servers", lambda: client.get("/api/servers", headers=headers))
+            timed("GET /servers/{id}", lambda: client.get(f"/api/servers/{server_id}", headers=headers))
+            timed("GET /servers/{id}/mods", lambda: client.get(f"/api/servers/{server_ids[0]}/mods", headers=headers))
+            timed("PATCH mod toggle", lambda: client.patch(
+                f"/api/servers/{server_ids[0]}/mods/{mod_ids[i % len(mod_ids)]}/toggle", headers=headers))
+            timed("PATCH /servers/{id}", lambda: client.patch(
+                f"/api/servers/{server_id}", headers=headers, json={"current_players": i % 64}))
+
+    return {
+        name: {
+            "median_ms": statistics.median(values),
+            "p95_ms": sorted(values)[int(len(values) * 0.95) - 1],
+        }
+        for name, values in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare storage backend request latency")
+    parser.add_argument("--backends", nargs="+", default=["mongo", "sqlite"], choices=["mongo", "sqlite"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--servers", type=int, default=50)
+    parser.add_argument("--mods", type=int, default=100)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.requests, args.servers, args.mods)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for backend in args.backends:
+            # Placement limits would otherwise cap the seeded servers at what this machine fits
+            env = dict(os.environ, STORAGE_BACKEND=backend, DB_NAME=BENCH_DB,
+                       SQLITE_PATH=str(Path(scratch) / "bench.db"), BCRYPT_ROUNDS="4",
+                       PLACEMENT_CPU_OVERCOMMIT="100", PLACEMENT_RAM_RESERVE_GB="-1000")
+            if backend == "mongo":
+                env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+                _drop_mongo_db(env["MONGO_URL"])
+            child = subprocess.run(
+                [sys.executable, __file__, "--child", "--requests", str(args.requests),
+                 "--servers", str(args.servers), "--mods", str(args.mods)],
+                env=env, capture_output=True, text=True, cwd=BACKEND_DIR
+            )
+            if backend == "mongo":
+                _drop_mongo_db(env["MONGO_URL"])
+            if child.returncode != 0:
+                print(f"{backend}: failed\n{child.stderr[-2000:]}")
+                continue
+            results[backend] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    if not results:
+        sys.exit(1)
+    names = next(iter(results.values())).keys()
+    header = f"{'request':<24}" + "".join(f"{b + ' median':>16}{b + ' p95':>14}" for b in results)
+    print(header)
+    for name in names:
+        row = f"{name:<24}"
+        for backend in results:
+            stats = results[backend][name]
+            row += f"{stats['median_ms']:>16.2f}{stats['p95_ms']:>14.2f}"
+        print(row)
+
+
+def _drop_mongo_db(mongo_url: str):
+    from pymongo import MongoClient
+    try:
+        MongoClient(mongo_url, serverSelectionTimeoutMS=2000).drop_database(BENCH_DB)
+    except Exception as e:
+        print(f"mongo: cannot reach {mongo_url} ({e})")
+
+
+if __name__ == "__main__":
+    main()
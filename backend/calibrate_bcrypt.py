@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Bcrypt cost calibration for Tactical Command Panel
+
+Measures how long a bcrypt hash takes on this host at each cost factor and
+recommends the highest cost that still meets the target login latency.
+
+Usage:
+    python calibrate_bcrypt.py                  # target 250 ms
+    python calibrate_bcrypt.py --target-ms 500
+    python calibrate_bcrypt.py --write-env      # save BCRYPT_ROUNDS to .env
+
+Existing password hashes below the chosen cost are upgraded transparently
+the next time their owner logs in.
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import bcrypt
+
+ROOT_DIR = Path(__file__).parent
+MIN_ROUNDS = 10  # Never recommend anything weaker than this
+MAX_ROUNDS = 16
+SAMPLE_PASSWORD = b"Calibration-Passw0rd!"
+
+
+def measure_rounds(rounds: int, samples: int) -> float:
+    """Return the median hash time in milliseconds for a cost factor"""
+    timings = []
+    for _ in range(samples):
+        salt = bcrypt.gensalt(rounds=rounds)
+        start = time.perf_counter()
+        bcrypt.hashpw(SAMPLE_PASSWORD, salt)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, samples: int) -> int:
+    """Pick the highest cost whose median hash time fits the target"""
+    recommended = MIN_ROUNDS
+    print(f"{'rounds':>6}  {'median ms':>10}")
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        elapsed = measure_rounds(rounds, samples)
+        print(f"{rounds:>6}  {elapsed:>10.1f}")
+        if elapsed > target_ms:
+            break
+        recommended = rounds
+        # Each extra round doubles the cost, so skip timing one that cannot fit
+        if elapsed * 2 > target_ms:
+            break
+    return recommended
+
+
+def write_env(rounds: int):
+    """Set BCRYPT_ROUNDS in backend/.env, keeping every other line"""
+    env_file = ROOT_DIR / ".env"
+    lines = env_file.read_text().splitlines() if env_file.exists() else []
+    lines = [line for line in lines if not line.startswith("BCRYPT_ROUNDS=")]
+    lines.append(f"BCRYPT_ROUNDS={rounds}")
+    env_file.write_text("\n".join(lines) + "\n")
+    print(f"Wrote BCRYPT_ROUNDS={rounds} to {env_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate bcrypt cost for this host")
+    parser.add_argument("--target-ms", type=float, default=250.0,
+                        help="Target hash time per login in milliseconds (default: 250)")
+    parser.add_argument("--samples", type=int, default=3,
+                        help="Hashes to time per cost factor (default: 3)")
+    parser.add_argument("--write-env", action="store_true",
+                        help="Save the recommendation to backend/.env")
+    args = parser.parse_args()
+
+    rounds = calibrate(args.target_ms, args.samples)
+    print(f"\nRecommended: BCRYPT_ROUNDS={rounds}")
+
+    if args.write_env:
+        write_env(rounds)
+    else:
+        print("Add this to backend/.env and restart the backend to apply it.")
+
+
+if __name__ == "__main__":
+    main()
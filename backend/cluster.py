@@ -0,0 +1,173 @@
+"""
+Coordination between panel workers that share one database.
+
+uvicorn --workers N, or several panel instances pointed at the same
+database, gives every worker its own process, memory and event loop. Two
+things are shared through the database so they still behave as one panel:
+
+- LeaderLease: a renewable lease document in `leases`. At most one worker
+  holds it; it expires unless renewed, so a crashed holder is replaced
+  within lease_seconds. Every new holder gets a higher term number.
+- ClusterEvents: a broadcast log for in-process state (ETag versions, the
+  dashboard cache, the ownership cache, session revocations). Publishing
+  appends to one capped document in a single atomic update; every worker
+  polls its sequence number and applies entries it did not publish itself.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+HOSTNAME = socket.gethostname()
+# Unique per worker process, also across restarts that reuse a pid
+WORKER_ID = f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+EVENTS_DOC_ID = "events"
+EVENTS_CAPACITY = 256
+
+
+class LeaderLease:
+    def __init__(self, db, name: str, lease_seconds: float = 10.0):
+        self.db = db
+        self.name = name
+        self.lease_seconds = lease_seconds
+        # Renew well inside the lease so one slow round trip does not lose it
+        self.renew_interval = lease_seconds / 3
+        self.is_leader = False
+        self.term = 0
+        self.elections_won = 0
+
+    async def acquire_or_renew(self) -> bool:
+        """Take the lease if it is free or expired, or extend it if we hold it"""
+        now = datetime.now(timezone.utc)
+        fields = {
+            "holder": WORKER_ID,
+            "host": HOSTNAME,
+            "pid": os.getpid(),
+            "renewed_at": now,
+            "expires_at": now + timedelta(seconds=self.lease_seconds),
+        }
+
+        if self.is_leader:
+            lease = await self.db.leases.find_one_and_update(
+                {"id": self.name, "holder": WORKER_ID, "term": self.term},
+                {"$set": fields},
+                projection={"_id": 0, "term": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if lease is None:
+                logger.warning(f"Lost lease {self.name} (term {self.term})")
+                self.is_leader = False
+            return self.is_leader
+
+        try:
+            lease = await self.db.leases.find_one_and_update(
+                {"id": self.name, "$or": [{"expires_at": {"$lte": now}}, {"holder": WORKER_ID}]},
+                {"$set": {**fields, "acquired_at": now}, "$inc": {"term": 1}},
+                projection={"_id": 0, "term": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The lease document exists and someone else holds it
+            return False
+
+        self.is_leader = True
+        self.term = lease["term"]
+        self.elections_won += 1
+        logger.info(f"Acquired lease {self.name} as {WORKER_ID} (term {self.term})")
+        return True
+
+    def step_down(self):
+        self.is_leader = False
+
+    async def release(self):
+        """Expire our lease now so another worker takes over without waiting"""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        await self.db.leases.update_one(
+            {"id": self.name, "holder": WORKER_ID, "term": self.term},
+            {"$set": {"expires_at": datetime.now(timezone.utc)}}
+        )
+
+    async def current(self) -> dict:
+        return await self.db.leases.find_one({"id": self.name}, {"_id": 0})
+
+
+class ClusterEvents:
+    def __init__(self, db, poll_interval: float = 0.2):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.handlers: dict = {}  # kind -> callable(data)
+        self.on_resync = None  # async callable, run when entries were missed
+        self.seq = None
+        self.published = 0
+        self.applied = 0
+        self.resyncs = 0
+        self._lock = asyncio.Lock()
+
+    def on(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    async def publish(self, kind: str, data: dict):
+        await self.db.cluster_events.update_one(
+            {"id": EVENTS_DOC_ID},
+            {
+                "$inc": {"seq": 1},
+                "$push": {"events": {
+                    "$each": [{"origin": WORKER_ID, "kind": kind, "data": data}],
+                    "$slice": -EVENTS_CAPACITY
+                }}
+            },
+            upsert=True
+        )
+        self.published += 1
+
+    async def poll(self):
+        """Apply entries published by other workers since the last poll"""
+        async with self._lock:
+            head = await self.db.cluster_events.find_one({"id": EVENTS_DOC_ID}, {"_id": 0, "seq": 1})
+            seq = head["seq"] if head else 0
+            if self.seq is None:
+                # First poll: state was just loaded from the database, start from here
+                self.seq = seq
+                return
+            if seq == self.seq:
+                return
+
+            doc = await self.db.cluster_events.find_one({"id": EVENTS_DOC_ID}, {"_id": 0, "seq": 1, "events": 1})
+            missed = doc["seq"] - self.seq
+            self.seq = doc["seq"]
+            events = doc.get("events", [])
+            if missed > len(events):
+                # Fell further behind than the log keeps; rebuild local state instead
+                self.resyncs += 1
+                logger.warning(f"Missed {missed - len(events)} cluster events, resynchronising")
+                if self.on_resync is not None:
+                    await self.on_resync()
+                return
+
+            for event in events[-missed:]:
+                if event["origin"] == WORKER_ID:
+                    continue
+                handler = self.handlers.get(event["kind"])
+                if handler is not None:
+                    handler(event["data"])
+                    self.applied += 1
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Cluster event poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,291 @@
+"""
+Negotiated response compression (zstd, brotli, gzip) as ASGI middleware.
+
+- Bodies under the size threshold, already-encoded responses, 204/304s and
+  non-text content types pass through untouched
+- Whole bodies are compressed in one shot, in a worker thread once they are
+  large enough to stall the event loop
+- Streamed responses (more_body) are compressed incrementally and flushed
+  after every chunk, so NDJSON consumers see each line as it is sent
+- Responses carrying an ETag are cached compressed per (path, ETag,
+  encoding), so static-ish payloads such as the changelog are compressed once
+
+brotli and zstandard are optional; without them only gzip is offered.
+"""
+
+import asyncio
+import gzip
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Process-wide counters, reported by /system/cache-stats
+compression_stats = {
+    "responses": 0,
+    "streamed": 0,
+    "offloaded": 0,
+    "cache_hits": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+}
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_encodings() -> list:
+    """Supported encodings, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def choose_encoding(accept_encoding: str, supported: list):
+    """Pick the client's highest-q encoding we support; ties go to our preference order"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        offload_size: int = 256 * 1024,
+        cache_entries: int = 128,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.cache_entries = cache_entries
+        self.levels = {"gzip": gzip_level, "br": brotli_quality, "zstd": zstd_level}
+        self.encodings = available_encodings()
+        self.cache: OrderedDict = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def stream(self, encoding: str):
+        level = self.levels[encoding]
+        if encoding == "zstd":
+            return _ZstdStream(level)
+        if encoding == "br":
+            return _BrotliStream(level)
+        return _GzipStream(level)
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        level = self.levels[encoding]
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=level).compress(body)
+        if encoding == "br":
+            return brotli.compress(body, quality=level)
+        return gzip.compress(body, compresslevel=level, mtime=0)
+
+    async def compress_body(self, encoding: str, body: bytes, cache_key=None) -> bytes:
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache.move_to_end(cache_key)
+                compression_stats["cache_hits"] += 1
+                return cached
+
+        if len(body) >= self.offload_size:
+            compression_stats["offloaded"] += 1
+            compressed = await asyncio.to_thread(self.compress, encoding, body)
+        else:
+            compressed = self.compress(encoding, body)
+
+        if cache_key is not None:
+            self.cache[cache_key] = compressed
+            if len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return compressed
+
+
+class _CompressingResponder:
+    """Wraps `send` for one request, deciding on the first body message"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: str, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.passthrough = False
+        self.stream = None
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+        if self.stream is not None:
+            await self._send_stream_chunk(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._compressible(headers):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body and len(body) < self.middleware.minimum_size:
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The encoded bytes differ from the identity representation
+            headers["ETag"] = f"W/{etag}"
+        compression_stats["responses"] += 1
+
+        if not more_body:
+            cache_key = None
+            if etag:
+                cache_key = (self.scope["path"], self.scope.get("query_string", b""), etag, self.encoding)
+            compressed = await self.middleware.compress_body(self.encoding, body, cache_key)
+            compression_stats["bytes_in"] += len(body)
+            compression_stats["bytes_out"] += len(compressed)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        compression_stats["streamed"] += 1
+        del headers["Content-Length"]
+        self.stream = self.middleware.stream(self.encoding)
+        await self._send(self.start_message)
+        await self._send_stream_chunk(message)
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self.start_message["status"] in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _send_stream_chunk(self, message):
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        compression_stats["bytes_in"] += len(body)
+
+        if len(body) >= self.middleware.offload_size:
+            compressed = await asyncio.to_thread(self.stream.compress, body)
+        else:
+            compressed = self.stream.compress(body)
+        # A chunk is a unit the app chose to send now (a log line, a job event),
+        # so it must not sit in the compressor waiting for more input
+        if not more_body:
+            compressed += self.stream.finish()
+        elif body:
+            compressed += self.stream.flush()
+
+        if compressed or not more_body:
+            compression_stats["bytes_out"] += len(compressed)
+            await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
@@ -0,0 +1,313 @@
+"""
+Server config files: a stat-validated read cache, atomic writes, and
+partial updates of JSON configs.
+
+Opening the config editor used to mkdir, stat and read the file on every
+request. ConfigFiles keeps each file's text (and, for JSON, its parsed form)
+keyed by path. An entry is only served while the file's mtime, size and
+inode are unchanged, so edits made outside the panel are picked up on the
+next read.
+
+Writes go to a fsynced temp file renamed over the original. Every write
+therefore gets a new inode, and the version tag ("mtime-size-inode") changes
+even when two writes land within the filesystem's timestamp granularity.
+Updates take an flock on a sidecar lock file, so the If-Match check, the
+read and the write are one step across panel workers.
+
+JSON configs can be updated with a JSON Patch (RFC 6902, a list of ops) or
+a JSON merge patch (RFC 7396, an object of changed keys), so clients send
+only what changed.
+"""
+
+import copy
+import fcntl
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+MAX_ENTRIES = 512
+
+
+class PatchError(ValueError):
+    """The patch is malformed or addresses something that does not exist"""
+
+
+class PatchConflict(PatchError):
+    """A JSON Patch "test" op failed against the current document"""
+
+
+class VersionMismatch(Exception):
+    """If-Match did not match the file's current version"""
+
+    def __init__(self, current: str):
+        super().__init__(current)
+        self.current = current
+
+
+def version_tag(stat) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{stat.st_ino:x}"'
+
+
+def write_atomic(path: Path, content: str):
+    """Write via a fsynced temp file renamed over path"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive flock on a sidecar of path, shared by every worker (blocking)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f".{path.name}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+# -- JSON Pointer / JSON Patch / merge patch ---------------------------------------
+
+def _pointer(path) -> list:
+    if not isinstance(path, str) or (path and not path.startswith("/")):
+        raise PatchError(f"Invalid JSON Pointer: {path!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path.split("/")[1:]]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _parent(doc, tokens: list, path: str):
+    """The container holding the pointer's last token"""
+    target = doc
+    for token in tokens[:-1]:
+        if isinstance(target, dict) and token in target:
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_index(target, token)]
+        else:
+            raise PatchError(f"Path not found: {path}")
+    if not isinstance(target, (dict, list)):
+        raise PatchError(f"Path not found: {path}")
+    return target
+
+
+def _get(doc, path: str):
+    target = doc
+    for token in _pointer(path):
+        if isinstance(target, dict) and token in target:
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_index(target, token)]
+        else:
+            raise PatchError(f"Path not found: {path}")
+    return target
+
+
+def _add(doc, path: str, value):
+    tokens = _pointer(path)
+    if not tokens:
+        return value
+    parent = _parent(doc, tokens, path)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        parent[tokens[-1]] = value
+    return doc
+
+
+def _remove(doc, path: str):
+    tokens = _pointer(path)
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent = _parent(doc, tokens, path)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, tokens[-1]))
+    if tokens[-1] not in parent:
+        raise PatchError(f"Path not found: {path}")
+    return parent.pop(tokens[-1])
+
+
+def apply_json_patch(doc, operations: list):
+    """Apply RFC 6902 operations to doc (mutated in place); returns the result"""
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be a list of operations")
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise PatchError(f"Invalid operation: {operation!r}")
+        op, path = operation["op"], operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"{op} needs a value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise PatchError(f"{op} needs a from")
+        if op == "add":
+            doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(doc, path)
+        elif op == "replace":
+            if not _pointer(path):
+                doc = copy.deepcopy(operation["value"])
+                continue
+            _get(doc, path)  # must exist
+            _remove(doc, path)
+            doc = _add(doc, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = operation["from"]
+            if path != source and path.startswith(source + "/"):
+                raise PatchError(f"Cannot move {source} into itself")
+            doc = _add(doc, path, _remove(doc, source))
+        elif op == "copy":
+            doc = _add(doc, path, copy.deepcopy(_get(doc, operation["from"])))
+        elif op == "test":
+            if _get(doc, path) != operation["value"]:
+                raise PatchConflict(f"Test failed at {path}")
+        else:
+            raise PatchError(f"Unknown op: {op!r}")
+    return doc
+
+
+def apply_merge_patch(target, patch):
+    """Apply an RFC 7396 merge patch; returns the result (target may be mutated)"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    if not isinstance(target, dict):
+        target = {}
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = apply_merge_patch(target.get(key), value)
+    return target
+
+
+def patched_paths(kind: str, patch) -> set:
+    """Top-level keys a patch touches"""
+    if kind == "merge":
+        return set(patch) if isinstance(patch, dict) else {""}
+    keys = set()
+    for operation in patch if isinstance(patch, list) else []:
+        for field in ("path", "from"):
+            if isinstance(operation, dict) and isinstance(operation.get(field), str):
+                tokens = operation[field].split("/")
+                keys.add(tokens[1].replace("~1", "/").replace("~0", "~") if len(tokens) > 1 else "")
+    return keys
+
+
+# -- the cache ---------------------------------------------------------------------
+
+class ConfigFiles:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # path -> {"key", "version", "text", "json"}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "conflicts": 0}
+
+    def _entry(self, path: Path):
+        """Current cache entry for path, re-reading the file if it changed (blocking)"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self.entries.pop(str(path), None)
+            return None
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            entry = self.entries.get(str(path))
+            if entry is not None and entry["key"] == key:
+                self.entries.move_to_end(str(path))
+                self.stats["hits"] += 1
+                return entry
+        text = path.read_text()
+        # stat before reading: a write landing in between yields a stale tag, never a stale body
+        entry = {"key": key, "version": version_tag(stat), "text": text, "json": None}
+        self._store(path, entry)
+        self.stats["misses"] += 1
+        return entry
+
+    def _store(self, path: Path, entry: dict):
+        with self._lock:
+            self.entries[str(path)] = entry
+            self.entries.move_to_end(str(path))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def read(self, path) -> tuple:
+        """(text, version) of a file, or (None, None) if it does not exist (blocking)"""
+        entry = self._entry(Path(path))
+        return (None, None) if entry is None else (entry["text"], entry["version"])
+
+    def read_json(self, path) -> tuple:
+        """(parsed copy, version); raises ValueError if the file is not valid JSON (blocking)"""
+        entry = self._entry(Path(path))
+        if entry is None:
+            return None, None
+        if entry["json"] is None:
+            entry["json"] = json.loads(entry["text"])
+        return copy.deepcopy(entry["json"]), entry["version"]
+
+    def write(self, path, text: str, if_match: str = None) -> str:
+        """Atomically replace a file, unless If-Match is stale; returns the new version (blocking)"""
+        path = Path(path)
+        with file_lock(path):
+            self._check(path, if_match)
+            return self._write(path, text)
+
+    def create(self, path, text: str) -> tuple:
+        """Write text only if the file does not exist yet; returns read()'s (text, version) (blocking)"""
+        path = Path(path)
+        with file_lock(path):
+            if not path.exists():
+                self._write(path, text)
+            return self.read(path)
+
+    def update_json(self, path, change, if_match: str = None) -> tuple:
+        """Read, change(doc) -> new doc, write, all under the file lock; returns (doc, version) (blocking)"""
+        path = Path(path)
+        with file_lock(path):
+            self._check(path, if_match)
+            doc, _ = self.read_json(path)
+            if doc is None:
+                raise FileNotFoundError(path)
+            doc = change(doc)
+            version = self._write(path, json.dumps(doc, indent=2))
+            return doc, version
+
+    def _check(self, path: Path, if_match: str):
+        if not if_match or (if_match.strip() == "*" and path.exists()):
+            return
+        try:
+            current = version_tag(path.stat())
+        except FileNotFoundError:
+            current = None
+        # The compression middleware weakens the ETag of encoded responses, so a
+        # client echoes W/"..."; the tag still names this file's version
+        tags = [tag.strip().removeprefix("W/") for tag in if_match.split(",")]
+        if current is None or current not in tags:
+            self.stats["conflicts"] += 1
+            raise VersionMismatch(current)
+
+    def _write(self, path: Path, text: str) -> str:
+        write_atomic(path, text)
+        stat = path.stat()
+        version = version_tag(stat)
+        self._store(path, {"key": (stat.st_mtime_ns, stat.st_size, stat.st_ino), "version": version,
+                           "text": text, "json": None})
+        self.stats["writes"] += 1
+        return version
@@ -0,0 +1,178 @@
+"""
+Keeps the `mods` section of each server's configs/server.json in step with
+its enabled mods.
+
+Mods added or toggled through the API used to never reach the game, since
+server.json was only written once. ModListSync regenerates just the `mods`
+list; the rest of the file is left as the admin wrote it. It works
+incrementally:
+
+- Mod writes only mark a server pending. Pending servers are synced
+  together a moment later with one batched query, so a bulk edit of 50
+  servers is one pass, not 50.
+- Each server document records the hash of the mod list last written and
+  the file's mtime. A server whose desired hash and file mtime both match
+  costs a stat() and nothing else. If only the mtime differs, the file is
+  read; it is rewritten only if its mods really differ.
+- Writes go to a temp file that is fsynced and renamed over server.json,
+  so the game never reads half a file.
+
+The hash of the list a running server was started with is kept as
+`running_mods_hash`. `restart_required` is set while that differs from the
+file, so admins can restart servers when convenient instead of after every
+edit.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from config_files import file_lock, write_atomic
+from process_control import default_server_json
+
+logger = logging.getLogger(__name__)
+
+SYNC_DELAY_SECONDS = 0.5  # how long mod writes are coalesced before a sync pass
+
+
+def config_path(server: dict) -> Path:
+    return Path(server["install_path"]) / "configs" / "server.json"
+
+
+def mods_section(mods: list) -> list:
+    """server.json `mods` entries for enabled mods, in the order they were added"""
+    ordered = sorted(mods, key=lambda mod: (str(mod.get("created_at")), mod["id"]))
+    return [{"modId": mod["workshop_id"], "name": mod["name"]} for mod in ordered]
+
+
+def mods_hash(section: list) -> str:
+    return hashlib.sha256(json.dumps(section, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def _apply(server: dict, section: list, digest: str) -> dict:
+    """Bring one server.json's mods up to date (blocking); returns what happened"""
+    if not Path(server["install_path"]).is_dir():
+        return {"changed": False, "skipped": "not installed yet; synced when it starts"}
+    path = config_path(server)
+    # Serialised with config edits through the API (config_files)
+    with file_lock(path):
+        return _apply_locked(server, path, section, digest)
+
+
+def _apply_locked(server: dict, path: Path, section: list, digest: str) -> dict:
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    if mtime_ns is not None and digest == server.get("mods_hash") and mtime_ns == server.get("config_mtime_ns"):
+        return {"changed": False, "mtime_ns": mtime_ns}
+
+    if mtime_ns is None:
+        config = default_server_json(server)
+    else:
+        try:
+            config = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            # Never clobber a file the admin is halfway through editing
+            return {"changed": False, "error": f"{path} is not valid JSON: {e}"}
+        if not isinstance(config, dict):
+            return {"changed": False, "error": f"{path} is not a JSON object"}
+        if mods_hash(config.get("mods") or []) == digest:
+            return {"changed": False, "mtime_ns": mtime_ns}
+
+    config["mods"] = section
+    write_atomic(path, json.dumps(config, indent=2))
+    return {"changed": True, "mtime_ns": path.stat().st_mtime_ns}
+
+
+class ModListSync:
+    def __init__(self, db, servers_changed=None):
+        self.db = db
+        self.servers_changed = servers_changed  # async callable(user_id) after a server document changes
+        self.pending: set = set()
+        self._flush_task = None
+        self.stats = {"passes": 0, "checked": 0, "rewritten": 0, "errors": 0}
+
+    def schedule(self, server_id: str):
+        """Mark a server's mod list changed; synced shortly, together with others"""
+        self.pending.add(server_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        await asyncio.sleep(SYNC_DELAY_SECONDS)
+        server_ids, self.pending = list(self.pending), set()
+        try:
+            await self.sync(server_ids)
+        except Exception as e:
+            logger.warning(f"Mod list sync of {len(server_ids)} servers failed: {e}")
+
+    async def sync(self, server_ids: list) -> list:
+        """Sync the given servers now; returns one report per server"""
+        servers = await self.db.servers.find(
+            {"id": {"$in": server_ids}},
+            {"_id": 0, "id": 1, "user_id": 1, "name": 1, "port": 1, "max_players": 1, "install_path": 1, "node_id": 1,
+             "status": 1, "mods_hash": 1, "running_mods_hash": 1, "config_mtime_ns": 1}
+        ).to_list(None)
+        reports, local = [], []
+        for server in servers:
+            if server.get("node_id"):
+                reports.append({"server_id": server["id"], "skipped": "runs on a node; its server.json is not managed here"})
+            elif not server.get("port"):
+                reports.append({"server_id": server["id"], "skipped": "queued for placement"})
+            else:
+                local.append(server)
+        mods_by_server: dict = {server["id"]: [] for server in local}
+        async for mod in self.db.mods.find(
+            {"server_id": {"$in": list(mods_by_server)}, "enabled": True},
+            {"_id": 0, "id": 1, "server_id": 1, "workshop_id": 1, "name": 1, "created_at": 1}
+        ):
+            mods_by_server[mod["server_id"]].append(mod)
+
+        changed_users = set()
+        plans = []
+        for server in local:
+            section = mods_section(mods_by_server[server["id"]])
+            plans.append((server, section, mods_hash(section)))
+        # One thread hop for the whole batch; most servers cost a stat()
+        results = await asyncio.to_thread(lambda: [_apply(*plan) for plan in plans])
+
+        for (server, section, digest), result in zip(plans, results):
+            self.stats["checked"] += 1
+            report = {"server_id": server["id"], "name": server["name"], "mods": len(section), "changed": result["changed"]}
+            if "error" in result or "skipped" in result:
+                self.stats["errors"] += "error" in result
+                reports.append({**report, **result})
+                continue
+            if result["changed"]:
+                self.stats["rewritten"] += 1
+            running = server.get("running_mods_hash")
+            # Started before mod lists were tracked: only a rewrite makes it stale
+            stale = result["changed"] if running is None else running != digest
+            restart_required = server.get("status") == "online" and stale
+            if (result["changed"] or digest != server.get("mods_hash")
+                    or result["mtime_ns"] != server.get("config_mtime_ns")):
+                await self.db.servers.update_one(
+                    {"id": server["id"]},
+                    {"$set": {"mods_hash": digest, "config_mtime_ns": result["mtime_ns"],
+                              "restart_required": restart_required}}
+                )
+                changed_users.add(server["user_id"])
+            report["restart_required"] = restart_required
+            reports.append(report)
+        if self.servers_changed is not None:
+            for user_id in changed_users:
+                await self.servers_changed(user_id)
+        self.stats["passes"] += 1
+        return reports
+
+    async def started(self, server_id: str):
+        """Record that the server now runs with its current mod list"""
+        server = await self.db.servers.find_one({"id": server_id}, {"_id": 0, "mods_hash": 1})
+        if server is not None:
+            await self.db.servers.update_one(
+                {"id": server_id},
+                {"$set": {"running_mods_hash": server.get("mods_hash"), "restart_required": False}}
+            )
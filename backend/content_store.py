@@ -0,0 +1,319 @@
+"""
+Shared, versioned game server content for every instance on a host.
+
+SteamCMD downloads an app once, into a staging directory per app that is
+kept between updates (so updates are deltas). After each update the staging
+tree is snapshotted into an immutable build directory named after Steam's
+build id:
+
+    <root>/apps/<app_id>/staging/             SteamCMD's force_install_dir
+    <root>/apps/<app_id>/builds/<build_id>/   read-only snapshot
+    <root>/apps/<app_id>/current              id of the newest build
+
+A snapshot copies (or reflinks) only files that changed since the previous
+build; unchanged files are hardlinks to the previous build's. An instance's
+install_path is then "materialized" from a build: every file is a hardlink
+into the build (reflink or copy if configured, or across filesystems), and
+configs/, profiles/ and logs/ stay real per-instance directories. Forty
+servers on one build take the disk space of one, and updating them is one
+download plus forty passes of link() calls.
+
+Build files are made read-only, since every instance shares them.
+"""
+
+import errno
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Per-instance directories that are never shared
+WRITABLE_DIRS = ("configs", "profiles", "logs")
+# SteamCMD's own bookkeeping inside force_install_dir; not part of a build
+STAGING_EXCLUDE = ("steamapps",)
+MARKER_FILE = ".content_build"
+LINK_MODES = ("hardlink", "reflink", "copy")
+FICLONE = 0x40049409  # ioctl: share extents with another file (btrfs, xfs, ...)
+BUILD_ID_RE = re.compile(r'"buildid"\s+"(\d+)"')
+LOCK_POLL_SECONDS = 1.0
+
+
+def _reflink(src: str, dst: str):
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    shutil.copystat(src, dst)
+
+
+def _read_only(path: str):
+    mode = os.lstat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+class ContentStore:
+    def __init__(self, root, link_mode: str = "hardlink"):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode must be one of {LINK_MODES}")
+        self.root = Path(root)
+        self.link_mode = link_mode
+        self.stats = {"snapshots": 0, "materialized": 0, "linked": 0, "copied": 0, "reflinked": 0}
+
+    # -- layout --------------------------------------------------------------------
+
+    def app_dir(self, app_id: str) -> Path:
+        return self.root / "apps" / app_id
+
+    def staging_dir(self, app_id: str) -> Path:
+        return self.app_dir(app_id) / "staging"
+
+    def build_dir(self, app_id: str, build_id: str) -> Path:
+        return self.app_dir(app_id) / "builds" / build_id
+
+    def current_build(self, app_id: str):
+        try:
+            return (self.app_dir(app_id) / "current").read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def builds(self, app_id: str) -> list:
+        builds_dir = self.app_dir(app_id) / "builds"
+        if not builds_dir.is_dir():
+            return []
+        return sorted(p.name for p in builds_dir.iterdir() if p.is_dir() and not p.name.endswith(".tmp"))
+
+    def staged_build_id(self, app_id: str):
+        """Build id SteamCMD recorded for the staging tree"""
+        manifest = self.staging_dir(app_id) / "steamapps" / f"appmanifest_{app_id}.acf"
+        try:
+            match = BUILD_ID_RE.search(manifest.read_text(errors="replace"))
+        except FileNotFoundError:
+            return None
+        return match.group(1) if match else None
+
+    # -- locking -----------------------------------------------------------------
+
+    def try_lock(self, app_id: str):
+        """Exclusive per-app lock across processes; returns the open lock file, or None if held"""
+        self.app_dir(app_id).mkdir(parents=True, exist_ok=True)
+        lock = open(self.app_dir(app_id) / ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    # -- files -------------------------------------------------------------------
+
+    def _place(self, src: str, dst: str, mode: str) -> str:
+        """Create dst as a link/clone/copy of src (dst must not exist); returns how"""
+        if mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return "linked"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        if mode in ("hardlink", "reflink"):
+            try:
+                _reflink(src, dst)
+                return "reflinked"
+            except OSError:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+        shutil.copy2(src, dst)
+        return "copied"
+
+    def snapshot(self, app_id: str, build_id: str) -> dict:
+        """Freeze the staging tree as build `build_id` (blocking; run in a thread)"""
+        staging = self.staging_dir(app_id)
+        final = self.build_dir(app_id, build_id)
+        if final.is_dir():
+            self._set_current(app_id, build_id)
+            return {"build_id": build_id, "created": False}
+        previous = self.current_build(app_id)
+        previous_dir = self.build_dir(app_id, previous) if previous else None
+        target = final.with_name(build_id + ".tmp")
+        if target.exists():
+            shutil.rmtree(target)
+
+        counts = {"linked": 0, "reflinked": 0, "copied": 0, "files": 0, "bytes": 0}
+        for dirpath, dirnames, filenames in os.walk(staging):
+            rel = os.path.relpath(dirpath, staging)
+            if rel == ".":
+                dirnames[:] = [d for d in dirnames if d not in STAGING_EXCLUDE]
+            os.makedirs(os.path.join(target, rel), exist_ok=True)
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.normpath(os.path.join(target, rel, name))
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                    continue
+                st = os.stat(src)
+                counts["files"] += 1
+                counts["bytes"] += st.st_size
+                unchanged = None
+                if previous_dir is not None:
+                    old = os.path.normpath(os.path.join(previous_dir, rel, name))
+                    try:
+                        old_st = os.stat(old)
+                        if old_st.st_size == st.st_size and old_st.st_mtime_ns == st.st_mtime_ns:
+                            unchanged = old
+                    except FileNotFoundError:
+                        pass
+                if unchanged is not None:
+                    # Builds are immutable, so sharing the previous build's inode is safe
+                    how = self._place(unchanged, dst, "hardlink")
+                else:
+                    # Never hardlink staging: SteamCMD may rewrite its files in place
+                    how = self._place(src, dst, "copy" if self.link_mode == "copy" else "reflink")
+                    _read_only(dst)
+                counts[how] += 1
+        os.rename(target, final)
+        self._set_current(app_id, build_id)
+        self.stats["snapshots"] += 1
+        logger.info(f"Content build {app_id}/{build_id}: {counts}")
+        return {"build_id": build_id, "created": True, **counts}
+
+    def _set_current(self, app_id: str, build_id: str):
+        pointer = self.app_dir(app_id) / "current"
+        tmp = pointer.with_suffix(".tmp")
+        tmp.write_text(build_id)
+        os.replace(tmp, pointer)
+
+    def _build_files(self, build: Path) -> dict:
+        """relative path -> lstat of every non-directory entry in a build"""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(build):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                files[os.path.relpath(path, build)] = os.lstat(path)
+        return files
+
+    def materialize(self, app_id: str, build_id: str, install_path) -> dict:
+        """Point an instance's install_path at a build (blocking; run in a thread)
+
+        Files already linked to the build are left alone, files from the
+        previous build that the new one dropped are removed, and anything
+        else in install_path (configs, profiles, logs, files the admin added)
+        is kept.
+        """
+        started = time.monotonic()
+        build = self.build_dir(app_id, build_id)
+        if not build.is_dir():
+            raise FileNotFoundError(f"Content build {app_id}/{build_id} does not exist")
+        install = Path(install_path)
+        install.mkdir(parents=True, exist_ok=True)
+        for name in WRITABLE_DIRS:
+            (install / name).mkdir(exist_ok=True)
+
+        marker = self.read_marker(install)
+        files = self._build_files(build)
+        counts = {"kept": 0, "linked": 0, "reflinked": 0, "copied": 0, "removed": 0}
+        for rel, src_st in files.items():
+            if rel.split(os.sep, 1)[0] in WRITABLE_DIRS:
+                continue
+            src = os.path.join(build, rel)
+            dst = os.path.join(install, rel)
+            try:
+                dst_st = os.lstat(dst)
+                same_file = (dst_st.st_ino, dst_st.st_dev) == (src_st.st_ino, src_st.st_dev)
+                # A copy from an earlier pass (copy mode, or another filesystem) keeps size and mtime
+                same_copy = (stat.S_ISREG(dst_st.st_mode) and dst_st.st_size == src_st.st_size
+                             and dst_st.st_mtime_ns == src_st.st_mtime_ns)
+                if same_file or same_copy:
+                    counts["kept"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # Build next to the destination, then rename over it, so a reader never sees it missing
+            tmp = f"{dst}.content-tmp"
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            if stat.S_ISLNK(src_st.st_mode):
+                os.symlink(os.readlink(src), tmp)
+                how = "copied"
+            else:
+                how = self._place(src, tmp, self.link_mode)
+            os.replace(tmp, dst)
+            counts[how] += 1
+
+        previous = marker.get("build_id") if marker.get("app_id") == app_id else None
+        if previous and previous != build_id and self.build_dir(app_id, previous).is_dir():
+            for rel, old_st in self._build_files(self.build_dir(app_id, previous)).items():
+                if rel in files:
+                    continue
+                dst = os.path.join(install, rel)
+                try:
+                    # Only remove what is still the old build's file, never an instance's own
+                    if (os.lstat(dst).st_ino, os.lstat(dst).st_dev) == (old_st.st_ino, old_st.st_dev):
+                        os.unlink(dst)
+                        counts["removed"] += 1
+                except FileNotFoundError:
+                    pass
+
+        self._write_marker(install, {"app_id": app_id, "build_id": build_id, "files": len(files)})
+        self.stats["materialized"] += 1
+        for how in ("linked", "reflinked", "copied"):
+            self.stats[how] += counts[how]
+        return {"build_id": build_id, "previous_build_id": previous,
+                "ms": round((time.monotonic() - started) * 1000, 1), **counts}
+
+    @staticmethod
+    def read_marker(install_path) -> dict:
+        try:
+            return json.loads((Path(install_path) / MARKER_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_marker(install: Path, marker: dict):
+        tmp = install / (MARKER_FILE + ".tmp")
+        tmp.write_text(json.dumps(marker))
+        os.replace(tmp, install / MARKER_FILE)
+
+    # -- housekeeping --------------------------------------------------------------
+
+    def prune(self, app_id: str, keep: set) -> list:
+        """Delete builds other than the current one and those in `keep` (blocking)"""
+        current = self.current_build(app_id)
+        removed = []
+        for build_id in self.builds(app_id):
+            if build_id == current or build_id in keep:
+                continue
+            target = self.build_dir(app_id, build_id)
+            for dirpath, dirnames, filenames in os.walk(target):
+                os.chmod(dirpath, 0o755)
+            shutil.rmtree(target)
+            removed.append(build_id)
+        return removed
+
+    def usage(self) -> dict:
+        """Per-app builds with apparent size, and the bytes the store really occupies (blocking)"""
+        apps = {}
+        seen = set()
+        disk_bytes = 0
+        apps_root = self.root / "apps"
+        for app in sorted(p.name for p in apps_root.iterdir()) if apps_root.is_dir() else []:
+            builds = []
+            for build_id in self.builds(app):
+                files = size = 0
+                for st in self._build_files(self.build_dir(app, build_id)).values():
+                    if stat.S_ISLNK(st.st_mode):
+                        continue
+                    files += 1
+                    size += st.st_size
+                    if (st.st_ino, st.st_dev) not in seen:
+                        seen.add((st.st_ino, st.st_dev))
+                        disk_bytes += st.st_size
+                builds.append({"build_id": build_id, "files": files, "bytes": size})
+            apps[app] = {"current": self.current_build(app), "builds": builds}
+        return {"root": str(self.root), "link_mode": self.link_mode, "apps": apps,
+                "disk_bytes": disk_bytes, "stats": self.stats}
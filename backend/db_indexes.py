@@ -0,0 +1,147 @@
+"""
+Index declarations for the panel's MongoDB collections.
+
+Every hot lookup in server.py has a matching index here. ensure_indexes() runs
+at startup: it creates anything missing, rebuilds indexes whose options have
+changed, and records a per-index status that the admin API can report.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# MongoDB error codes for an existing index that clashes with a declaration
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+# (collection, name, keys, options)
+INDEXES = [
+    # users.find_one({"username"}) on login/register/reset, must stay unique
+    ("users", "username_unique", [("username", ASCENDING)], {"unique": True}),
+    # users.find_one({"id"}) on every permission/admin check
+    ("users", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    # users.find({"parent_admin_id", "is_sub_admin"}) when listing sub-admins, keyset-paged on id
+    ("users", "parent_admin_sub_admin", [("parent_admin_id", ASCENDING), ("is_sub_admin", ASCENDING), ("id", ASCENDING)], {}),
+    # users.find({"parent_admin_id"}).sort("created_at") for the unpaged sub-admin list
+    ("users", "parent_admin_created_at", [("parent_admin_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    # users.find_one({"is_admin": True}) on the first-run check
+    ("users", "is_admin", [("is_admin", ASCENDING)], {}),
+    # servers.find_one({"id", "user_id"}) and servers.find({"user_id"}) keyset-paged on id
+    ("servers", "user_id_id", [("user_id", ASCENDING), ("id", ASCENDING)], {}),
+    ("servers", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    # servers.find({"user_id"}).sort("created_at") for the unpaged list
+    ("servers", "user_id_created_at", [("user_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    # mods.find({"server_id"}) keyset-paged on id and mods.find_one({"id", "server_id"})
+    ("mods", "server_id_id", [("server_id", ASCENDING), ("id", ASCENDING)], {}),
+    ("mods", "server_id_created_at", [("server_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    # Refresh-token sessions
+    ("sessions", "expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("sessions", "token_hash_unique", [("token_hash", ASCENDING)], {"unique": True}),
+    ("sessions", "previous_token_hash", [("previous_token_hash", ASCENDING)], {"sparse": True}),
+    ("sessions", "user_id", [("user_id", ASCENDING)], {}),
+    ("sessions", "revocation_id", [("revocation_id", ASCENDING)], {"sparse": True}),
+    # Leader lease: the unique id is what makes a contended upsert fail instead of duplicating
+    ("leases", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    # Process commands forwarded to the leader: claimed oldest-first, polled by id, expired by TTL
+    ("process_commands", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    ("process_commands", "status_created_at", [("status", ASCENDING), ("created_at", ASCENDING)], {}),
+    ("process_commands", "expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    # Node agents: nodes.find_one({"id"}) per remote control call, servers.find_one({"node_id"}) on node removal
+    ("nodes", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    ("servers", "node_id", [("node_id", ASCENDING)], {}),
+    # Placement: capacity.find_one by id per reservation, best-fit lookup by free RAM then CPU
+    ("capacity", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    ("capacity", "ram_free_cpu_free", [("ram_free_gb", ASCENDING), ("cpu_free", ASCENDING)], {}),
+    # servers.find({"status": "queued"}).sort("created_at") when retrying queued placements
+    ("servers", "status_created_at", [("status", ASCENDING), ("created_at", ASCENDING)], {}),
+    # Port allocations: the unique (host, port) pair is what stops two servers sharing a port
+    ("port_allocations", "host_port_unique", [("host", ASCENDING), ("port", ASCENDING)], {"unique": True}),
+    ("port_allocations", "server_id", [("server_id", ASCENDING)], {}),
+    # Background jobs: claimed oldest-first per host, listed per user, one active job per key
+    ("jobs", "id_unique", [("id", ASCENDING)], {"unique": True}),
+    ("jobs", "status_host_created_at", [("status", ASCENDING), ("host", ASCENDING), ("created_at", ASCENDING)], {}),
+    ("jobs", "user_id_created_at", [("user_id", ASCENDING), ("created_at", ASCENDING)], {}),
+    ("jobs", "active_key_unique", [("active_key", ASCENDING)], {"unique": True, "sparse": True}),
+    ("jobs", "expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    # servers.find({"content_build"}) when reporting and pruning shared content builds
+    ("servers", "content_build", [("content_build", ASCENDING)], {"sparse": True}),
+    # Mod cache: one entry per host/item/version, evicted oldest last_used_at first
+    ("mod_cache", "host_workshop_id_version_unique", [("host", ASCENDING), ("workshop_id", ASCENDING), ("version", ASCENDING)], {"unique": True}),
+    ("mod_cache", "host_last_used_at", [("host", ASCENDING), ("last_used_at", ASCENDING)], {}),
+    # mods.find({"cached_version"}) for the cached versions servers still use
+    ("mods", "cached_version", [("cached_version", ASCENDING)], {"sparse": True}),
+    # Cluster event log (a single capped document)
+    ("cluster_events", "id_unique", [("id", ASCENDING)], {"unique": True}),
+]
+
+# Last known state of every declared index, keyed by "collection.name"
+index_status: dict = {}
+
+
+def _matches(existing: dict, keys: list, options: dict) -> bool:
+    """Check whether an index from list_indexes() satisfies a declaration"""
+    if list(existing["key"].items()) != keys:
+        return False
+    return all(existing.get(option) == value for option, value in options.items())
+
+
+async def _ensure_index(db, collection: str, name: str, keys: list, options: dict) -> str:
+    existing = {}
+    async for index in db[collection].list_indexes():
+        existing[index["name"]] = index
+
+    for index_name, index in existing.items():
+        if _matches(index, keys, options):
+            return "ready"
+        if index_name == name or list(index["key"].items()) == keys:
+            # Same name or key pattern with different options: rebuild it
+            logger.info(f"Rebuilding index {collection}.{index_name} with updated options")
+            await db[collection].drop_index(index_name)
+            break
+
+    try:
+        await db[collection].create_index(keys, name=name, **options)
+    except OperationFailure as e:
+        if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+            raise
+        # A conflicting index appeared concurrently (another worker); drop and retry once
+        await db[collection].drop_index(name)
+        await db[collection].create_index(keys, name=name, **options)
+    return "created"
+
+
+async def ensure_indexes(db) -> dict:
+    """Create or migrate every declared index; failures are logged, not raised"""
+    for collection, name, keys, options in INDEXES:
+        started = datetime.now(timezone.utc)
+        try:
+            state = await _ensure_index(db, collection, name, keys, options)
+            error = None
+        except Exception as e:
+            # e.g. duplicate usernames already stored block a unique index
+            state = "failed"
+            error = str(e)
+            logger.error(f"Failed to build index {collection}.{name}: {e}")
+
+        index_status[f"{collection}.{name}"] = {
+            "collection": collection,
+            "name": name,
+            "keys": {field: direction for field, direction in keys},
+            "options": options,
+            "state": state,
+            "error": error,
+            "checked_at": started.isoformat(),
+            "build_ms": round((datetime.now(timezone.utc) - started).total_seconds() * 1000, 1),
+        }
+
+    failed = [key for key, status in index_status.items() if status["state"] == "failed"]
+    created = [key for key, status in index_status.items() if status["state"] == "created"]
+    if created:
+        logger.info(f"Created indexes: {', '.join(created)}")
+    if failed:
+        logger.warning(f"Indexes not built: {', '.join(failed)}")
+    return index_status
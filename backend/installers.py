@@ -0,0 +1,161 @@
+"""
+Job handlers for SteamCMD, game server files and workshop mods (see jobs.py).
+
+Each handler takes a JobContext and returns the job's result; game files go
+through the shared content store (content_store.py) and mods through the
+mod cache (mod_cache.py). SteamCMD itself is fetched by the streaming
+downloader (downloader.py), so nothing here blocks the event loop. SteamCMD
+runs as a subprocess in its own session: its progress lines become job
+progress, and cancelling the job kills it.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import signal
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+import content_store
+from downloader import Downloader, DownloadError, install_tree
+from jobs import JobContext, JobError
+
+logger = logging.getLogger(__name__)
+
+REFORGER_SERVER_APP_ID = "1874900"
+REFORGER_WORKSHOP_APP_ID = "1874880"
+# Dedicated server app installed for each game_type
+GAME_SERVER_APPS = {"arma_reforger": REFORGER_SERVER_APP_ID}
+OUTPUT_TAIL_LINES = 20
+# e.g. " Update state (0x61) downloading, progress: 45.23 (1234567 / 2729384934)"
+STEAMCMD_PROGRESS_RE = re.compile(r"progress: (\d+(?:\.\d+)?) \((\d+) / (\d+)\)")
+
+
+def steamcmd_script(steamcmd_dir) -> Path:
+    return Path(steamcmd_dir) / "steamcmd.sh"
+
+
+def workshop_content_dir(steamcmd_dir, app_id: str, workshop_id: str) -> Path:
+    return Path(steamcmd_dir) / "steamapps" / "workshop" / "content" / app_id / workshop_id
+
+
+async def install_steamcmd(ctx: JobContext, downloader: Downloader) -> dict:
+    """params: path (install directory), url (steamcmd_linux.tar.gz), sha256 (optional)"""
+    target = Path(ctx.params["path"])
+    if steamcmd_script(target).exists():
+        return {"path": str(target), "already_installed": True}
+
+    async def progress(done: int, total):
+        await ctx.progress(done / total if total else None, bytes_done=done, bytes_total=total)
+
+    staging = target / ".download"
+    await ctx.progress(0.0, message="Downloading SteamCMD")
+    try:
+        result = await downloader.fetch_tar_gz(ctx.params["url"], staging, ctx.params.get("sha256"), progress)
+    except DownloadError as e:
+        raise JobError(str(e))
+    if not steamcmd_script(staging).exists():
+        shutil.rmtree(staging, ignore_errors=True)
+        raise JobError("The downloaded archive does not contain steamcmd.sh")
+    await asyncio.to_thread(install_tree, staging, target)
+    steamcmd_script(target).chmod(0o755)
+    return {"path": str(target), **result}
+
+
+async def run_steamcmd(ctx: JobContext, steamcmd_dir, args: list, success_marker: str) -> list:
+    """Run SteamCMD with `args`, reporting progress; returns the last lines of output"""
+    script = steamcmd_script(steamcmd_dir)
+    if not script.exists():
+        raise JobError("SteamCMD is not installed; install it first")
+
+    process = await asyncio.create_subprocess_exec(
+        str(script), *args, "+quit",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True  # own process group, so cancelling kills SteamCMD's children too
+    )
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    try:
+        async for raw in process.stdout:
+            line = raw.decode(errors="replace").strip()
+            if not line:
+                continue
+            tail.append(line)
+            match = STEAMCMD_PROGRESS_RE.search(line)
+            if match:
+                await ctx.progress(
+                    float(match.group(1)) / 100,
+                    bytes_done=int(match.group(2)),
+                    bytes_total=int(match.group(3)),
+                    output=line
+                )
+            else:
+                await ctx.progress(None, output=line)
+        code = await process.wait()
+    except asyncio.CancelledError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+
+    if code != 0 or not any(success_marker in line for line in tail):
+        raise JobError(f"SteamCMD failed (exit code {code}): {' | '.join(list(tail)[-5:])}")
+    return list(tail)
+
+
+async def update_content(ctx: JobContext, store, steamcmd_dir, app_id: str, validate: bool = False) -> dict:
+    """Bring the shared staging tree of an app up to date and snapshot it as a build"""
+    lock = store.try_lock(app_id)
+    while lock is None:
+        await ctx.progress(None, message=f"Waiting for another update of app {app_id}")
+        await asyncio.sleep(content_store.LOCK_POLL_SECONDS)
+        lock = store.try_lock(app_id)
+    try:
+        staging = store.staging_dir(app_id)
+        staging.mkdir(parents=True, exist_ok=True)
+        args = ["+force_install_dir", str(staging), "+login", "anonymous", "+app_update", app_id]
+        if validate:
+            args.append("validate")
+        await ctx.log(f"{'Validating' if validate else 'Updating'} app {app_id}")
+        await run_steamcmd(ctx, steamcmd_dir, args, f"Success! App '{app_id}'")
+
+        build_id = store.staged_build_id(app_id)
+        if build_id is None:
+            raise JobError(f"SteamCMD did not record a build id for app {app_id}")
+        if build_id != store.current_build(app_id) or not store.build_dir(app_id, build_id).is_dir():
+            await ctx.log(f"Snapshotting build {build_id}")
+        return await asyncio.to_thread(store.snapshot, app_id, build_id)
+    finally:
+        lock.close()
+
+
+def workshop_item_version(steamcmd_dir, app_id: str, workshop_id: str):
+    """Manifest id SteamCMD recorded for a downloaded workshop item, if any"""
+    manifest = Path(steamcmd_dir) / "steamapps" / "workshop" / f"appworkshop_{app_id}.acf"
+    try:
+        text = manifest.read_text(errors="replace")
+    except FileNotFoundError:
+        return None
+    match = re.search(r'"%s"\s*\{[^}]*?"manifest"\s+"(-?\d+)"' % re.escape(workshop_id), text)
+    return match.group(1) if match else None
+
+
+async def download_mod(ctx: JobContext, steamcmd_dir, app_id: str, workshop_id: str) -> dict:
+    """Download a workshop item with SteamCMD; returns its path and version"""
+    await ctx.log(f"Downloading workshop item {workshop_id}")
+    await run_steamcmd(
+        ctx, steamcmd_dir,
+        ["+login", "anonymous", "+workshop_download_item", app_id, workshop_id],
+        "Success. Downloaded item"
+    )
+    path = workshop_content_dir(steamcmd_dir, app_id, workshop_id)
+    if not path.is_dir():
+        raise JobError(f"SteamCMD reported success but {path} does not exist")
+    # Without a manifest id every download is its own version
+    version = workshop_item_version(steamcmd_dir, app_id, workshop_id) or datetime.now(timezone.utc).strftime("t%Y%m%d%H%M%S")
+    return {"path": str(path), "version": version}
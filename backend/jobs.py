@@ -0,0 +1,305 @@
+"""
+Persistent background jobs for operations that outlive an HTTP request.
+
+Installing SteamCMD, installing or validating game files and downloading
+mods take minutes. Running them inside the request tied up the event loop
+and failed on proxy timeouts, so instead the request submits a job to the
+`jobs` collection and returns its id at once:
+
+    {"id", "kind", "params", "user_id", "host", "status", "progress",
+     "events", "result", "error", "cancel_requested", ...}
+
+Every panel worker runs a small pool (JobQueue.run) that claims queued jobs
+for its host, oldest first, with an atomic find_one_and_update. A job moves
+queued -> running -> succeeded | failed | cancelled. Handlers report progress
+through a JobContext; each report also goes on the job's capped `events`
+list, which GET /api/jobs/{id}/events streams to the client.
+
+Cancelling a queued job settles it immediately. For a running job it sets
+`cancel_requested`; the worker that runs it notices on its next heartbeat
+and cancels the handler's task, and the handler cleans up (e.g. kills
+SteamCMD). Running jobs heartbeat; if a worker dies, its jobs are failed
+once their heartbeat goes stale, so clients are not left waiting.
+
+A job submitted with a `key` (say "steamcmd_install") is unique among
+active jobs: submitting it again returns the job already queued or running.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from cluster import HOSTNAME, WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+EVENT_LOG_SIZE = 200
+PROGRESS_WRITE_SECONDS = 0.5  # progress without a message is written at most this often
+HEARTBEAT_SECONDS = 2.0
+STALE_SECONDS = 30.0
+# Finished jobs are kept this long for inspection, then removed by a TTL index
+JOB_RETENTION = timedelta(days=7)
+
+JOB_PROJECTION = {"_id": 0, "events": 0, "active_key": 0}
+
+
+class JobError(Exception):
+    """Raised by a handler for an expected failure; the message becomes the job's error"""
+
+
+class JobContext:
+    """Handed to a handler: its job's params, plus progress reporting"""
+
+    def __init__(self, queue: "JobQueue", job: dict):
+        self.queue = queue
+        self.job_id = job["id"]
+        self.params = job["params"]
+        self._last_write = 0.0
+
+    async def progress(self, fraction: float = None, message: str = None, **fields):
+        """Record progress; `fraction` is 0..1 (None if unknown), extra fields e.g. bytes_done"""
+        now = time.monotonic()
+        if message is None and now - self._last_write < PROGRESS_WRITE_SECONDS:
+            return
+        self._last_write = now
+        progress = {"fraction": None if fraction is None else round(min(max(fraction, 0.0), 1.0), 4), **fields}
+        if message is not None:
+            progress["message"] = message
+        await self.queue._record(self.job_id, {"progress": progress}, progress=progress)
+
+    async def log(self, message: str):
+        await self.progress(message=message)
+
+
+class JobQueue:
+    def __init__(self, db, concurrency: int = 2, poll_interval: float = 1.0):
+        self.db = db
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.handlers: dict = {}  # kind -> async handler(JobContext) -> result dict
+        self.running: dict = {}  # job_id -> asyncio.Task
+        self._wakeup = asyncio.Event()
+        self._watchers: dict = {}  # job_id -> set of asyncio.Event, one per local watch()
+        self.stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "stale": 0}
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    # -- submitting and inspecting -------------------------------------------------
+
+    async def submit(self, kind: str, params: dict, user_id: str, key: str = None) -> dict:
+        """Queue a job, or return the active one with the same key"""
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params,
+            "user_id": user_id,
+            "host": HOSTNAME,
+            "status": "queued",
+            "progress": {"fraction": 0.0},
+            "events": [{"seq": 1, "at": now, "status": "queued"}],
+            "seq": 1,
+            "result": None,
+            "error": None,
+            "cancel_requested": False,
+            "created_at": now,
+        }
+        if key is not None:
+            job["key"] = job["active_key"] = key
+        try:
+            await self.db.jobs.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.db.jobs.find_one({"active_key": key}, JOB_PROJECTION)
+            if existing is None:
+                raise HTTPException(status_code=409, detail="A job for this is just finishing; try again")
+            self.stats["deduplicated"] += 1
+            return existing
+        self.stats["submitted"] += 1
+        self._wakeup.set()
+        job.pop("_id", None)
+        return {k: v for k, v in job.items() if k not in JOB_PROJECTION}
+
+    async def get(self, job_id: str, user_id: str = None) -> dict:
+        query = {"id": job_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        job = await self.db.jobs.find_one(query, JOB_PROJECTION)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def recent(self, user_id: str, limit: int = 50) -> list:
+        return await self.db.jobs.find({"user_id": user_id}, JOB_PROJECTION).sort("created_at", -1).limit(limit).to_list(None)
+
+    async def cancel(self, job_id: str, user_id: str) -> dict:
+        job = await self.db.jobs.find_one_and_update(
+            {"id": job_id, "user_id": user_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": datetime.now(timezone.utc),
+                      "expires_at": datetime.now(timezone.utc) + JOB_RETENTION},
+             "$unset": {"active_key": ""}},
+            projection={"_id": 0, "id": 1}
+        )
+        if job is not None:
+            self.stats["cancelled"] += 1
+            await self._record(job_id, {}, status="cancelled")
+        else:
+            await self.db.jobs.update_one(
+                {"id": job_id, "user_id": user_id, "status": "running"},
+                {"$set": {"cancel_requested": True}}
+            )
+            task = self.running.get(job_id)
+            if task is not None:
+                task.cancel()
+        return await self.get(job_id, user_id)
+
+    async def watch(self, job_id: str, after: int = 0, timeout: float = 300):
+        """Yield the job's events after `after` until it finishes (or `timeout` passes)"""
+        deadline = time.monotonic() + timeout
+        changed = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(changed)
+        try:
+            while True:
+                changed.clear()
+                job = await self.db.jobs.find_one({"id": job_id}, {"_id": 0, "events": 1, "status": 1})
+                if job is None:
+                    return
+                for event in job["events"]:
+                    if event["seq"] > after:
+                        after = event["seq"]
+                        yield event
+                remaining = deadline - time.monotonic()
+                if job["status"] in FINISHED_STATES or remaining <= 0:
+                    return
+                # Woken at once for jobs running in this worker; polled for the others
+                try:
+                    await asyncio.wait_for(changed.wait(), min(self.poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watchers = self._watchers.get(job_id)
+            watchers.discard(changed)
+            if not watchers:
+                del self._watchers[job_id]
+
+    # -- running -------------------------------------------------------------------
+
+    async def _record(self, job_id: str, fields: dict, **event):
+        """Update a job and append an event to its log"""
+        now = datetime.now(timezone.utc)
+        job = await self.db.jobs.find_one_and_update(
+            {"id": job_id},
+            {"$inc": {"seq": 1}, "$set": fields},
+            projection={"_id": 0, "seq": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return
+        await self.db.jobs.update_one(
+            {"id": job_id},
+            {"$push": {"events": {"$each": [{"seq": job["seq"], "at": now, **event}], "$slice": -EVENT_LOG_SIZE}}}
+        )
+        for changed in self._watchers.get(job_id, ()):
+            changed.set()
+
+    async def _claim(self):
+        now = datetime.now(timezone.utc)
+        return await self.db.jobs.find_one_and_update(
+            {"status": "queued", "host": HOSTNAME, "kind": {"$in": list(self.handlers)}},
+            {"$set": {"status": "running", "worker": WORKER_ID, "started_at": now, "heartbeat_at": now}},
+            projection={"_id": 0, "id": 1, "kind": 1, "params": 1},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _execute(self, job: dict):
+        await self._record(job["id"], {}, status="running")
+        fields = {}
+        try:
+            result = await self.handlers[job["kind"]](JobContext(self, job))
+            fields = {"status": "succeeded", "result": result, "progress.fraction": 1.0}
+        except asyncio.CancelledError:
+            fields = {"status": "cancelled"}
+        except JobError as e:
+            fields = {"status": "failed", "error": str(e)}
+        except Exception as e:
+            logger.error(f"Job {job['kind']} {job['id']} failed: {e}", exc_info=True)
+            fields = {"status": "failed", "error": str(e) or type(e).__name__}
+        finally:
+            now = datetime.now(timezone.utc)
+            fields = fields or {"status": "failed", "error": "interrupted"}
+            self.stats[fields["status"]] += 1
+            fields.update({"finished_at": now, "expires_at": now + JOB_RETENTION})
+            # Shielded: a shutdown cancelling this task must not leave the job "running"
+            await asyncio.shield(self._finish(job["id"], fields))
+            self.running.pop(job["id"], None)
+
+    async def _finish(self, job_id: str, fields: dict):
+        await self.db.jobs.update_one({"id": job_id}, {"$unset": {"active_key": ""}})
+        await self._record(job_id, fields, status=fields["status"], error=fields.get("error"))
+
+    async def _heartbeat(self):
+        """Keep our running jobs alive, apply cancellations, and fail jobs of dead workers"""
+        now = datetime.now(timezone.utc)
+        if self.running:
+            ids = list(self.running)
+            await self.db.jobs.update_many({"id": {"$in": ids}}, {"$set": {"heartbeat_at": now}})
+            async for job in self.db.jobs.find(
+                {"id": {"$in": ids}, "cancel_requested": True}, {"_id": 0, "id": 1}
+            ):
+                task = self.running.get(job["id"])
+                if task is not None:
+                    task.cancel()
+
+        stale = await self.db.jobs.find(
+            {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=STALE_SECONDS)}},
+            {"_id": 0, "id": 1, "worker": 1}
+        ).to_list(None)
+        for job in stale:
+            result = await self.db.jobs.update_one(
+                {"id": job["id"], "status": "running", "worker": job["worker"]},
+                {"$set": {"status": "failed", "error": "The worker running this job stopped; submit it again",
+                          "finished_at": now, "expires_at": now + JOB_RETENTION},
+                 "$unset": {"active_key": ""}}
+            )
+            if result.modified_count:
+                self.stats["stale"] += 1
+                await self._record(job["id"], {}, status="failed", error="worker stopped")
+
+    async def run(self):
+        next_heartbeat = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + HEARTBEAT_SECONDS
+                    await self._heartbeat()
+                while len(self.running) < self.concurrency:
+                    job = await self._claim()
+                    if job is None:
+                        break
+                    self.running[job["id"]] = asyncio.create_task(self._execute(job))
+            except Exception as e:
+                logger.warning(f"Job queue poll failed: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), min(self.poll_interval, HEARTBEAT_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    async def status(self) -> dict:
+        return {
+            "worker": WORKER_ID,
+            "concurrency": self.concurrency,
+            "running": sorted(self.running),
+            "queued": await self.db.jobs.count_documents({"status": "queued"}),
+            "kinds": sorted(self.handlers),
+            "stats": self.stats,
+        }
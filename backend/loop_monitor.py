@@ -0,0 +1,165 @@
+"""
+Event loop lag monitor and blocking-call detector.
+
+A heartbeat callback re-arms itself on the loop every `interval` seconds and
+records how late each run was; that lateness is the loop lag every other
+coroutine sees, kept in a fixed-memory histogram.
+
+Optionally (threshold_ms > 0) a watchdog thread watches the heartbeat. When
+it falls more than threshold_ms behind, the loop thread is stuck in one
+callback, so the watchdog captures the loop thread's stack at that moment.
+Stalls are aggregated by the innermost panel frame and the innermost frame
+overall (the actual blocking call), giving a "top blockers" report.
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from request_metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = str(Path(__file__).resolve().parent)
+# Middleware frames wrap every request; they are never the interesting location
+PASSTHROUGH_FILES = {
+    str(Path(BACKEND_DIR) / name)
+    for name in ("loop_monitor.py", "request_metrics.py", "compression.py", "storage/instrumented.py")
+}
+STACK_DEPTH = 20
+MAX_BLOCKERS = 200
+
+
+def _location(frame_summary) -> str:
+    filename = frame_summary.filename
+    if filename.startswith(BACKEND_DIR):
+        filename = filename[len(BACKEND_DIR) + 1:]
+    return f"{filename}:{frame_summary.lineno} in {frame_summary.name}"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.25, threshold_ms: float = 0):
+        self.threshold_ms = threshold_ms
+        # The heartbeat must run more often than the stall threshold to notice stalls
+        self.interval = min(interval, threshold_ms / 2000) if threshold_ms > 0 else interval
+        self.lag_us = Histogram(60 * 1_000_000)
+        self.last_lag_ms = 0.0
+        self.blockers: dict = {}  # (panel frame, blocking frame) -> aggregate
+        self.stalls = 0
+        self._lock = threading.Lock()  # blockers are written by the watchdog thread
+        self.on_lag = None  # optional callback(lag_seconds)
+        self._loop = None
+        self._loop_thread_id = None
+        self._expected = 0.0
+        self._last_tick = 0.0
+        self._handle = None
+        self._watchdog = None
+        self._running = False
+
+    def start(self, loop):
+        if self._running:
+            return
+        self._running = True
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._expected = self._last_tick + self.interval
+        self._handle = loop.call_later(self.interval, self._heartbeat)
+        if self.threshold_ms > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        self._running = False
+        if self._handle is not None:
+            self._handle.cancel()
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        lag = max(now - self._expected, 0.0)
+        self.lag_us.record(int(lag * 1_000_000))
+        self.last_lag_ms = lag * 1000
+        if self.on_lag is not None:
+            self.on_lag(lag)
+        self._last_tick = now
+        self._expected = now + self.interval
+        if self._running:
+            self._handle = self._loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self):
+        threshold = self.threshold_ms / 1000
+        poll = max(threshold / 4, 0.005)
+        stalled_tick = None
+        captured = None
+
+        while self._running:
+            time.sleep(poll)
+            tick = self._last_tick
+            behind = time.monotonic() - tick - self.interval
+
+            if behind >= threshold and tick != stalled_tick:
+                # New stall: the loop thread is still inside the blocking callback
+                stalled_tick = tick
+                captured = self._capture()
+            elif tick != stalled_tick and captured is not None:
+                # The heartbeat ran again, so the stall is over
+                duration_ms = max(tick - stalled_tick - self.interval, 0.0) * 1000
+                self._record(captured, duration_ms)
+                captured = None
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        return traceback.extract_stack(frame)[-STACK_DEPTH:]
+
+    def _record(self, stack, duration_ms: float):
+        if not stack:
+            return
+        blocking = _location(stack[-1])
+        panel = next(
+            (_location(entry) for entry in reversed(stack)
+             if entry.filename.startswith(BACKEND_DIR) and entry.filename not in PASSTHROUGH_FILES),
+            blocking
+        )
+        key = (panel, blocking)
+        with self._lock:
+            self.stalls += 1
+            blocker = self.blockers.get(key)
+            if blocker is None:
+                if len(self.blockers) >= MAX_BLOCKERS:
+                    return
+                blocker = self.blockers[key] = {
+                    "location": panel,
+                    "blocking_call": blocking,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "stack": [_location(entry) for entry in stack],
+                }
+            blocker["count"] += 1
+            blocker["total_ms"] += duration_ms
+            blocker["max_ms"] = max(blocker["max_ms"], duration_ms)
+        logger.warning(f"Event loop blocked {duration_ms:.0f}ms at {panel} ({blocking})")
+
+    def report(self, limit: int = 20) -> dict:
+        with self._lock:
+            blockers = [dict(blocker) for blocker in self.blockers.values()]
+        top = sorted(blockers, key=lambda blocker: blocker["total_ms"], reverse=True)[:limit]
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "lag_ms": self.lag_us.snapshot(scale=1000),
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "detector": {
+                "enabled": self.threshold_ms > 0,
+                "threshold_ms": self.threshold_ms,
+                "stalls": self.stalls,
+            },
+            "top_blockers": [
+                {**blocker, "total_ms": round(blocker["total_ms"], 1), "max_ms": round(blocker["max_ms"], 1)}
+                for blocker in top
+            ],
+        }
@@ -0,0 +1,292 @@
+"""
+Prometheus text exposition for the panel and every managed server.
+
+A background sampler refreshes host, panel-process and per-server process
+gauges on a fixed interval (one servers query and one psutil pass per
+interval, off the event loop). HTTP histograms, cache counters and pool
+stats are already aggregated in memory as requests happen. A scrape only
+formats those values, so its cost does not depend on request volume and
+stays small with hundreds of servers.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import psutil
+
+from request_metrics import EXPORT_LATENCY_BUCKETS, RequestMetrics
+
+logger = logging.getLogger(__name__)
+
+SERVER_SAMPLE_FIELDS = {
+    "_id": 0, "id": 1, "name": 1, "game_type": 1, "port": 1,
+    "status": 1, "current_players": 1, "max_players": 1, "pid": 1,
+    "install_path": 1, "node_id": 1,
+}
+SERVER_STATUSES = ("online", "offline", "restarting", "queued")
+
+
+class MetricsSampler:
+    """Latest sampled gauges; written by run(), read by render()"""
+
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self.host: dict = {}
+        self.panel_process: dict = {}
+        self.servers: list = []
+        self.nodes: dict = {}  # node_id -> {"name", "up", "host"}
+        # async callable(servers on nodes) -> nodes; fills each server's "process" remotely
+        self.sample_remote = None
+        self.processes: dict = {}  # pid -> psutil.Process, kept so cpu_percent has a baseline
+        self.background_lag: dict = {}  # task -> seconds the last wake-up was late
+        self.sample_seconds = 0.0
+        self.last_sample = 0.0
+        self.own_process = psutil.Process(os.getpid())
+
+    def record_lag(self, task: str, lag_seconds: float):
+        self.background_lag[task] = max(lag_seconds, 0.0)
+
+    def sample_local(self, servers: list):
+        """psutil calls for the host, this process and each server process on this host"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        self.host = {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_used_bytes": memory.used,
+            "memory_total_bytes": memory.total,
+            "memory_percent": memory.percent,
+            "disk_used_bytes": disk.used,
+            "disk_total_bytes": disk.total,
+            "disk_percent": disk.percent,
+        }
+
+        with self.own_process.oneshot():
+            cpu = self.own_process.cpu_times()
+            self.panel_process = {
+                "cpu_seconds_total": cpu.user + cpu.system,
+                "resident_memory_bytes": self.own_process.memory_info().rss,
+                "threads": self.own_process.num_threads(),
+                "open_fds": self.own_process.num_fds() if hasattr(self.own_process, "num_fds") else 0,
+            }
+
+        live_pids = set()
+        for server in servers:
+            pid = server.get("pid")
+            server["process"] = None
+            if not pid:
+                continue
+            try:
+                process = self.processes.get(pid)
+                if process is None:
+                    process = self.processes[pid] = psutil.Process(pid)
+                    process.cpu_percent(interval=None)  # first call only sets the baseline
+                with process.oneshot():
+                    server["process"] = {
+                        "cpu_percent": process.cpu_percent(interval=None),
+                        "resident_memory_bytes": process.memory_info().rss,
+                        "threads": process.num_threads(),
+                    }
+                live_pids.add(pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        for pid in list(self.processes):
+            if pid not in live_pids:
+                del self.processes[pid]
+
+    async def sample(self, db):
+        started = time.perf_counter()
+        servers = await db.servers.find({}, SERVER_SAMPLE_FIELDS).to_list(None)
+        local = [server for server in servers if not server.get("node_id")]
+        remote = [server for server in servers if server.get("node_id")]
+        await asyncio.to_thread(self.sample_local, local)
+        if remote and self.sample_remote is not None:
+            self.nodes = await self.sample_remote(remote)
+        else:
+            for server in remote:
+                server["process"] = None
+        self.servers = servers
+        self.sample_seconds = time.perf_counter() - started
+        self.last_sample = time.time()
+
+    async def run(self, db):
+        """Sample forever; lateness of each wake-up is reported as task lag"""
+        psutil.cpu_percent(interval=None)
+        while True:
+            try:
+                await self.sample(db)
+            except Exception as e:
+                logger.warning(f"Metrics sample failed: {e}")
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record_lag("metrics_sampler", time.monotonic() - expected)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value, labels: dict = None):
+        if isinstance(value, bool):
+            value = int(value)
+        self.lines.append(f"{name}{_labels(labels)} {value}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render(
+    sampler: MetricsSampler,
+    request_metrics: RequestMetrics,
+    conditional_get_stats: dict,
+    pool_stats: dict,
+) -> str:
+    out = _Exposition()
+
+    host_gauges = (
+        ("cpu_percent", "Host CPU utilisation percent"),
+        ("memory_used_bytes", "Host memory in use"),
+        ("memory_total_bytes", "Host memory installed"),
+        ("memory_percent", "Host memory utilisation percent"),
+        ("disk_used_bytes", "Root filesystem bytes used"),
+        ("disk_total_bytes", "Root filesystem size"),
+        ("disk_percent", "Root filesystem utilisation percent"),
+    )
+    for field, help_text in host_gauges:
+        if field in sampler.host:
+            out.family(f"panel_host_{field}", "gauge", help_text)
+            out.sample(f"panel_host_{field}", sampler.host[field])
+
+    if sampler.panel_process:
+        out.family("panel_process_cpu_seconds_total", "counter", "CPU time used by the panel process")
+        out.sample("panel_process_cpu_seconds_total", round(sampler.panel_process["cpu_seconds_total"], 3))
+        out.family("panel_process_resident_memory_bytes", "gauge", "Panel process resident memory")
+        out.sample("panel_process_resident_memory_bytes", sampler.panel_process["resident_memory_bytes"])
+        out.family("panel_process_threads", "gauge", "Panel process threads")
+        out.sample("panel_process_threads", sampler.panel_process["threads"])
+        out.family("panel_process_open_fds", "gauge", "Panel process open file descriptors")
+        out.sample("panel_process_open_fds", sampler.panel_process["open_fds"])
+
+    servers = sampler.servers
+    out.family("panel_server_info", "gauge", "Managed game server metadata")
+    for server in servers:
+        out.sample("panel_server_info", 1, {
+            "server_id": server.get("id"), "name": server.get("name"),
+            "game_type": server.get("game_type"), "port": server.get("port"),
+            "node_id": server.get("node_id") or "",
+        })
+    out.family("panel_server_status", "gauge", "1 for the server's current status")
+    for server in servers:
+        current = server.get("status")
+        # Any other stored status still gets its series rather than no 1 at all
+        statuses = SERVER_STATUSES if current in SERVER_STATUSES or current is None else (*SERVER_STATUSES, current)
+        for status in statuses:
+            out.sample("panel_server_status", int(current == status),
+                       {"server_id": server.get("id"), "status": status})
+    out.family("panel_server_players", "gauge", "Players currently connected")
+    for server in servers:
+        out.sample("panel_server_players", server.get("current_players", 0), {"server_id": server.get("id")})
+    out.family("panel_server_max_players", "gauge", "Configured player slots")
+    for server in servers:
+        out.sample("panel_server_max_players", server.get("max_players", 0), {"server_id": server.get("id")})
+
+    process_gauges = (
+        ("cpu_percent", "Server process CPU percent (100 = one core)"),
+        ("resident_memory_bytes", "Server process resident memory"),
+        ("threads", "Server process threads"),
+    )
+    out.family("panel_server_process_running", "gauge", "1 when the recorded server process is alive")
+    for server in servers:
+        out.sample("panel_server_process_running", int(server.get("process") is not None),
+                   {"server_id": server.get("id")})
+    for field, help_text in process_gauges:
+        name = f"panel_server_process_{field}"
+        out.family(name, "gauge", help_text)
+        for server in servers:
+            if server.get("process"):
+                out.sample(name, server["process"][field], {"server_id": server.get("id")})
+
+    out.family("panel_node_up", "gauge", "1 when the node agent answered the last sample")
+    for node_id, node in sampler.nodes.items():
+        out.sample("panel_node_up", int(node["up"]), {"node_id": node_id, "name": node["name"]})
+    node_gauges = (
+        ("cpu_percent", "Node host CPU utilisation percent"),
+        ("memory_percent", "Node host memory utilisation percent"),
+        ("disk_percent", "Node root filesystem utilisation percent"),
+    )
+    for field, help_text in node_gauges:
+        name = f"panel_node_{field}"
+        out.family(name, "gauge", help_text)
+        for node_id, node in sampler.nodes.items():
+            if field in node["host"]:
+                out.sample(name, node["host"][field], {"node_id": node_id})
+
+    out.family("panel_http_requests_in_flight", "gauge", "HTTP requests currently being served")
+    out.sample("panel_http_requests_in_flight", request_metrics.in_flight)
+    out.family("panel_http_request_duration_seconds", "histogram", "HTTP request latency by route and status")
+    routes = list(request_metrics.routes.items())
+    for (method, route, status), stats in routes:
+        labels = {"method": method, "route": route, "status": status}
+        cumulative = 0
+        for bound, count in zip(EXPORT_LATENCY_BUCKETS, stats.export_buckets):
+            cumulative += count
+            out.sample("panel_http_request_duration_seconds_bucket", cumulative, {**labels, "le": bound})
+        out.sample("panel_http_request_duration_seconds_bucket", stats.latency_us.count, {**labels, "le": "+Inf"})
+        out.sample("panel_http_request_duration_seconds_sum", round(stats.latency_us.total / 1_000_000, 6), labels)
+        out.sample("panel_http_request_duration_seconds_count", stats.latency_us.count, labels)
+    out.family("panel_http_response_size_bytes", "summary", "HTTP response body size by route and status")
+    for (method, route, status), stats in routes:
+        labels = {"method": method, "route": route, "status": status}
+        out.sample("panel_http_response_size_bytes_sum", stats.size_bytes.total, labels)
+        out.sample("panel_http_response_size_bytes_count", stats.size_bytes.count, labels)
+    out.family("panel_http_db_seconds_total", "counter", "Time spent awaiting the database, by route and status")
+    for (method, route, status), stats in routes:
+        out.sample("panel_http_db_seconds_total", round(stats.db_ms / 1000, 6),
+                   {"method": method, "route": route, "status": status})
+
+    out.family("panel_conditional_get_requests_total", "counter", "Conditional GET requests by resource")
+    out.family("panel_conditional_get_not_modified_total", "counter", "Conditional GETs answered with 304")
+    for resource, stats in conditional_get_stats.items():
+        out.sample("panel_conditional_get_requests_total", stats["requests"], {"resource": resource})
+        out.sample("panel_conditional_get_not_modified_total", stats["not_modified"], {"resource": resource})
+
+    pool_fields = (
+        ("open", "gauge", "Open connections in the MongoDB pool"),
+        ("checked_out", "gauge", "Connections currently checked out"),
+        ("created_total", "counter", "Connections created"),
+        ("closed_total", "counter", "Connections closed"),
+        ("checkouts_total", "counter", "Successful connection checkouts"),
+        ("checkout_failures_total", "counter", "Failed connection checkouts"),
+        ("cleared_total", "counter", "Times the pool was cleared"),
+    )
+    for field, kind, help_text in pool_fields:
+        name = f"panel_mongo_pool_{field}"
+        out.family(name, kind, help_text)
+        for address, pool in pool_stats.items():
+            out.sample(name, pool[field], {"address": address})
+
+    out.family("panel_background_task_lag_seconds", "gauge", "How late the task's last scheduled wake-up ran")
+    for task, lag in sampler.background_lag.items():
+        out.sample("panel_background_task_lag_seconds", round(lag, 6), {"task": task})
+    out.family("panel_metrics_sample_duration_seconds", "gauge", "Duration of the last metrics sample")
+    out.sample("panel_metrics_sample_duration_seconds", round(sampler.sample_seconds, 6))
+    out.family("panel_metrics_last_sample_timestamp_seconds", "gauge", "Unix time of the last metrics sample")
+    out.sample("panel_metrics_last_sample_timestamp_seconds", round(sampler.last_sample, 3))
+
+    return out.text()
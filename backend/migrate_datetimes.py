@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+One-shot migration of ISO-8601 string timestamps to native BSON dates.
+
+Older panel versions stored created_at/last_login as isoformat() strings. The
+migration converts them in batches; each batch only selects documents whose
+field is still a string, so it can be interrupted and rerun safely. The
+backend starts it in the background on startup, or run it by hand:
+
+    cd backend && python migrate_datetimes.py [--batch-size 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = "iso_datetimes_to_bson"
+
+# collection -> timestamp fields that used to be stored as strings
+DATETIME_FIELDS = {
+    "users": ["created_at", "last_login"],
+    "servers": ["created_at"],
+    "mods": ["created_at"],
+    "sessions": ["created_at"],
+}
+
+
+def parse_timestamp(value: str):
+    """Parse a stored isoformat() string, treating naive values as UTC"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_field(db, collection: str, field: str, batch_size: int) -> int:
+    """Convert one field across a collection, returning the number of documents updated"""
+    converted = 0
+    # Strings that fail to parse are skipped by _id so the loop always advances
+    last_id = None
+
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query, {"_id": 1, field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return converted
+
+        operations = []
+        for doc in batch:
+            parsed = parse_timestamp(doc[field])
+            if parsed is None:
+                logger.warning(f"Unparseable {collection}.{field} on {doc['_id']}: {doc[field]!r}")
+                continue
+            # Match on the old value so a concurrent write is never overwritten
+            operations.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: parsed}}))
+
+        if operations:
+            result = await db[collection].bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        last_id = batch[-1]["_id"]
+
+        # Yield between batches so a startup migration never starves requests
+        await asyncio.sleep(0)
+
+
+async def migrate_datetimes(db, batch_size: int = 1000) -> dict:
+    """Run the migration unless it has already completed; return per-field counts"""
+    done = await db.migrations.find_one({"_id": MIGRATION_ID, "state": "done"})
+    if done:
+        return done.get("converted", {})
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"state": "running", "started_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+    converted = {}
+    for collection, fields in DATETIME_FIELDS.items():
+        for field in fields:
+            count = await migrate_field(db, collection, field, batch_size)
+            converted[f"{collection}.{field}"] = count
+            if count:
+                logger.info(f"Converted {count} {collection}.{field} values to native datetimes")
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"state": "done", "finished_at": datetime.now(timezone.utc), "converted": converted}}
+    )
+    return converted
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    try:
+        converted = await migrate_datetimes(client[os.environ["DB_NAME"]], args.batch_size)
+        for key, count in converted.items():
+            print(f"{key}: {count}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
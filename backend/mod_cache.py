@@ -0,0 +1,298 @@
+"""
+Workshop mod cache shared by every server instance on a host.
+
+Popular mods are used by many servers, and each server downloading its own
+copy duplicated gigabytes. Instead a mod is downloaded once per version
+into
+
+    <root>/<workshop_id>/<version>/        read-only
+
+and recorded in the `mod_cache` collection:
+
+    {"host", "workshop_id", "version", "path", "bytes", "created_at",
+     "last_used_at", "uses"}
+
+A server's <install_path>/mods/<workshop_id> is a symlink to the version it
+uses, and its mod document records that version in `cached_version`. That
+is what makes an entry referenced.
+
+Concurrent requests for the same workshop item share one download
+(singleflight): within a worker they await the same future, and across
+workers a per-item flock makes the second one find the first one's entry.
+When the cache grows past its disk budget, unreferenced entries are evicted
+least recently used first; referenced ones are never evicted, so the budget
+can be exceeded by what servers actually use.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo.errors import DuplicateKeyError
+
+from cluster import HOSTNAME
+
+logger = logging.getLogger(__name__)
+
+MODS_DIR = "mods"  # inside an instance's install_path
+LOCK_POLL_SECONDS = 1.0
+
+ENTRY_PROJECTION = {"_id": 0, "host": 0}
+
+
+def _tree_bytes(path) -> int:
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            total += os.lstat(os.path.join(dirpath, name)).st_size
+    return total
+
+
+def _freeze(path):
+    """Make every file under path read-only; instances share them"""
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            file = os.path.join(dirpath, name)
+            if not os.path.islink(file):
+                os.chmod(file, os.lstat(file).st_mode & 0o555)
+
+
+def _remove_tree(path):
+    for dirpath, dirnames, filenames in os.walk(path):
+        os.chmod(dirpath, 0o755)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class ModCache:
+    def __init__(self, db, root, budget_bytes: int):
+        self.db = db
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self._inflight: dict = {}  # workshop_id -> asyncio.Future of the entry being downloaded
+        self.stats = {
+            "hits": 0, "misses": 0, "coalesced": 0,
+            "bytes_downloaded": 0, "bytes_saved": 0,
+            "evictions": 0, "bytes_evicted": 0,
+        }
+
+    # -- lookups -------------------------------------------------------------------
+
+    async def lookup(self, workshop_id: str, version: str = None):
+        """The cached entry for a version, or the newest one; None if not cached"""
+        query = {"host": HOSTNAME, "workshop_id": workshop_id}
+        if version is not None:
+            query["version"] = version
+        entry = await self.db.mod_cache.find_one(query, ENTRY_PROJECTION, sort=[("created_at", -1)])
+        if entry is not None and not Path(entry["path"]).is_dir():
+            # Removed from disk behind our back; forget it and download again
+            await self.db.mod_cache.delete_one({"host": HOSTNAME, "workshop_id": workshop_id, "version": entry["version"]})
+            return None
+        return entry
+
+    async def entries(self) -> list:
+        return await self.db.mod_cache.find({"host": HOSTNAME}, ENTRY_PROJECTION).sort("last_used_at", -1).to_list(None)
+
+    async def _touch(self, entry: dict):
+        await self.db.mod_cache.update_one(
+            {"host": HOSTNAME, "workshop_id": entry["workshop_id"], "version": entry["version"]},
+            {"$set": {"last_used_at": datetime.now(timezone.utc)}, "$inc": {"uses": 1}}
+        )
+
+    def _hit(self, entry: dict, outcome: str):
+        self.stats["hits" if outcome == "hit" else outcome] += 1
+        self.stats["bytes_saved"] += entry["bytes"]
+        return entry, outcome
+
+    # -- filling -------------------------------------------------------------------
+
+    async def ensure(self, workshop_id: str, download, version: str = None, refresh: bool = False):
+        """Return (entry, "hit" | "coalesced" | "miss") for a workshop item
+
+        `download` is an async callable returning {"path", "version"} of a
+        fresh download; it runs only on a miss. refresh=True skips the cache
+        lookup to pick up a newer version (the download is still shared).
+        """
+        if not refresh:
+            entry = await self.lookup(workshop_id, version)
+            if entry is not None:
+                await self._touch(entry)
+                return self._hit(entry, "hit")
+
+        while (flight := self._inflight.get(workshop_id)) is not None:
+            try:
+                entry = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise  # we were cancelled, not the download
+                continue  # the download we waited on was cancelled; try again
+            if version is None or entry["version"] == version:
+                await self._touch(entry)
+                return self._hit(entry, "coalesced")
+            break
+
+        flight = asyncio.get_running_loop().create_future()
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())  # waiters are optional
+        self._inflight[workshop_id] = flight
+        try:
+            entry, outcome = await self._fill(workshop_id, download, version, refresh)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(entry)
+        finally:
+            if self._inflight.get(workshop_id) is flight:
+                del self._inflight[workshop_id]
+        await self._touch(entry)
+        if outcome == "miss":
+            self.stats["misses"] += 1
+            return entry, outcome
+        return self._hit(entry, outcome)
+
+    async def _lock(self, workshop_id: str):
+        """Per-item flock shared by every worker on the host"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock = open(self.root / f".{workshop_id}.lock", "w")
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock
+            except BlockingIOError:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+            except BaseException:
+                lock.close()
+                raise
+
+    async def _fill(self, workshop_id: str, download, version: str, refresh: bool):
+        lock = await self._lock(workshop_id)
+        try:
+            if not refresh:
+                # Another worker may have downloaded it while we waited for the lock
+                entry = await self.lookup(workshop_id, version)
+                if entry is not None:
+                    return entry, "hit"
+
+            fetched = await download()
+            existing = await self.lookup(workshop_id, fetched["version"])
+            if existing is not None:
+                # A refresh that found no newer version
+                return existing, "hit"
+
+            target = self.root / workshop_id / fetched["version"]
+            size = await asyncio.to_thread(self._store, Path(fetched["path"]), target)
+            now = datetime.now(timezone.utc)
+            entry = {
+                "host": HOSTNAME,
+                "workshop_id": workshop_id,
+                "version": fetched["version"],
+                "path": str(target),
+                "bytes": size,
+                "created_at": now,
+                "last_used_at": now,
+                "uses": 0,
+            }
+            try:
+                await self.db.mod_cache.insert_one(entry)
+            except DuplicateKeyError:
+                pass
+            self.stats["bytes_downloaded"] += size
+            return {k: v for k, v in entry.items() if k not in ENTRY_PROJECTION}, "miss"
+        finally:
+            lock.close()
+
+    @staticmethod
+    def _store(source: Path, target: Path) -> int:
+        """Move a finished download into the cache (blocking); returns its size"""
+        tmp = target.with_name(target.name + ".tmp")
+        if tmp.exists():
+            _remove_tree(tmp)
+        if target.exists():
+            _remove_tree(target)
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        # Moving keeps one copy on disk; SteamCMD simply fetches the item again next time
+        shutil.move(str(source), str(tmp))
+        _freeze(tmp)
+        os.rename(tmp, target)
+        return _tree_bytes(target)
+
+    # -- instances -----------------------------------------------------------------
+
+    @staticmethod
+    def link(entry: dict, install_path) -> str:
+        """Point <install_path>/mods/<workshop_id> at a cached version"""
+        mods = Path(install_path) / MODS_DIR
+        mods.mkdir(parents=True, exist_ok=True)
+        link = mods / entry["workshop_id"]
+        tmp = mods / f".{entry['workshop_id']}.tmp"
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        os.symlink(entry["path"], tmp)
+        os.replace(tmp, link)
+        return str(link)
+
+    @staticmethod
+    def unlink(install_path, workshop_id: str):
+        link = Path(install_path) / MODS_DIR / workshop_id
+        if link.is_symlink():
+            link.unlink()
+
+    # -- eviction ------------------------------------------------------------------
+
+    async def _referenced(self) -> set:
+        """(workshop_id, version) pairs some server's mod still uses"""
+        return {
+            (mod["workshop_id"], mod["cached_version"])
+            async for mod in self.db.mods.find(
+                {"cached_version": {"$ne": None}}, {"_id": 0, "workshop_id": 1, "cached_version": 1}
+            )
+        }
+
+    async def evict(self, budget_bytes: int = None) -> list:
+        """Remove unreferenced entries, least recently used first, until under budget"""
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        entries = await self.db.mod_cache.find({"host": HOSTNAME}, ENTRY_PROJECTION).sort("last_used_at", 1).to_list(None)
+        total = sum(entry["bytes"] for entry in entries)
+        if total <= budget:
+            return []
+        referenced = await self._referenced()
+        evicted = []
+        for entry in entries:
+            if total <= budget:
+                break
+            if entry["workshop_id"] in self._inflight or (entry["workshop_id"], entry["version"]) in referenced:
+                continue
+            await asyncio.to_thread(_remove_tree, entry["path"])
+            await self.db.mod_cache.delete_one(
+                {"host": HOSTNAME, "workshop_id": entry["workshop_id"], "version": entry["version"]}
+            )
+            total -= entry["bytes"]
+            self.stats["evictions"] += 1
+            self.stats["bytes_evicted"] += entry["bytes"]
+            evicted.append({"workshop_id": entry["workshop_id"], "version": entry["version"], "bytes": entry["bytes"]})
+        if total > budget:
+            logger.warning(f"Mod cache uses {total} bytes, over its {budget} byte budget, all of it referenced")
+        return evicted
+
+    async def usage(self) -> dict:
+        entries = await self.entries()
+        referenced = await self._referenced()
+        for entry in entries:
+            entry["referenced"] = (entry["workshop_id"], entry["version"]) in referenced
+        lookups = self.stats["hits"] + self.stats["coalesced"] + self.stats["misses"]
+        return {
+            "root": str(self.root),
+            "budget_bytes": self.budget_bytes,
+            "bytes": sum(entry["bytes"] for entry in entries),
+            "entries": entries,
+            "stats": {
+                **self.stats,
+                "hit_rate": round((lookups - self.stats["misses"]) / lookups, 3) if lookups else 0.0,
+            },
+        }
@@ -0,0 +1,145 @@
+"""
+Node agent: runs game servers on one machine on behalf of a remote panel.
+
+Run it on every game host next to the server files:
+
+    NODE_AGENT_TOKEN=<long random secret> uvicorn node_agent:app --host 0.0.0.0 --port 8101
+
+then register the host in the panel (POST /api/nodes) with its URL and the
+same token. Every request must carry `Authorization: Bearer <token>`;
+without NODE_AGENT_TOKEN set, the agent refuses all requests.
+
+The agent keeps no state of its own. The panel database stays the source
+of truth and sends the server document (install path, pid, ...) with each
+call, so restarting the agent never orphans a running server. Process
+handling is the same LocalProcesses the panel uses for its own host.
+
+For a single machine, register a node with the URL `loopback://`: the panel
+then serves this app in-process, which exercises the full node code path
+without a second process or port.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+from typing import List, Optional
+
+import psutil
+from fastapi import Depends, FastAPI, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from cluster import HOSTNAME
+from metrics import MetricsSampler
+from process_control import MAX_LOG_LINES, LocalProcesses
+
+logger = logging.getLogger(__name__)
+
+AGENT_VERSION = "1"
+REAP_INTERVAL_SECONDS = 1.0
+
+app = FastAPI(title="Tactical Command Panel node agent", docs_url=None, redoc_url=None)
+processes = LocalProcesses()
+sampler = MetricsSampler()
+_reaper = None  # asyncio.Task from start_reaper_task()
+
+
+class AgentServer(BaseModel):
+    """The subset of a ServerInstance document the agent needs"""
+    id: str
+    name: str = ""
+    game_type: str = "arma_reforger"
+    port: int = 0
+    max_players: int = 0
+    install_path: str
+    pid: Optional[int] = None
+
+
+class MetricsRequest(BaseModel):
+    servers: List[AgentServer] = []
+
+
+def require_token(authorization: Optional[str] = Header(None)):
+    expected = os.environ.get("NODE_AGENT_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=503, detail="NODE_AGENT_TOKEN is not configured on this node")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid node token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/v1/health", dependencies=[Depends(require_token)])
+async def health():
+    memory = psutil.virtual_memory()
+    return {
+        "hostname": HOSTNAME,
+        "version": AGENT_VERSION,
+        "cpu_count": psutil.cpu_count(),
+        "memory_total_bytes": memory.total,
+        "processes": len(processes.children),
+    }
+
+
+@app.get("/v1/ports", dependencies=[Depends(require_token)])
+async def bound_ports():
+    return {"bound": await processes.bound_ports()}
+
+
+@app.post("/v1/servers/start", dependencies=[Depends(require_token)])
+async def start(server: AgentServer):
+    return await processes.start(server.model_dump())
+
+
+@app.post("/v1/servers/stop", dependencies=[Depends(require_token)])
+async def stop(server: AgentServer):
+    return await processes.stop(server.model_dump())
+
+
+@app.post("/v1/servers/status", dependencies=[Depends(require_token)])
+async def status(server: AgentServer):
+    return {"running": await processes.is_running(server.model_dump())}
+
+
+@app.post("/v1/servers/logs", dependencies=[Depends(require_token)])
+async def logs(server: AgentServer, lines: int = Query(100, ge=1, le=MAX_LOG_LINES)):
+    return await processes.logs(server.model_dump(), lines)
+
+
+@app.post("/v1/servers/logs/stream", dependencies=[Depends(require_token)])
+async def stream_logs(server: AgentServer, lines: int = Query(100, ge=1, le=MAX_LOG_LINES), timeout: float = 300):
+    return StreamingResponse(
+        processes.follow_logs(server.model_dump(), lines, timeout),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
+@app.post("/v1/metrics", dependencies=[Depends(require_token)])
+async def metrics(request: MetricsRequest):
+    """Host gauges plus process stats for the given servers"""
+    servers = [server.model_dump() for server in request.servers]
+    await asyncio.to_thread(sampler.sample_local, servers)
+    return {
+        "hostname": HOSTNAME,
+        "host": sampler.host,
+        "servers": {server["id"]: server["process"] for server in servers},
+    }
+
+
+async def _reap():
+    while True:
+        processes.reap()
+        await asyncio.sleep(REAP_INTERVAL_SECONDS)
+
+
+def start_reaper_task():
+    """Reap exited servers in the background; a no-op if already running"""
+    global _reaper
+    if _reaper is None or _reaper.done():
+        _reaper = asyncio.create_task(_reap())
+
+
+@app.on_event("startup")
+async def start_reaper():
+    psutil.cpu_percent(interval=None)  # baseline for the first metrics call
+    start_reaper_task()
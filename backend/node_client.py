@@ -0,0 +1,189 @@
+"""
+Panel side of the node agent API (see node_agent.py).
+
+NodeClient has the same methods as process_control.LocalProcesses, so
+server routes call whichever one hosts the server without caring where it
+runs. Each node gets one pooled httpx client (keep-alive connections are
+reused across requests); log follows are streamed chunk by chunk rather
+than buffered. Agent errors come back as HTTPExceptions with the agent's
+status and detail; an unreachable node is a 502, a slow one a 504.
+"""
+
+import asyncio
+import logging
+
+import httpx
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+LOOPBACK_URL = "loopback://"
+# Fields of a server document the agent needs to act on it
+AGENT_SERVER_FIELDS = ("id", "name", "game_type", "port", "max_players", "install_path", "pid")
+
+
+def agent_server(server: dict) -> dict:
+    return {field: server.get(field) for field in AGENT_SERVER_FIELDS if server.get(field) is not None}
+
+
+class NodeClient:
+    def __init__(self, node: dict, timeout: float = 30.0):
+        self.node_id = node["id"]
+        self.name = node["name"]
+        self.local = None  # the in-process agent's LocalProcesses, for loopback nodes
+        if node["url"] == LOOPBACK_URL:
+            # Serve the agent app in-process, for single-machine setups and tests.
+            # ASGITransport runs no startup events and buffers whole responses,
+            # so start the agent's reaper here and follow logs on it directly.
+            import node_agent
+            transport = httpx.ASGITransport(app=node_agent.app)
+            base_url = "http://loopback"
+            node_agent.start_reaper_task()
+            self.local = node_agent.processes
+        else:
+            transport = None
+            base_url = node["url"].rstrip("/")
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            headers={"Authorization": f"Bearer {node['token']}"},
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=60),
+        )
+
+    def _unreachable(self, e: Exception) -> HTTPException:
+        if isinstance(e, httpx.TimeoutException):
+            return HTTPException(status_code=504, detail=f"Node {self.name} did not answer in time")
+        return HTTPException(status_code=502, detail=f"Node {self.name} is unreachable: {e}")
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    async def _post(self, path: str, json: dict, **params) -> dict:
+        try:
+            response = await self.http.post(path, json=json, params=params or None)
+        except httpx.HTTPError as e:
+            raise self._unreachable(e)
+        self._raise_for_status(response)
+        return response.json()
+
+    async def health(self) -> dict:
+        try:
+            response = await self.http.get("/v1/health")
+        except httpx.HTTPError as e:
+            raise self._unreachable(e)
+        self._raise_for_status(response)
+        return response.json()
+
+    async def bound_ports(self) -> list:
+        try:
+            response = await self.http.get("/v1/ports")
+        except httpx.HTTPError as e:
+            raise self._unreachable(e)
+        self._raise_for_status(response)
+        return response.json()["bound"]
+
+    async def is_running(self, server: dict) -> bool:
+        return (await self._post("/v1/servers/status", agent_server(server)))["running"]
+
+    async def start(self, server: dict) -> dict:
+        return await self._post("/v1/servers/start", agent_server(server))
+
+    async def stop(self, server: dict) -> dict:
+        return await self._post("/v1/servers/stop", agent_server(server))
+
+    async def logs(self, server: dict, lines: int) -> dict:
+        return await self._post("/v1/servers/logs", agent_server(server), lines=lines)
+
+    async def follow_logs(self, server: dict, lines: int, timeout: float):
+        if self.local is not None:
+            async for chunk in self.local.follow_logs(agent_server(server), lines, timeout):
+                yield chunk
+            return
+        request = self.http.build_request(
+            "POST", "/v1/servers/logs/stream",
+            json=agent_server(server),
+            params={"lines": lines, "timeout": timeout},
+            timeout=httpx.Timeout(30.0, read=None),
+        )
+        try:
+            response = await self.http.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise self._unreachable(e)
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                self._raise_for_status(response)
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            logger.warning(f"Log stream from node {self.name} ended: {e}")
+        finally:
+            await response.aclose()
+
+    async def metrics(self, servers: list) -> dict:
+        return await self._post("/v1/metrics", {"servers": [agent_server(server) for server in servers]})
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class NodePool:
+    """One NodeClient per registered node, created on first use"""
+
+    def __init__(self, db, timeout: float = 30.0):
+        self.db = db
+        self.timeout = timeout
+        self.clients: dict = {}  # node_id -> NodeClient
+
+    async def client(self, node_id: str) -> NodeClient:
+        client = self.clients.get(node_id)
+        if client is None:
+            node = await self.db.nodes.find_one({"id": node_id}, {"_id": 0})
+            if not node:
+                raise HTTPException(status_code=409, detail=f"Server is assigned to node {node_id}, which no longer exists")
+            # Another caller may have created it while we were reading the node
+            client = self.clients.get(node_id)
+            if client is None:
+                client = self.clients[node_id] = NodeClient(node, timeout=self.timeout)
+        return client
+
+    async def forget(self, node_id: str):
+        """Drop a node's client after its URL or token changed (or it was removed)"""
+        client = self.clients.pop(node_id, None)
+        if client is not None:
+            await client.close()
+
+    async def sample_processes(self, servers: list) -> dict:
+        """Fill each server's "process" from its node; return per-node host gauges"""
+        by_node: dict = {}
+        for server in servers:
+            server["process"] = None
+            by_node.setdefault(server["node_id"], []).append(server)
+
+        async def sample(node_id: str, node_servers: list):
+            name = node_id
+            try:
+                client = await self.client(node_id)
+                name = client.name
+                result = await client.metrics(node_servers)
+            except HTTPException as e:
+                logger.warning(f"Metrics from node {name} failed: {e.detail}")
+                return node_id, {"name": name, "up": False, "host": {}}
+            for server in node_servers:
+                server["process"] = result["servers"].get(server["id"])
+            return node_id, {"name": name, "up": True, "host": result["host"]}
+
+        results = await asyncio.gather(*(sample(node_id, group) for node_id, group in by_node.items()))
+        return dict(results)
+
+    async def close(self):
+        for node_id in list(self.clients):
+            await self.forget(node_id)
@@ -0,0 +1,348 @@
+"""
+Placement of server instances on hosts by allocated CPU cores and RAM.
+
+Every host that can run servers (the panel host, id "local", and each
+registered node) has one document in `capacity` holding its physical
+capacity and the running totals allocated to servers on it:
+
+    {"id", "name", "node_id", "schedulable",
+     "cpu_total", "cpu_allocated", "cpu_free",
+     "ram_total_gb", "ram_allocated_gb", "ram_free_gb", "servers"}
+
+The totals are kept incrementally: creating, resizing or deleting a server
+applies a single conditional $inc to its host's document, so checking that
+a server fits never rescans the servers collection. The reservation filter
+(`cpu_free >= cpu and ram_free_gb >= ram`) makes the check and the update
+one atomic step, so concurrent creates on any worker cannot oversubscribe a
+host between them.
+
+New servers are bin-packed best-fit: the schedulable host with the least
+free RAM that still fits both resources wins, found through the
+(ram_free_gb, cpu_free) index. That keeps large holes open for large
+servers. Servers are only counted from their host's servers when the host
+document is first created, or on an explicit recount.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCAL_HOST_ID = "local"
+# Another worker can take the best-fit host between the lookup and the reservation
+PLACEMENT_ATTEMPTS = 5
+GB = 1024 ** 3
+
+
+def host_id(server: dict) -> str:
+    """Capacity document id of the host a server is assigned to"""
+    return server.get("node_id") or LOCAL_HOST_ID
+
+
+def server_node_id(host: str):
+    """The node_id a server placed on `host` is stored with (None for the panel host)"""
+    return None if host == LOCAL_HOST_ID else host
+
+
+def _fits(host: dict, cpu: float, ram: float) -> bool:
+    return host["cpu_free"] >= cpu and host["ram_free_gb"] >= ram
+
+
+def _best_fit(hosts: list, cpu: float, ram: float, exclude=()):
+    candidates = [host for host in hosts if host["id"] not in exclude and host["schedulable"] and _fits(host, cpu, ram)]
+    return min(candidates, key=lambda host: (host["ram_free_gb"], host["cpu_free"]), default=None)
+
+
+def _move(server: dict, source: dict, target: dict) -> dict:
+    source["cpu_free"] += server["cpu_cores"]
+    source["ram_free_gb"] += server["ram_gb"]
+    target["cpu_free"] -= server["cpu_cores"]
+    target["ram_free_gb"] -= server["ram_gb"]
+    return {
+        "server_id": server["id"],
+        "name": server["name"],
+        "status": server.get("status", "offline"),
+        "cpu_cores": server["cpu_cores"],
+        "ram_gb": server["ram_gb"],
+        "from_host": source["id"],
+        "to_host": target["id"],
+    }
+
+
+def plan_room(hosts: list, servers_by_host: dict, cpu: float, ram: float):
+    """Fewest moves (greedy, largest servers first) that free cpu/ram on one host
+
+    Works on copies of the host documents; returns {"host", "moves"} or None.
+    """
+    plans = []
+    for host in hosts:
+        if not host["schedulable"]:
+            continue
+        sim = {h["id"]: dict(h) for h in hosts}
+        target = sim[host["id"]]
+        moves = []
+        for server in sorted(servers_by_host.get(host["id"], []), key=lambda s: (-s["ram_gb"], -s["cpu_cores"])):
+            if _fits(target, cpu, ram):
+                break
+            destination = _best_fit(list(sim.values()), server["cpu_cores"], server["ram_gb"], exclude=(host["id"],))
+            if destination is not None:
+                moves.append(_move(server, target, destination))
+        if _fits(target, cpu, ram):
+            plans.append({"host": host["id"], "moves": moves})
+    return min(plans, key=lambda plan: len(plan["moves"]), default=None)
+
+
+def plan_consolidation(hosts: list, servers_by_host: dict) -> list:
+    """Hosts that could be emptied by moving their servers onto the others
+
+    Tries the least allocated hosts first, carrying earlier moves forward, so
+    the suggestions can be applied together.
+    """
+    sim = {host["id"]: dict(host) for host in hosts}
+    drained = set()
+    suggestions = []
+    for host in sorted(hosts, key=lambda h: (h["ram_allocated_gb"], h["cpu_allocated"])):
+        servers = servers_by_host.get(host["id"], [])
+        if not servers:
+            continue
+        trial = {key: dict(h) for key, h in sim.items()}
+        moves = []
+        for server in sorted(servers, key=lambda s: (-s["ram_gb"], -s["cpu_cores"])):
+            destination = _best_fit(list(trial.values()), server["cpu_cores"], server["ram_gb"],
+                                    exclude=drained | {host["id"]})
+            if destination is None:
+                break
+            moves.append(_move(server, trial[host["id"]], destination))
+        if len(moves) == len(servers):
+            sim = trial
+            drained.add(host["id"])
+            suggestions.append({"drain_host": host["id"], "moves": moves})
+    return suggestions
+
+
+class Placement:
+    def __init__(self, db, cpu_overcommit: float = 1.0, ram_reserve_gb: float = 1.0):
+        self.db = db
+        self.cpu_overcommit = cpu_overcommit
+        self.ram_reserve_gb = ram_reserve_gb
+        self.stats = {"placed": 0, "rejected": 0, "queued": 0, "dequeued": 0, "races": 0}
+
+    # -- hosts -------------------------------------------------------------------
+
+    def capacity_from(self, cpu_count: int, memory_total_bytes: int) -> tuple:
+        """Schedulable (cpu, ram_gb) of a machine after overcommit and the OS reserve"""
+        cpu = round(cpu_count * self.cpu_overcommit, 2)
+        ram = round(max(memory_total_bytes / GB - self.ram_reserve_gb, 0), 2)
+        return cpu, ram
+
+    async def _allocated_on(self, host: str) -> tuple:
+        cpu = ram = count = 0
+        async for server in self.db.servers.find(
+            {"node_id": server_node_id(host), "status": {"$ne": "queued"}},
+            {"_id": 0, "cpu_cores": 1, "ram_gb": 1}
+        ):
+            cpu += server.get("cpu_cores", 0)
+            ram += server.get("ram_gb", 0)
+            count += 1
+        return cpu, ram, count
+
+    async def register_host(self, host: str, name: str, cpu_count: int, memory_total_bytes: int) -> dict:
+        """Create or update a host's physical capacity, keeping its allocations"""
+        cpu_total, ram_total = self.capacity_from(cpu_count, memory_total_bytes)
+        now = datetime.now(timezone.utc)
+        existing = await self.db.capacity.find_one({"id": host}, {"_id": 0})
+        if existing is None:
+            cpu, ram, count = await self._allocated_on(host)
+            try:
+                await self.db.capacity.insert_one({
+                    "id": host,
+                    "name": name,
+                    "node_id": server_node_id(host),
+                    "schedulable": True,
+                    "cpu_total": cpu_total,
+                    "cpu_allocated": cpu,
+                    "cpu_free": cpu_total - cpu,
+                    "ram_total_gb": ram_total,
+                    "ram_allocated_gb": ram,
+                    "ram_free_gb": ram_total - ram,
+                    "servers": count,
+                    "updated_at": now,
+                })
+                logger.info(f"Placement: added host {name} with {cpu_total} CPU, {ram_total} GB RAM")
+                return await self.db.capacity.find_one({"id": host}, {"_id": 0})
+            except DuplicateKeyError:
+                existing = await self.db.capacity.find_one({"id": host}, {"_id": 0})
+
+        # Shift the free totals by the change in capacity; $inc keeps concurrent reservations intact
+        return await self.db.capacity.find_one_and_update(
+            {"id": host},
+            {
+                "$set": {"name": name, "schedulable": True, "cpu_total": cpu_total,
+                         "ram_total_gb": ram_total, "updated_at": now},
+                "$inc": {"cpu_free": cpu_total - existing["cpu_total"],
+                         "ram_free_gb": ram_total - existing["ram_total_gb"]},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def set_schedulable(self, host: str, schedulable: bool):
+        """Unreachable nodes keep their allocations but take no new servers"""
+        await self.db.capacity.update_one({"id": host}, {"$set": {"schedulable": schedulable}})
+
+    async def remove_host(self, host: str):
+        await self.db.capacity.delete_one({"id": host})
+
+    async def hosts(self) -> list:
+        return await self.db.capacity.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+
+    async def recount(self) -> list:
+        """Recompute every host's allocations from the servers collection (repair only)"""
+        hosts = await self.hosts()
+        for host in hosts:
+            cpu, ram, count = await self._allocated_on(host["id"])
+            await self.db.capacity.update_one({"id": host["id"]}, {"$set": {
+                "cpu_allocated": cpu,
+                "cpu_free": host["cpu_total"] - cpu,
+                "ram_allocated_gb": ram,
+                "ram_free_gb": host["ram_total_gb"] - ram,
+                "servers": count,
+            }})
+        return await self.hosts()
+
+    # -- reservations ------------------------------------------------------------
+
+    async def reserve(self, host: str, cpu: float, ram: float, count: int = 1, new_only: bool = False) -> bool:
+        """Atomically allocate cpu/ram on a host if both still fit
+
+        `new_only` also requires the host to be schedulable, for new placements.
+        """
+        condition = {"id": host}
+        if new_only:
+            condition["schedulable"] = True
+        if cpu > 0:
+            condition["cpu_free"] = {"$gte": cpu}
+        if ram > 0:
+            condition["ram_free_gb"] = {"$gte": ram}
+        result = await self.db.capacity.update_one(condition, {"$inc": {
+            "cpu_allocated": cpu,
+            "cpu_free": -cpu,
+            "ram_allocated_gb": ram,
+            "ram_free_gb": -ram,
+            "servers": count,
+        }})
+        return result.matched_count == 1
+
+    async def release(self, server: dict):
+        await self.reserve(host_id(server), -server.get("cpu_cores", 0), -server.get("ram_gb", 0), count=-1)
+
+    async def place(self, cpu: float, ram: float, host: str = None):
+        """Reserve room for a server; returns the host id, or None when nothing fits
+
+        With `host` set, only that host is tried; otherwise best-fit over all
+        schedulable hosts.
+        """
+        if host is not None:
+            return host if await self.reserve(host, cpu, ram, new_only=True) else None
+
+        for _ in range(PLACEMENT_ATTEMPTS):
+            candidate = await self.db.capacity.find_one(
+                {"schedulable": True, "cpu_free": {"$gte": cpu}, "ram_free_gb": {"$gte": ram}},
+                {"_id": 0, "id": 1},
+                sort=[("ram_free_gb", 1), ("cpu_free", 1)]
+            )
+            if candidate is None:
+                return None
+            if await self.reserve(candidate["id"], cpu, ram, new_only=True):
+                return candidate["id"]
+            self.stats["races"] += 1
+        return None
+
+    async def place_server(self, server: dict, host: str = None, queue: bool = False) -> dict:
+        """Pick a host for a new server document; fills node_id (or status "queued")
+
+        Raises 409 when nothing fits and the caller did not ask to queue.
+        """
+        placed = await self.place(server["cpu_cores"], server["ram_gb"], host)
+        if placed is not None:
+            self.stats["placed"] += 1
+            server["node_id"] = server_node_id(placed)
+            return server
+        if queue:
+            self.stats["queued"] += 1
+            server["status"] = "queued"
+            server["placement_host"] = host
+            return server
+        self.stats["rejected"] += 1
+        where = "on that host" if host else "on any host"
+        raise HTTPException(
+            status_code=409,
+            detail=f"Not enough capacity {where} for {server['cpu_cores']} CPU cores and {server['ram_gb']} GB RAM; "
+                   f"retry with queue=true to wait for room, or see /api/placement for moves that would free it"
+        )
+
+    async def resize(self, server: dict, cpu_cores: int, ram_gb: int) -> bool:
+        """Change a placed server's allocation; growing must still fit its host"""
+        cpu = cpu_cores - server.get("cpu_cores", 0)
+        ram = ram_gb - server.get("ram_gb", 0)
+        if server.get("status") == "queued" or (cpu == 0 and ram == 0):
+            return True
+        return await self.reserve(host_id(server), cpu, ram, count=0)
+
+    async def drain_queue(self, limit: int = 100) -> list:
+        """Place queued servers, oldest first, on hosts that now have room"""
+        placed = []
+        queued = await self.db.servers.find(
+            {"status": "queued"},
+            {"_id": 0, "id": 1, "user_id": 1, "port": 1, "cpu_cores": 1, "ram_gb": 1, "placement_host": 1}
+        ).sort("created_at", 1).limit(limit).to_list(None)
+        for server in queued:
+            host = await self.place(server["cpu_cores"], server["ram_gb"], server.get("placement_host"))
+            if host is None:
+                continue
+            result = await self.db.servers.update_one(
+                {"id": server["id"], "status": "queued"},
+                {"$set": {"status": "offline", "node_id": server_node_id(host)}, "$unset": {"placement_host": ""}}
+            )
+            if result.modified_count == 0:
+                # Deleted or placed elsewhere meanwhile: give the room back
+                await self.reserve(host, -server["cpu_cores"], -server["ram_gb"], count=-1)
+                continue
+            self.stats["dequeued"] += 1
+            placed.append({**server, "host": host})
+        return placed
+
+    # -- reports -----------------------------------------------------------------
+
+    async def _servers_by_host(self, hosts: list) -> dict:
+        servers_by_host = {}
+        for host in hosts:
+            servers_by_host[host["id"]] = await self.db.servers.find(
+                {"node_id": server_node_id(host["id"]), "status": {"$ne": "queued"}},
+                {"_id": 0, "id": 1, "name": 1, "status": 1, "cpu_cores": 1, "ram_gb": 1}
+            ).to_list(None)
+        return servers_by_host
+
+    async def report(self, cpu: float = None, ram: float = None) -> dict:
+        hosts = await self.hosts()
+        servers_by_host = await self._servers_by_host(hosts)
+        report = {
+            "hosts": hosts,
+            "queued": await self.db.servers.count_documents({"status": "queued"}),
+            "consolidation": plan_consolidation(hosts, servers_by_host),
+            "settings": {"cpu_overcommit": self.cpu_overcommit, "ram_reserve_gb": self.ram_reserve_gb},
+            "stats": self.stats,
+        }
+        if cpu is not None and ram is not None:
+            fits = _best_fit(hosts, cpu, ram)
+            report["request"] = {
+                "cpu_cores": cpu,
+                "ram_gb": ram,
+                "fits_on": fits["id"] if fits else None,
+                "make_room": None if fits else plan_room(hosts, servers_by_host, cpu, ram),
+            }
+        return report
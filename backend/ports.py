@@ -0,0 +1,158 @@
+"""
+Per-host allocation of the UDP ports a game server binds.
+
+A server binds its game port and its A2S query port (game port + 16).
+Each port it holds is one document in `port_allocations`:
+
+    {"host", "port", "server_id", "kind", "created_at"}
+
+The unique (host, port) index is what makes a reservation safe: two
+servers, on any worker, can never both insert the same host/port, so an
+overlap is caught when the server is created or edited instead of as a
+bind failure at launch. A server's ports are inserted one by one and rolled
+back together if any of them is taken, so a server holds either its whole
+set or none of it.
+
+Free ports are found by probing candidates with point lookups on that
+index (O(log n) each). A per-host cursor continues from the last port
+handed out, so the usual allocation takes a single probe. Candidates that
+some other program on the host has bound are skipped too.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from placement import host_id
+
+logger = logging.getLogger(__name__)
+
+A2S_PORT_OFFSET = 16
+MAX_PORT = 65535
+PORT_KINDS = (("game", 0), ("a2s", A2S_PORT_OFFSET))
+
+
+def server_ports(port: int) -> dict:
+    """Every port a server on `port` binds, by kind"""
+    return {kind: port + offset for kind, offset in PORT_KINDS}
+
+
+class PortAllocator:
+    def __init__(self, db, range_start: int = 2001, range_end: int = 9999):
+        self.db = db
+        self.range_start = range_start
+        self.range_end = range_end
+        self.cursors: dict = {}  # host -> next candidate for allocate()
+        self.stats = {"reserved": 0, "allocated": 0, "conflicts": 0, "probes": 0}
+
+    def _check_range(self, port: int):
+        if port < 1 or port + A2S_PORT_OFFSET > MAX_PORT:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Port must be between 1 and {MAX_PORT - A2S_PORT_OFFSET} (the A2S port is port + {A2S_PORT_OFFSET})"
+            )
+
+    async def _insert(self, host: str, server_id: str, kind: str, port: int):
+        """Insert one allocation; returns None on success or the current holder's server_id"""
+        try:
+            await self.db.port_allocations.insert_one({
+                "host": host,
+                "port": port,
+                "server_id": server_id,
+                "kind": kind,
+                "created_at": datetime.now(timezone.utc),
+            })
+            return None
+        except DuplicateKeyError:
+            holder = await self.db.port_allocations.find_one({"host": host, "port": port}, {"_id": 0, "server_id": 1})
+            # Released in between: report it as taken anyway, the caller can simply retry
+            return holder["server_id"] if holder else ""
+
+    async def _try_reserve(self, host: str, server_id: str, port: int, bound=frozenset()):
+        """Claim a server's full port set on a host; returns None or the reason it failed"""
+        inserted = []
+        failure = None
+        for kind, candidate in server_ports(port).items():
+            holder = await self._insert(host, server_id, kind, candidate)
+            if holder == server_id:
+                # Already ours, e.g. the game port moved onto the old A2S port
+                await self.db.port_allocations.update_one({"host": host, "port": candidate}, {"$set": {"kind": kind}})
+                continue
+            if holder is not None:
+                failure = f"Port {candidate} ({kind}) is already used by another server on this host"
+                break
+            inserted.append(candidate)
+            if candidate in bound:
+                failure = f"Port {candidate} ({kind}) is already bound by another program on this host"
+                break
+
+        if failure is not None:
+            if inserted:
+                await self.db.port_allocations.delete_many(
+                    {"host": host, "server_id": server_id, "port": {"$in": inserted}}
+                )
+            self.stats["conflicts"] += 1
+            return failure
+
+        # Drop whatever the server held before (an old port, or another host)
+        await self.db.port_allocations.delete_many({
+            "server_id": server_id,
+            "$or": [{"host": {"$ne": host}}, {"port": {"$nin": list(server_ports(port).values())}}],
+        })
+        return None
+
+    async def reserve(self, host: str, server_id: str, port: int, bound=frozenset()):
+        """Reserve a chosen port set, raising 409 if any of it is taken"""
+        self._check_range(port)
+        failure = await self._try_reserve(host, server_id, port, bound)
+        if failure is not None:
+            raise HTTPException(status_code=409, detail=failure)
+        self.stats["reserved"] += 1
+
+    async def _is_free(self, host: str, port: int, bound) -> bool:
+        ports = list(server_ports(port).values())
+        if ports[-1] > MAX_PORT or any(candidate in bound for candidate in ports):
+            return False
+        self.stats["probes"] += 1
+        return await self.db.port_allocations.find_one(
+            {"host": host, "port": {"$in": ports}}, {"_id": 0, "port": 1}
+        ) is None
+
+    async def allocate(self, host: str, server_id: str, bound=frozenset()) -> int:
+        """Reserve the first free port set at or after the host's cursor, wrapping around"""
+        span = self.range_end - self.range_start + 1
+        start = self.cursors.get(host, self.range_start)
+        for step in range(span):
+            candidate = self.range_start + (start - self.range_start + step) % span
+            if not await self._is_free(host, candidate, bound):
+                continue
+            # Another worker may take it between the probe and the insert; then keep looking
+            if await self._try_reserve(host, server_id, candidate, bound) is None:
+                self.cursors[host] = candidate + 1
+                self.stats["allocated"] += 1
+                return candidate
+        raise HTTPException(
+            status_code=409,
+            detail=f"No free port pair left between {self.range_start} and {self.range_end} on this host"
+        )
+
+    async def release(self, server_id: str):
+        await self.db.port_allocations.delete_many({"server_id": server_id})
+
+    async def allocations(self, host: str) -> list:
+        return await self.db.port_allocations.find({"host": host}, {"_id": 0}).sort("port", 1).to_list(None)
+
+    async def backfill(self, servers) -> int:
+        """Record the ports of servers created before allocations were tracked"""
+        conflicts = 0
+        async for server in servers:
+            if not server.get("port") or server.get("status") == "queued":
+                continue
+            host = host_id(server)
+            failure = await self._try_reserve(host, server["id"], server["port"])
+            if failure is not None:
+                conflicts += 1
+                logger.warning(f"Server {server['id']} on {host}: {failure}; change its port to fix the overlap")
+        return conflicts
@@ -0,0 +1,258 @@
+"""
+Game server processes on this machine.
+
+LocalProcesses starts, stops and inspects server processes for the host it
+runs on. The panel uses it for servers without a node_id; node_agent.py
+uses the same class on every other host, so a server behaves identically
+wherever it is placed. NodeClient (node_client.py) has the same methods
+and runs them through a remote agent instead.
+
+Nothing here touches the database; callers pass the server document and
+record the returned pid themselves.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+from fastapi import HTTPException
+
+from cluster import HOSTNAME
+from ports import A2S_PORT_OFFSET
+from mod_cache import MODS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Where logs were written before servers logged into their install_path
+LEGACY_LOG_ROOT = Path("/tmp/arma_servers")
+STOP_GRACE_SECONDS = 10
+START_CHECK_SECONDS = 2
+FOLLOW_POLL_SECONDS = 0.5
+MAX_LOG_LINES = 10000  # most lines a logs request may ask for
+
+
+def server_executable(server: dict) -> Path:
+    server_dir = Path(server["install_path"])
+    if server["game_type"] == "arma_reforger":
+        return server_dir / "ArmaReforgerServer"
+    return server_dir / "Arma4Server"  # arma_4 (for future)
+
+
+def default_server_json(server: dict) -> dict:
+    return {
+        "bindAddress": "0.0.0.0",
+        "bindPort": server["port"],
+        "publicAddress": "",  # Leave empty for auto-detection
+        "publicPort": server["port"],
+        "a2s": {
+            "address": "",
+            "port": server["port"] + A2S_PORT_OFFSET
+        },
+        "game": {
+            "name": server["name"],
+            "password": "",
+            "passwordAdmin": "changeme",
+            "maxPlayers": server["max_players"],
+            "visible": True
+        },
+        "mods": []
+    }
+
+
+def latest_log_file(server: dict):
+    """Newest log in the server's logs directory, or the legacy location"""
+    logs = sorted((Path(server["install_path"]) / "logs").glob("server_*.log"))
+    if logs:
+        return logs[-1]
+    legacy = LEGACY_LOG_ROOT / server["id"] / "logs" / "server.log"
+    return legacy if legacy.exists() else None
+
+
+class LocalProcesses:
+    def __init__(self):
+        self.children: dict = {}  # pid -> Popen started by this process
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def track(self, process: subprocess.Popen):
+        """Remember a process we started so it can be reaped when it exits"""
+        self.children[process.pid] = process
+
+    def reap(self):
+        for pid, process in list(self.children.items()):
+            if process.poll() is not None:
+                del self.children[pid]
+
+    def is_alive(self, pid: int) -> bool:
+        process = self.children.get(pid)
+        if process is not None:
+            # poll() also reaps it, so an exited child never lingers as a zombie
+            return process.poll() is None
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def is_server_process(pid: int, install_path: str) -> bool:
+        """Guard against pid reuse: servers are started with cwd=install_path"""
+        try:
+            return os.path.realpath(psutil.Process(pid).cwd()) == os.path.realpath(install_path)
+        except psutil.AccessDenied:
+            return True
+        except (psutil.NoSuchProcess, psutil.ZombieProcess):
+            return False
+
+    @staticmethod
+    def _bound_ports() -> list:
+        ports = set()
+        for connection in psutil.net_connections(kind="inet"):
+            # Listening TCP sockets and every UDP socket (UDP has no listen state)
+            if connection.laddr and connection.status in (psutil.CONN_LISTEN, psutil.CONN_NONE):
+                ports.add(connection.laddr.port)
+        return sorted(ports)
+
+    async def bound_ports(self) -> list:
+        """Ports some process on this host is bound to"""
+        return await asyncio.to_thread(self._bound_ports)
+
+    # -- control -------------------------------------------------------------
+
+    async def is_running(self, server: dict) -> bool:
+        pid = server.get("pid")
+        return bool(pid) and self.is_alive(pid)
+
+    async def start(self, server: dict) -> dict:
+        """Launch the server and return {"pid", "log_file", "host"}"""
+        server_dir = Path(server["install_path"])
+        logs_dir = server_dir / "logs"
+        configs_dir = server_dir / "configs"
+        profiles_dir = server_dir / "profiles"
+
+        logs_dir.mkdir(parents=True, exist_ok=True)
+        configs_dir.mkdir(parents=True, exist_ok=True)
+        profiles_dir.mkdir(parents=True, exist_ok=True)
+
+        executable = server_executable(server)
+        if not executable.exists():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Server executable not found at {executable}. Install the server files first (Install Files on the server, or POST /api/servers/{server['id']}/install)."
+            )
+
+        # Make executable if not already; content store files are shared, so leave their mode alone otherwise
+        if not os.access(executable, os.X_OK):
+            executable.chmod(0o755)
+
+        config_file = configs_dir / "server.json"
+        if not config_file.exists():
+            with open(config_file, "w") as f:
+                json.dump(default_server_json(server), f, indent=2)
+
+        log_file = logs_dir / f"server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        cmd = [
+            str(executable),
+            f"-config={config_file}",
+            f"-profile={profiles_dir}",
+            "-maxFPS=60"
+        ]
+        mods_dir = server_dir / MODS_DIR
+        if mods_dir.is_dir():
+            cmd.append(f"-addonsDir={mods_dir}")  # links into the shared mod cache
+
+        try:
+            with open(log_file, "w") as log:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    cwd=str(server_dir),
+                    preexec_fn=os.setsid  # Create new process group for proper cleanup
+                )
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Failed to start server: {e}")
+        self.track(process)
+
+        # Wait a moment to check if process started successfully
+        await asyncio.sleep(START_CHECK_SECONDS)
+        if process.poll() is not None:
+            error_log = log_file.read_text(errors="replace")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Server failed to start. Check log file: {log_file}. Error: {error_log[-500:]}"
+            )
+
+        return {"pid": process.pid, "log_file": str(log_file), "host": HOSTNAME}
+
+    async def stop(self, server: dict) -> dict:
+        """SIGTERM the server's process group, SIGKILL it if still alive after the grace period"""
+        pid = server.get("pid")
+        if not pid or not self.is_alive(pid):
+            return {"stopped": False, "forced": False}
+        if not self.is_server_process(pid, server["install_path"]):
+            logger.warning(f"PID {pid} no longer belongs to server {server['id']}; not signalling it")
+            return {"stopped": False, "forced": False}
+
+        forced = False
+        try:
+            os.killpg(os.getpgid(pid), signal.SIGTERM)
+            for _ in range(STOP_GRACE_SECONDS):
+                if not self.is_alive(pid):
+                    break
+                await asyncio.sleep(1)
+            else:
+                try:
+                    os.killpg(os.getpgid(pid), signal.SIGKILL)
+                    forced = True
+                    logger.warning(f"Server {server['id']} required SIGKILL to stop")
+                except ProcessLookupError:
+                    pass
+        except ProcessLookupError:
+            pass  # Process already dead
+        except Exception as e:
+            logger.warning(f"Error stopping server {server['id']} (PID: {pid}): {e}")
+        return {"stopped": True, "forced": forced}
+
+    # -- logs ----------------------------------------------------------------
+
+    async def logs(self, server: dict, lines: int) -> dict:
+        log_file = latest_log_file(server)
+        if log_file is None:
+            return {"logs": "No logs available yet. Start the server to generate logs.", "lines": 0}
+
+        def tail():
+            with open(log_file, "r", errors="replace") as f:
+                return list(deque(f, maxlen=lines))
+
+        try:
+            last_lines = await asyncio.to_thread(tail)
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Error reading logs: {str(e)}")
+        return {"logs": "".join(last_lines), "lines": len(last_lines)}
+
+    async def follow_logs(self, server: dict, lines: int, timeout: float):
+        """Yield the last `lines` lines, then whatever is appended, for up to `timeout` seconds"""
+        initial = await self.logs(server, lines)
+        yield initial["logs"].encode()
+        log_file = latest_log_file(server)
+        if log_file is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        with open(log_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            while time.monotonic() < deadline:
+                chunk = f.read(64 * 1024)
+                if chunk:
+                    yield chunk
+                else:
+                    await asyncio.sleep(FOLLOW_POLL_SECONDS)
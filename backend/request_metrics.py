@@ -0,0 +1,235 @@
+"""
+Per-route request metrics as ASGI middleware.
+
+For every (method, route template, status) the middleware keeps a latency
+histogram and a response-size histogram, plus process-wide in-flight
+gauges. Histograms are HDR-style: log-linear buckets with ~1.5% relative
+precision over a fixed range, so memory stays constant no matter how many
+requests are recorded.
+
+Requests slower than the configured threshold are logged with the time
+spent awaiting the database (see storage.instrumented) separated from the
+rest of the handler, and kept in a short ring buffer for the admin API.
+"""
+
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+
+from storage.instrumented import DbTimer, db_timer
+
+logger = logging.getLogger(__name__)
+
+# 128 linear sub-buckets per power of two: values under 128 are exact, larger
+# values land in buckets 1/64 of their magnitude wide
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+
+class Histogram:
+    """Fixed-memory log-linear histogram of non-negative integers"""
+
+    __slots__ = ("max_value", "counts", "count", "total", "min", "max")
+
+    def __init__(self, max_value: int):
+        self.max_value = max_value
+        self.counts = array("Q", [0]) * (self._index(max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return shift * SUB_BUCKET_HALF + (value >> shift)
+
+    @staticmethod
+    def _upper_bound(index: int) -> int:
+        if index < SUB_BUCKET_COUNT:
+            return index
+        shift = index // SUB_BUCKET_HALF - 1
+        sub_bucket = index - shift * SUB_BUCKET_HALF
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value: int):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def percentiles(self, percents: tuple) -> list:
+        """Highest values equivalent to each (ascending) percentile, in one pass"""
+        if not self.count:
+            return [0] * len(percents)
+        targets = [max(1, round(self.count * percent / 100)) for percent in percents]
+        results = []
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            if not bucket:
+                continue
+            seen += bucket
+            while len(results) < len(targets) and seen >= targets[len(results)]:
+                results.append(min(self._upper_bound(index), self.max))
+            if len(results) == len(targets):
+                break
+        return results + [self.max] * (len(targets) - len(results))
+
+    def snapshot(self, scale: float = 1.0) -> dict:
+        p50, p90, p99, p999 = self.percentiles((50, 90, 99, 99.9))
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count / scale, 3) if self.count else 0.0,
+            "min": round((self.min or 0) / scale, 3),
+            "p50": round(p50 / scale, 3),
+            "p90": round(p90 / scale, 3),
+            "p99": round(p99 / scale, 3),
+            "p999": round(p999 / scale, 3),
+            "max": round(self.max / scale, 3),
+        }
+
+
+# Latencies are recorded in microseconds up to a minute, sizes in bytes up to 256 MiB
+LATENCY_MAX_US = 60 * 1_000_000
+SIZE_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Upper bounds (seconds) of the coarse buckets kept alongside each histogram
+# for Prometheus, so a scrape never has to walk the fine-grained counts
+EXPORT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_LATENCY_BUCKETS_US = tuple(int(bound * 1_000_000) for bound in EXPORT_LATENCY_BUCKETS)
+
+
+class RouteStats:
+    __slots__ = ("latency_us", "size_bytes", "db_ms", "export_buckets")
+
+    def __init__(self):
+        self.latency_us = Histogram(LATENCY_MAX_US)
+        self.size_bytes = Histogram(SIZE_MAX_BYTES)
+        self.db_ms = 0.0
+        # Non-cumulative counts per EXPORT_LATENCY_BUCKETS bound, last slot is +Inf
+        self.export_buckets = [0] * (len(EXPORT_LATENCY_BUCKETS) + 1)
+
+
+class RequestMetrics:
+    """Process-wide store shared by the middleware and the admin endpoint"""
+
+    def __init__(self, slow_request_ms: float = 1000, slow_log_size: int = 100):
+        self.slow_request_ms = slow_request_ms
+        self.routes: dict = {}  # (method, route, status) -> RouteStats
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.slow_requests = deque(maxlen=slow_log_size)
+        self.started_at = datetime.now(timezone.utc)
+
+    def record(self, method: str, route: str, status: int, elapsed_ms: float, size: int, timer: DbTimer):
+        key = (method, route, status)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        latency_us = int(elapsed_ms * 1000)
+        stats.latency_us.record(latency_us)
+        stats.export_buckets[bisect_left(EXPORT_LATENCY_BUCKETS_US, latency_us)] += 1
+        stats.size_bytes.record(size)
+        stats.db_ms += timer.ms
+
+        if elapsed_ms >= self.slow_request_ms:
+            handler_ms = max(elapsed_ms - timer.ms, 0.0)
+            logger.warning(
+                f"Slow request {method} {route} -> {status} in {elapsed_ms:.0f}ms "
+                f"(db {timer.ms:.0f}ms over {timer.calls} calls, handler {handler_ms:.0f}ms, {size} bytes)"
+            )
+            self.slow_requests.append({
+                "at": datetime.now(timezone.utc).isoformat(),
+                "method": method,
+                "route": route,
+                "status": status,
+                "elapsed_ms": round(elapsed_ms, 1),
+                "db_ms": round(timer.ms, 1),
+                "db_calls": timer.calls,
+                "handler_ms": round(handler_ms, 1),
+                "size_bytes": size,
+            })
+
+    def snapshot(self) -> dict:
+        routes = []
+        for (method, route, status), stats in sorted(self.routes.items()):
+            count = stats.latency_us.count
+            routes.append({
+                "method": method,
+                "route": route,
+                "status": status,
+                "count": count,
+                "latency_ms": stats.latency_us.snapshot(scale=1000),
+                "size_bytes": stats.size_bytes.snapshot(),
+                "db_ms_mean": round(stats.db_ms / count, 3) if count else 0.0,
+            })
+        return {
+            "since": self.started_at.isoformat(),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "slow_request_ms": self.slow_request_ms,
+            "routes": routes,
+            "slow_requests": list(self.slow_requests),
+        }
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+        self.route_paths: dict = {}
+
+    def _route_label(self, scope) -> str:
+        """Route template for the matched endpoint, so /servers/{server_id} is one series"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self.route_paths.get(endpoint)
+        if label is None:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    label = route.path
+                    break
+            else:
+                label = getattr(endpoint, "__name__", "unknown")
+            self.route_paths[endpoint] = label
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        timer = DbTimer()
+        token = db_timer.set(timer)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        metrics.peak_in_flight = max(metrics.peak_in_flight, metrics.in_flight)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.in_flight -= 1
+            db_timer.reset(token)
+            metrics.record(scope["method"], self._route_label(scope), status, elapsed_ms, size, timer)
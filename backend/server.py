@@ -1,9 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+# Imported first so the startup report's clock starts before the framework loads
+from startup_report import startup_report
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
 import logging
 from pathlib import Path
@@ -14,41 +16,130 @@ from datetime import datetime, timezone, timedelta
 import jwt
 from passlib.context import CryptContext
 import psutil
-import subprocess
 import asyncio
-import tarfile
-import urllib.request
-import signal
 import time
-import pyotp
-import qrcode
 import io
 import re
+import json
+import hashlib
+import secrets
+from collections import OrderedDict
+from db_indexes import ensure_indexes, index_status
+from migrate_datetimes import migrate_datetimes
+from compression import CompressionMiddleware, compression_stats
+from request_metrics import RequestMetrics, RequestMetricsMiddleware
+from metrics import MetricsSampler, render as render_metrics
+from loop_monitor import LoopMonitor
+from cluster import HOSTNAME, ClusterEvents, LeaderLease
+from supervisor import ProcessSupervisor
+from process_control import MAX_LOG_LINES, LocalProcesses
+from node_client import LOOPBACK_URL, NodeClient, NodePool
+from placement import LOCAL_HOST_ID, Placement, host_id
+from ports import PortAllocator, server_ports
+from jobs import JobQueue, JobError
+from content_store import ContentStore
+from mod_cache import ModCache
+from downloader import Downloader
+from config_sync import ModListSync, config_path
+from config_files import ConfigFiles, PatchConflict, PatchError, VersionMismatch, apply_json_patch, apply_merge_patch, patched_paths
+import installers
+from storage.pool_stats import pool_stats
+from storage import open_storage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+startup_report.mark("imports")
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Database connection (STORAGE_BACKEND=mongo|sqlite, see storage/__init__.py)
+client, db = open_storage(ROOT_DIR)
+startup_report.mark("storage_client")
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Run calibrate_bcrypt.py to pick a cost that suits this host; hashes below it
+# are flagged by needs_update() and upgraded on the owner's next login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
 security = HTTPBearer(auto_error=False)  # Don't auto-error, let us handle it
 SECRET_KEY = os.environ.get('SECRET_KEY', 'tactical-server-panel-secret-key-change-in-production')
 ALGORITHM = "HS256"
 
 # Configurable settings
 SESSION_TIMEOUT_MINUTES = int(os.environ.get('SESSION_TIMEOUT_MINUTES', '60'))  # Default 60 minutes
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))  # Short-lived, renewed via refresh token
+REFRESH_REUSE_GRACE_SECONDS = float(os.environ.get('REFRESH_REUSE_GRACE_SECONDS', '10'))  # Replays this soon after rotation are a tab race, not a leak
 PASSWORD_MIN_LENGTH = int(os.environ.get('PASSWORD_MIN_LENGTH', '8'))
 PASSWORD_REQUIRE_UPPERCASE = os.environ.get('PASSWORD_REQUIRE_UPPERCASE', 'true').lower() == 'true'
 PASSWORD_REQUIRE_LOWERCASE = os.environ.get('PASSWORD_REQUIRE_LOWERCASE', 'true').lower() == 'true'
 PASSWORD_REQUIRE_NUMBERS = os.environ.get('PASSWORD_REQUIRE_NUMBERS', 'true').lower() == 'true'
 PASSWORD_REQUIRE_SPECIAL = os.environ.get('PASSWORD_REQUIRE_SPECIAL', 'true').lower() == 'true'
 
-# TOTP settings
+# List endpoints
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+SERVER_OWNER_CACHE_SECONDS = int(os.environ.get('SERVER_OWNER_CACHE_SECONDS', '60'))
+DASHBOARD_CACHE_SECONDS = float(os.environ.get('DASHBOARD_CACHE_SECONDS', '2'))
+
+# Response compression (gzip, plus brotli/zstd when installed)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_OFFLOAD_BYTES = int(os.environ.get('COMPRESSION_OFFLOAD_BYTES', str(256 * 1024)))  # Compress in a thread above this
+
+# Request metrics
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))  # Log requests slower than this
+
+# Prometheus exposition at /metrics; without a token only loopback scrapes are allowed
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_SAMPLE_SECONDS = float(os.environ.get('METRICS_SAMPLE_SECONDS', '15'))
+
+# Event loop monitoring; a threshold > 0 enables stack capture of blocking callbacks
+LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get('LOOP_LAG_INTERVAL_SECONDS', '0.25'))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', '0'))
+
+# Multi-worker deployments (uvicorn --workers N, or several panels on one database)
+SUPERVISOR_LEASE_SECONDS = float(os.environ.get('SUPERVISOR_LEASE_SECONDS', '10'))  # Failover time after a leader dies
+SUPERVISOR_COMMAND_TIMEOUT_SECONDS = float(os.environ.get('SUPERVISOR_COMMAND_TIMEOUT_SECONDS', '90'))
+CLUSTER_POLL_SECONDS = float(os.environ.get('CLUSTER_POLL_SECONDS', '0.2'))  # Cache invalidation delay between workers
+
+# Remote node agents (node_agent.py) running game servers on other hosts
+NODE_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('NODE_REQUEST_TIMEOUT_SECONDS', '30'))
+LOG_STREAM_MAX_SECONDS = float(os.environ.get('LOG_STREAM_MAX_SECONDS', '300'))  # Longest a log follow stays open
+
+# Placement of new servers by cpu_cores/ram_gb (see placement.py)
+PLACEMENT_CPU_OVERCOMMIT = float(os.environ.get('PLACEMENT_CPU_OVERCOMMIT', '4'))  # Allocatable cores per physical core
+PLACEMENT_RAM_RESERVE_GB = float(os.environ.get('PLACEMENT_RAM_RESERVE_GB', '1'))  # Kept back on every host for the OS
+PLACEMENT_RETRY_SECONDS = float(os.environ.get('PLACEMENT_RETRY_SECONDS', '10'))  # How often queued servers are retried
+
+# Range game ports are handed out from when a server is created without one
+PORT_RANGE_START = int(os.environ.get('PORT_RANGE_START', '2001'))
+PORT_RANGE_END = int(os.environ.get('PORT_RANGE_END', '9999'))
+
+# Background jobs (SteamCMD, game file installs, mod downloads); see jobs.py
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # Jobs each panel worker runs at once
+JOB_STREAM_MAX_SECONDS = float(os.environ.get('JOB_STREAM_MAX_SECONDS', '300'))  # Longest a progress stream stays open
+STEAMCMD_DIR = Path(os.environ.get('STEAMCMD_DIR', str(Path.home() / "steamcmd")))
+STEAMCMD_URL = os.environ.get('STEAMCMD_URL', "https://steamcdn-a.akamaihd.net/client/installer/steamcmd_linux.tar.gz")
+STEAMCMD_SHA256 = os.environ.get('STEAMCMD_SHA256') or None  # Checked while downloading if set, e.g. for a pinned mirror
+DOWNLOAD_RETRIES = int(os.environ.get('DOWNLOAD_RETRIES', '5'))  # Resume attempts per stalled download
+
+# Game files are downloaded once into a shared store and linked into each instance (see content_store.py)
+CONTENT_STORE_DIR = Path(os.environ.get('CONTENT_STORE_DIR', str(Path.home() / "arma_content")))
+CONTENT_LINK_MODE = os.environ.get('CONTENT_LINK_MODE', 'hardlink')  # hardlink, reflink or copy
+# Workshop mods are cached once per version and shared by every server on the host (see mod_cache.py)
+MOD_CACHE_DIR = Path(os.environ.get('MOD_CACHE_DIR', str(CONTENT_STORE_DIR / "workshop")))
+MOD_CACHE_BUDGET_GB = float(os.environ.get('MOD_CACHE_BUDGET_GB', '50'))
+
+# TOTP settings (pyotp and qrcode are imported on first use, not at startup)
 TOTP_ISSUER = "Tactical Command Panel"
+TOTP_QR_CACHE_SIZE = int(os.environ.get('TOTP_QR_CACHE_SIZE', '256'))
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -198,9 +289,21 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     username: str
+    refresh_token: Optional[str] = None
     requires_totp_setup: bool = False
     totp_enabled: bool = False
     session_timeout_minutes: int = SESSION_TIMEOUT_MINUTES
+    access_token_expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TokenRefresh(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    session_timeout_minutes: int = SESSION_TIMEOUT_MINUTES
+    access_token_expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES
 
 class ServerInstance(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -210,7 +313,7 @@ class ServerInstance(BaseModel):
     port: int
     max_players: int
     current_players: int = 0
-    status: str = "offline"  # online, offline, restarting
+    status: str = "offline"  # online, offline, restarting, queued (waiting for capacity)
     install_path: str
     pid: Optional[int] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -220,24 +323,41 @@ class ServerInstance(BaseModel):
     ram_gb: int = 4  # RAM in GB
     storage_gb: int = 50  # Storage in GB
     network_speed_mbps: int = 100  # Network speed in Mbps
+    node_id: Optional[str] = None  # Node agent the server runs on; None = the panel host
+    content_build: Optional[str] = None  # Shared content build its game files are linked to
+    restart_required: bool = False  # server.json's mod list changed since the process started
 
 class ServerInstanceCreate(BaseModel):
     name: str
     game_type: str
-    port: int
+    port: Optional[int] = None  # None = the next free port pair on the chosen host
     max_players: int
     install_path: str
     cpu_cores: int = 2
     ram_gb: int = 4
     storage_gb: int = 50
     network_speed_mbps: int = 100
+    node_id: Optional[str] = None  # None = placed by the scheduler; "local" = the panel host
+
+class NodeCreate(BaseModel):
+    name: str
+    url: str  # http(s)://host:8101 of a node agent, or loopback:// for an in-process agent
+    token: str
+
+class NodeInfo(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    url: str
+    hostname: Optional[str] = None
+    created_at: datetime
 
 class ServerInstanceUpdate(BaseModel):
     name: Optional[str] = None
     port: Optional[int] = None
     max_players: Optional[int] = None
     current_players: Optional[int] = None
-    status: Optional[str] = None
+    # No status: it is owned by start/stop and placement (a "queued" server holds no reservation)
     cpu_cores: Optional[int] = None
     ram_gb: Optional[int] = None
     storage_gb: Optional[int] = None
@@ -280,6 +400,7 @@ class ServerMod(BaseModel):
     workshop_id: str
     name: str
     enabled: bool = True
+    cached_version: Optional[str] = None  # Mod cache version linked into the server's mods/ directory
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ServerModCreate(BaseModel):
@@ -301,13 +422,97 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_and_upgrade_password(user: dict, plain_password: str) -> bool:
+    """Verify a login password off the event loop, rehashing it if below BCRYPT_ROUNDS"""
+    valid, new_hash = await asyncio.to_thread(
+        pwd_context.verify_and_update, plain_password, user["hashed_password"]
+    )
+    
+    if valid and new_hash:
+        # Only replace the hash we verified, in case the password changed meanwhile
+        await db.users.update_one(
+            {"id": user["id"], "hashed_password": user["hashed_password"]},
+            {"$set": {"hashed_password": new_hash}}
+        )
+        logger.info(f"Upgraded password hash for user {user['username']} to {BCRYPT_ROUNDS} rounds")
+    
+    return valid
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Session ids revoked server-side, mapped to the time after which no access
+# token carrying them can still be valid. Checked on every authenticated request.
+revoked_session_ids: dict = {}
+
+def hash_refresh_token(refresh_token: str) -> str:
+    """Refresh tokens are random, so a fast hash is enough to store them safely"""
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+async def create_session(user_id: str, username: str) -> tuple:
+    """Start a refresh-token session and return (access_token, refresh_token)"""
+    session_id = str(uuid.uuid4())
+    refresh_token = secrets.token_urlsafe(48)
+    now = datetime.now(timezone.utc)
+    
+    await db.sessions.insert_one({
+        "id": session_id,
+        "user_id": user_id,
+        "username": username,
+        "token_hash": hash_refresh_token(refresh_token),
+        "previous_token_hash": None,
+        "revoked": False,
+        "created_at": now,
+        "expires_at": now + timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+    })
+    
+    access_token = create_access_token(
+        data={"sub": user_id, "username": username, "sid": session_id}
+    )
+    return access_token, refresh_token
+
+async def revoke_sessions(query: dict) -> int:
+    """Revoke every active session matching query and add them to the revocation list"""
+    now = datetime.now(timezone.utc)
+    # Keep revoked sessions around only as long as an access token issued for
+    # them could still be presented; the TTL index removes them afterwards.
+    revoked_until = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # Tagged so exactly the sessions this call revoked can be read back, however many
+    revocation_id = str(uuid.uuid4())
+    result = await db.sessions.update_many(
+        {**query, "revoked": False},
+        {"$set": {"revoked": True, "expires_at": revoked_until, "revocation_id": revocation_id}}
+    )
+    
+    if not result.modified_count:
+        return 0
+    
+    session_ids = [
+        session["id"] async for session in db.sessions.find({"revocation_id": revocation_id}, {"_id": 0, "id": 1})
+    ]
+    
+    for session_id, until in list(revoked_session_ids.items()):
+        if until < now:
+            del revoked_session_ids[session_id]
+    for session_id in session_ids:
+        revoked_session_ids[session_id] = revoked_until
+    await cluster_events.publish("sessions_revoked", {"session_ids": session_ids, "until": revoked_until})
+    
+    return len(session_ids)
+
+async def load_revoked_sessions():
+    """Rebuild the revocation list from sessions revoked within the access token lifetime"""
+    revoked = await db.sessions.find(
+        {"revoked": True, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "id": 1, "expires_at": 1}
+    ).to_list(None)
+    for session in revoked:
+        revoked_session_ids[session["id"]] = session["expires_at"]
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
         # Handle case where no credentials are provided
@@ -328,6 +533,14 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
+        session_id = payload.get("sid")
+        if session_id and session_id in revoked_session_ids:
+            raise HTTPException(
+                status_code=401,
+                detail="Session has been revoked. Please log in again.",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        
         # Check if token is expired
         exp = payload.get("exp")
         if exp and datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(timezone.utc):
@@ -337,7 +550,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
-        return {"user_id": user_id, "username": payload.get("username")}
+        return {"user_id": user_id, "username": payload.get("username"), "session_id": session_id}
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=401,
@@ -362,6 +575,13 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
 
 
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for admin-only routes"""
+    admin = await db.users.find_one({"id": current_user["user_id"]}, {"_id": 0, "is_admin": 1})
+    if not admin or not admin.get("is_admin"):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 async def check_server_permission(
     server_id: str,
     user_id: str,
@@ -384,6 +604,271 @@ async def check_server_permission(
     
     return False
 
+# server_id -> (owner user_id, monotonic expiry). Ownership never changes after
+# creation, so mod and config routes can skip the servers lookup while warm.
+server_owner_cache: dict = {}
+
+async def verify_server_owner(server_id: str, user_id: str) -> None:
+    """Raise 404 unless user_id owns server_id, using the ownership cache when possible"""
+    cached = server_owner_cache.get(server_id)
+    if cached and cached[1] > time.monotonic():
+        if cached[0] != user_id:
+            raise HTTPException(status_code=404, detail="Server not found")
+        return
+    
+    server = await db.servers.find_one({"id": server_id}, {"_id": 0, "user_id": 1})
+    if not server:
+        server_owner_cache.pop(server_id, None)
+        raise HTTPException(status_code=404, detail="Server not found")
+    
+    server_owner_cache[server_id] = (server["user_id"], time.monotonic() + SERVER_OWNER_CACHE_SECONDS)
+    if server["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+class MicroCache:
+    """Short-lived cache where concurrent misses for a key share one load"""
+    
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: dict = {}  # key -> (expires_at, value)
+        self.inflight: dict = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, key, load):
+        entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        
+        self.misses += 1
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        # Shielded so one caller disconnecting does not cancel the load for the others
+        return await asyncio.shield(task)
+    
+    def _settle(self, key, task):
+        if self.inflight.get(key) is not task:
+            return  # invalidated while loading
+        del self.inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        if len(self.entries) >= self.max_entries:
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+        self.entries[key] = (now + self.ttl, task.result())
+    
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+        # A load already running may have read the old state; don't let it repopulate
+        self.inflight.pop(key, None)
+
+# Per-route latency/size histograms, filled by RequestMetricsMiddleware
+request_metrics = RequestMetrics(slow_request_ms=SLOW_REQUEST_MS)
+
+# Host, process and per-server gauges refreshed in the background for /metrics
+metrics_sampler = MetricsSampler(interval=METRICS_SAMPLE_SECONDS)
+
+# Loop lag histogram and (optionally) the blocking-call report
+loop_monitor = LoopMonitor(interval=LOOP_LAG_INTERVAL_SECONDS, threshold_ms=LOOP_BLOCK_THRESHOLD_MS)
+loop_monitor.on_lag = lambda lag: metrics_sampler.record_lag("event_loop", lag)
+
+# Landing-page data: per-owner server lists and the host resource sample
+dashboard_cache = MicroCache(DASHBOARD_CACHE_SECONDS)
+
+# Multi-worker coordination: one elected worker owns game server processes,
+# and per-worker caches are kept coherent through broadcast invalidations
+cluster_events = ClusterEvents(db, poll_interval=CLUSTER_POLL_SECONDS)
+leader_lease = LeaderLease(db, "process-supervisor", lease_seconds=SUPERVISOR_LEASE_SECONDS)
+local_processes = LocalProcesses()
+process_supervisor = ProcessSupervisor(
+    db, leader_lease, cluster_events, local_processes, command_timeout=SUPERVISOR_COMMAND_TIMEOUT_SECONDS
+)
+
+# Pooled HTTP clients for node agents; servers with a node_id run there
+node_pool = NodePool(db, timeout=NODE_REQUEST_TIMEOUT_SECONDS)
+metrics_sampler.sample_remote = node_pool.sample_processes
+
+# Per-host allocated vs physical capacity; new servers are bin-packed onto it
+placement = Placement(db, cpu_overcommit=PLACEMENT_CPU_OVERCOMMIT, ram_reserve_gb=PLACEMENT_RAM_RESERVE_GB)
+
+# Game and A2S ports held per host, so two servers never share one
+port_allocator = PortAllocator(db, range_start=PORT_RANGE_START, range_end=PORT_RANGE_END)
+
+# Long-running operations run as persistent jobs instead of inside the request
+job_queue = JobQueue(db, concurrency=JOB_WORKERS)
+downloader = Downloader(retries=DOWNLOAD_RETRIES)
+job_queue.register("steamcmd_install", lambda ctx: installers.install_steamcmd(ctx, downloader))
+
+content_store = ContentStore(CONTENT_STORE_DIR, link_mode=CONTENT_LINK_MODE)
+mod_cache = ModCache(db, MOD_CACHE_DIR, budget_bytes=int(MOD_CACHE_BUDGET_GB * 1024 ** 3))
+mod_list_sync = ModListSync(db, servers_changed=lambda user_id: servers_changed(user_id))
+config_files = ConfigFiles()
+
+# Conditional GET: in-process version counters, bumped on every mutation of a
+# resource, become ETags so unchanged polls are answered with 304 before any
+# database or disk read. The epoch keeps tags from a previous process (whose
+# counters restarted at zero) from ever matching.
+RESOURCE_EPOCH = secrets.token_hex(4)
+resource_versions: dict = {}
+conditional_get_stats: dict = {}  # resource -> {"requests", "not_modified"}
+
+def bump_version(key):
+    resource_versions[key] = resource_versions.get(key, 0) + 1
+
+# Each mutation is applied locally, then broadcast so every other worker drops
+# its copy too (handlers registered with cluster_events below)
+def invalidate_servers(user_id: str):
+    bump_version(("servers", user_id))
+    dashboard_cache.invalidate(("servers", user_id))
+
+def invalidate_mods(server_id: str, server_deleted: bool = False):
+    bump_version(("mods", server_id))
+    if server_deleted:
+        server_owner_cache.pop(server_id, None)
+
+async def servers_changed(user_id: str):
+    """Call after any write to one of the user's server documents"""
+    invalidate_servers(user_id)
+    await cluster_events.publish("servers", {"user_id": user_id})
+
+async def mods_changed(server_id: str, server_deleted: bool = False):
+    """Call after any write to a server's mods (or deleting the server)"""
+    invalidate_mods(server_id, server_deleted)
+    await cluster_events.publish("mods", {"server_id": server_id, "server_deleted": server_deleted})
+    if not server_deleted:
+        mod_list_sync.schedule(server_id)
+
+async def resync_local_state():
+    """Drop every per-worker cache after missing broadcasts"""
+    global RESOURCE_EPOCH
+    RESOURCE_EPOCH = secrets.token_hex(4)  # invalidates every ETag handed out so far
+    dashboard_cache.entries.clear()
+    dashboard_cache.inflight.clear()
+    server_owner_cache.clear()
+    await load_revoked_sessions()
+
+cluster_events.on("servers", lambda data: invalidate_servers(data["user_id"]))
+cluster_events.on("mods", lambda data: invalidate_mods(data["server_id"], data["server_deleted"]))
+cluster_events.on("sessions_revoked", lambda data: revoked_session_ids.update(
+    dict.fromkeys(data["session_ids"], data["until"])
+))
+cluster_events.on("nodes", lambda data: asyncio.ensure_future(node_pool.forget(data["node_id"])))
+cluster_events.on_resync = resync_local_state
+
+def resource_etag(key, *variant) -> str:
+    """Strong ETag for the current version of a resource (and query variant)"""
+    digest = hashlib.sha1(repr((key, resource_versions.get(key, 0), variant)).encode()).hexdigest()
+    return f'"{RESOURCE_EPOCH}-{digest[:16]}"'
+
+def file_etag(stat) -> str:
+    """Strong ETag from a file's mtime and size"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def conditional_headers(etag: str) -> dict:
+    # no-cache: browsers keep the body but revalidate with If-None-Match on every poll
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(resource: str, if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """Return a 304 when the client's copy is current, counting hits per resource"""
+    stats = conditional_get_stats.setdefault(resource, {"requests": 0, "not_modified": 0})
+    stats["requests"] += 1
+    if etag_matches(if_none_match, etag):
+        stats["not_modified"] += 1
+        return Response(status_code=304, headers=conditional_headers(etag))
+    return None
+
+def json_default(value):
+    """JSON fallback for values Mongo hands back (datetimes), formatted like pydantic"""
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(value) -> bytes:
+    """Serialize trusted DB output straight to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, default=json_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, default=json_default, separators=(",", ":")).encode()
+
+def lean_fields(model):
+    """Projection and static defaults for serving a model's documents without validation
+    
+    Stored documents are written from the model, so they only need the model's
+    fields projected and defaults filled in for fields added after they were written.
+    """
+    projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+    defaults = {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+    return projection, defaults
+
+def with_defaults(doc: dict, defaults: dict) -> dict:
+    """Fill in defaults missing from an older document"""
+    if defaults.keys() <= doc.keys():
+        return doc
+    return {**defaults, **doc}
+
+SERVER_LIST_PROJECTION, SERVER_LIST_DEFAULTS = lean_fields(ServerInstance)
+MOD_LIST_PROJECTION, MOD_LIST_DEFAULTS = lean_fields(ServerMod)
+
+async def stream_ndjson(cursor, defaults: Optional[dict] = None):
+    """Yield one JSON document per line as the cursor produces them"""
+    async for doc in cursor:
+        if defaults:
+            doc = with_defaults(doc, defaults)
+        yield dumps_json(doc) + b"\n"
+
+async def list_documents(
+    collection,
+    query: dict,
+    projection: dict,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    defaults: Optional[dict] = None
+):
+    """Shared list handler with keyset pagination on `id` and NDJSON streaming
+    
+    - stream=true: stream every matching document (after `after`) as NDJSON
+    - after/limit: return one page, with X-Next-Cursor set when more remain
+    - neither: return the full list, oldest first
+    
+    Documents are encoded directly instead of going through the route's
+    response_model, which would validate and re-serialize every one.
+    """
+    if after:
+        query = {**query, "id": {"$gt": after}}
+    
+    if stream:
+        cursor = collection.find(query, projection).sort("id", 1).batch_size(MAX_PAGE_SIZE)
+        return StreamingResponse(stream_ndjson(cursor, defaults), media_type="application/x-ndjson")
+    
+    headers = {}
+    if after or limit:
+        limit = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+        docs = await collection.find(query, projection).sort("id", 1).limit(limit + 1).to_list(limit + 1)
+        if len(docs) > limit:
+            docs = docs[:limit]
+            headers["X-Next-Cursor"] = docs[-1]["id"]
+    else:
+        docs = await collection.find(query, projection).sort("created_at", 1).to_list(None)
+    
+    if defaults:
+        docs = [with_defaults(doc, defaults) for doc in docs]
+    return Response(dumps_json(docs), media_type="application/json", headers=headers)
+
 # Authentication routes
 @api_router.get("/auth/check-first-run")
 async def check_first_run():
@@ -413,19 +898,16 @@ async def first_time_setup(setup_data: FirstTimeSetup):
         is_admin=True
     )
     
-    doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.users.insert_one(doc)
+    await db.users.insert_one(user.model_dump())
     
-    # Create token
-    access_token = create_access_token(
-        data={"sub": user.id, "username": user.username}
-    )
+    # Create session tokens
+    access_token, refresh_token = await create_session(user.id, user.username)
     
     return Token(
         access_token=access_token,
         token_type="bearer",
         username=user.username,
+        refresh_token=refresh_token,
         requires_totp_setup=True,  # First admin login should setup TOTP
         totp_enabled=False
     )
@@ -453,19 +935,16 @@ async def register(user_data: UserCreate):
         is_admin=False
     )
     
-    doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.users.insert_one(doc)
+    await db.users.insert_one(user.model_dump())
     
-    # Create token
-    access_token = create_access_token(
-        data={"sub": user.id, "username": user.username}
-    )
+    # Create session tokens
+    access_token, refresh_token = await create_session(user.id, user.username)
     
     return Token(
         access_token=access_token,
         token_type="bearer",
-        username=user.username
+        username=user.username,
+        refresh_token=refresh_token
     )
 
 @api_router.post("/auth/login", response_model=Token)
@@ -476,7 +955,7 @@ async def login(user_data: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
     # Verify password
-    if not verify_password(user_data.password, user["hashed_password"]):
+    if not await verify_and_upgrade_password(user, user_data.password):
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
     # Check if TOTP is enabled
@@ -487,6 +966,7 @@ async def login(user_data: UserLogin):
         if not user_data.totp_code:
             raise HTTPException(status_code=401, detail="2FA code required")
         
+        import pyotp
         totp = pyotp.TOTP(user["totp_secret"])
         if not totp.verify(user_data.totp_code, valid_window=1):
             raise HTTPException(status_code=401, detail="Invalid 2FA code")
@@ -494,13 +974,11 @@ async def login(user_data: UserLogin):
     # Update last login
     await db.users.update_one(
         {"id": user["id"]},
-        {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"last_login": datetime.now(timezone.utc)}}
     )
     
-    # Create token
-    access_token = create_access_token(
-        data={"sub": user["id"], "username": user["username"]}
-    )
+    # Create session tokens
+    access_token, refresh_token = await create_session(user["id"], user["username"])
     
     # Check if admin needs to setup TOTP (first login after creation)
     requires_totp_setup = (
@@ -513,6 +991,7 @@ async def login(user_data: UserLogin):
         access_token=access_token,
         token_type="bearer",
         username=user["username"],
+        refresh_token=refresh_token,
         requires_totp_setup=requires_totp_setup,
         totp_enabled=totp_enabled
     )
@@ -558,8 +1037,57 @@ async def reset_password(reset_data: PasswordResetRequest):
         {"$set": {"hashed_password": new_hashed_password}}
     )
     
+    # Sign out every existing session for this account
+    await revoke_sessions({"user_id": user["id"]})
+    
     return {"message": "Password reset successfully"}
 
+@api_router.post("/auth/refresh", response_model=TokenRefresh)
+async def refresh_session(refresh_data: RefreshRequest):
+    """Rotate a refresh token and issue a new access token (no password check)"""
+    token_hash = hash_refresh_token(refresh_data.refresh_token)
+    new_refresh_token = secrets.token_urlsafe(48)
+    now = datetime.now(timezone.utc)
+    
+    session = await db.sessions.find_one_and_update(
+        {"token_hash": token_hash, "revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {
+            "token_hash": hash_refresh_token(new_refresh_token),
+            "previous_token_hash": token_hash,
+            "rotated_at": now,
+            "expires_at": now + timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+        }},
+        projection={"_id": 0, "id": 1, "user_id": 1, "username": 1}
+    )
+    
+    if not session:
+        # A refresh token that was already rotated out is being replayed,
+        # so treat it as leaked and end the whole session. Right after the
+        # rotation it is more likely a second tab that refreshed at the same
+        # moment; that request just fails, and the tab picks up the new token.
+        await revoke_sessions({
+            "previous_token_hash": token_hash,
+            "$or": [
+                {"rotated_at": {"$lte": now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)}},
+                {"rotated_at": {"$exists": False}},
+            ],
+        })
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    access_token = create_access_token(
+        data={"sub": session["user_id"], "username": session["username"], "sid": session["id"]}
+    )
+    
+    return TokenRefresh(access_token=access_token, refresh_token=new_refresh_token)
+
+@api_router.post("/auth/logout")
+async def logout(current_user: dict = Depends(get_current_user)):
+    """Revoke the session behind the current access token"""
+    if current_user.get("session_id"):
+        await revoke_sessions({"id": current_user["session_id"]})
+    
+    return {"message": "Logged out successfully"}
+
 @api_router.get("/auth/security-questions/{username}")
 async def get_security_questions(username: str):
     """Get the security questions for a user (not the answers)"""
@@ -593,6 +1121,7 @@ async def setup_totp(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Generate new TOTP secret
+    import pyotp
     totp_secret = pyotp.random_base32()
     
     # Store secret (not enabled yet)
@@ -614,33 +1143,75 @@ async def setup_totp(current_user: dict = Depends(get_current_user)):
         "qr_code_url": f"/api/auth/totp/qr/{current_user['user_id']}"
     }
 
+# Rendered QR images keyed by a hash of (user id, secret, format). The image
+# only changes when the secret does, so the key doubles as a strong ETag.
+totp_qr_cache: OrderedDict = OrderedDict()
+
+TOTP_QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+def render_totp_qr(provisioning_uri: str, image_format: str) -> bytes:
+    """Render a provisioning URI as a QR image (CPU-bound, run in a thread)"""
+    # qrcode pulls in PIL; only load it once someone actually sets up 2FA
+    import qrcode
+    import qrcode.image.svg
+    
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(provisioning_uri)
+    qr.make(fit=True)
+    
+    buf = io.BytesIO()
+    if image_format == "svg":
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        img.save(buf)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buf, format='PNG')
+    return buf.getvalue()
+
 @api_router.get("/auth/totp/qr/{user_id}")
-async def get_totp_qr(user_id: str):
+async def get_totp_qr(
+    user_id: str,
+    format: str = "png",
+    if_none_match: Optional[str] = Header(None)
+):
     """Generate QR code for TOTP setup"""
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user or not user.get("totp_secret"):
-        raise HTTPException(status_code=404, detail="TOTP not set up")
+    if format not in TOTP_QR_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be 'png' or 'svg'")
     
-    # Generate provisioning URI
-    totp = pyotp.TOTP(user["totp_secret"])
-    provisioning_uri = totp.provisioning_uri(
-        name=user["username"],
-        issuer_name=TOTP_ISSUER
+    user = await db.users.find_one(
+        {"id": user_id},
+        {"_id": 0, "username": 1, "totp_secret": 1}
     )
+    if not user or not user.get("totp_secret"):
+        raise HTTPException(status_code=404, detail="TOTP not set up")
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(provisioning_uri)
-    qr.make(fit=True)
+    cache_key = hashlib.sha256(
+        f"{user_id}:{user['totp_secret']}:{format}".encode()
+    ).hexdigest()
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
     
-    img = qr.make_image(fill_color="black", back_color="white")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
     
-    # Convert to bytes
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    buf.seek(0)
+    content = totp_qr_cache.get(cache_key)
+    if content is None:
+        # Generate provisioning URI
+        import pyotp
+        totp = pyotp.TOTP(user["totp_secret"])
+        provisioning_uri = totp.provisioning_uri(
+            name=user["username"],
+            issuer_name=TOTP_ISSUER
+        )
+        
+        content = await asyncio.to_thread(render_totp_qr, provisioning_uri, format)
+        totp_qr_cache[cache_key] = content
+        if len(totp_qr_cache) > TOTP_QR_CACHE_SIZE:
+            totp_qr_cache.popitem(last=False)
+    else:
+        totp_qr_cache.move_to_end(cache_key)
     
-    return StreamingResponse(buf, media_type="image/png")
+    return Response(content=content, media_type=TOTP_QR_MEDIA_TYPES[format], headers=headers)
 
 @api_router.post("/auth/totp/verify")
 async def verify_totp_setup(
@@ -653,6 +1224,7 @@ async def verify_totp_setup(
         raise HTTPException(status_code=400, detail="TOTP not set up")
     
     # Verify code
+    import pyotp
     totp = pyotp.TOTP(user["totp_secret"])
     if not totp.verify(verify_data.totp_code, valid_window=1):
         raise HTTPException(status_code=401, detail="Invalid TOTP code")
@@ -700,31 +1272,59 @@ async def get_totp_status(current_user: dict = Depends(get_current_user)):
 @api_router.post("/servers", response_model=ServerInstance)
 async def create_server_instance(
     server_data: ServerInstanceCreate,
+    queue: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
+    """Create a server on the requested host, or the best-fitting one; queue=true waits for room"""
+    requested_host = server_data.node_id
+    if requested_host and requested_host != LOCAL_HOST_ID and not await db.nodes.find_one(
+        {"id": requested_host}, {"_id": 0, "id": 1}
+    ):
+        raise HTTPException(status_code=400, detail="Node not found")
+    
     server = ServerInstance(
-        **server_data.model_dump(),
+        **server_data.model_dump(exclude={"node_id", "port"}),
+        port=server_data.port or 0,  # a queued server without a port gets one when it is placed
         user_id=current_user["user_id"]
-    )
+    ).model_dump()
+    await placement.place_server(server, requested_host, queue=queue)
     
-    doc = server.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.servers.insert_one(doc)
+    try:
+        if server["status"] != "queued":
+            await assign_ports(server, server_data.port)
+        await db.servers.insert_one(server)
+    except Exception:
+        if server["status"] != "queued":
+            await placement.release(server)
+            await port_allocator.release(server["id"])
+        raise
+    server.pop("_id", None)
+    await servers_changed(current_user["user_id"])
     
     return server
 
 @api_router.get("/servers", response_model=List[ServerInstance])
-async def get_server_instances(current_user: dict = Depends(get_current_user)):
-    servers = await db.servers.find(
-        {"user_id": current_user["user_id"]},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for server in servers:
-        if isinstance(server['created_at'], str):
-            server['created_at'] = datetime.fromisoformat(server['created_at'])
+async def get_server_instances(
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    etag = resource_etag(("servers", current_user["user_id"]), after, limit, stream)
+    cached = not_modified("servers", if_none_match, etag)
+    if cached:
+        return cached
     
-    return servers
+    response = await list_documents(
+        db.servers,
+        {"user_id": current_user["user_id"]},
+        SERVER_LIST_PROJECTION,
+        after, limit, stream,
+        defaults=SERVER_LIST_DEFAULTS
+    )
+    response.headers.update(conditional_headers(etag))
+    return response
 
 @api_router.get("/servers/{server_id}", response_model=ServerInstance)
 async def get_server_instance(
@@ -739,9 +1339,6 @@ async def get_server_instance(
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     
-    if isinstance(server['created_at'], str):
-        server['created_at'] = datetime.fromisoformat(server['created_at'])
-    
     return server
 
 @api_router.patch("/servers/{server_id}", response_model=ServerInstance)
@@ -762,16 +1359,33 @@ async def update_server_instance(
     # Update only provided fields
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
     
+    cpu_cores = update_dict.get("cpu_cores", existing.get("cpu_cores", 0))
+    ram_gb = update_dict.get("ram_gb", existing.get("ram_gb", 0))
+    if not await placement.resize(existing, cpu_cores, ram_gb):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Not enough capacity on this server's host for {cpu_cores} CPU cores and {ram_gb} GB RAM"
+        )
+    
+    if "port" in update_dict and existing.get("status") != "queued":
+        try:
+            await assign_ports(dict(existing), update_dict["port"])
+        except HTTPException:
+            await placement.resize(
+                {**existing, "cpu_cores": cpu_cores, "ram_gb": ram_gb},
+                existing.get("cpu_cores", 0), existing.get("ram_gb", 0)
+            )
+            raise
+    
     if update_dict:
         await db.servers.update_one(
             {"id": server_id},
             {"$set": update_dict}
         )
+        await servers_changed(current_user["user_id"])
     
     # Get updated server
     server = await db.servers.find_one({"id": server_id}, {"_id": 0})
-    if isinstance(server['created_at'], str):
-        server['created_at'] = datetime.fromisoformat(server['created_at'])
     
     return server
 
@@ -780,148 +1394,81 @@ async def delete_server_instance(
     server_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    result = await db.servers.delete_one(
-        {"id": server_id, "user_id": current_user["user_id"]}
+    server = await db.servers.find_one_and_delete(
+        {"id": server_id, "user_id": current_user["user_id"]},
+        projection={"_id": 0, "node_id": 1, "status": 1, "cpu_cores": 1, "ram_gb": 1}
     )
     
-    if result.deleted_count == 0:
+    if server is None:
         raise HTTPException(status_code=404, detail="Server not found")
     
+    if server.get("status") != "queued":
+        await placement.release(server)
+    await port_allocator.release(server_id)
+    server_owner_cache.pop(server_id, None)
+    await servers_changed(current_user["user_id"])
+    await db.mods.delete_many({"server_id": server_id})
+    await mods_changed(server_id, server_deleted=True)
+    
     return {"message": "Server deleted successfully"}
 
 # Server control routes
-@api_router.post("/servers/{server_id}/start")
-async def start_server(
-    server_id: str,
-    current_user: dict = Depends(get_current_user)
-):
+async def server_host(server: dict):
+    """Where a server's process runs: this host, or the node agent it is assigned to"""
+    if server.get("node_id"):
+        return await node_pool.client(server["node_id"])
+    return local_processes
+
+async def assign_ports(server: dict, port: Optional[int] = None):
+    """Reserve a placed server's game and A2S ports on its host; port=None picks free ones"""
+    bound = set(await (await server_host(server)).bound_ports())
+    if port is None:
+        server["port"] = await port_allocator.allocate(host_id(server), server["id"], bound)
+    else:
+        await port_allocator.reserve(host_id(server), server["id"], port, bound)
+        server["port"] = port
+
+async def start_server_process(server_id: str, user_id: str) -> dict:
+    """Launch a server's process (runs on the supervisor leader)"""
     server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
+        {"id": server_id, "user_id": user_id},
         {"_id": 0}
     )
     
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
+    if server.get("status") == "queued":
+        raise HTTPException(status_code=409, detail="Server is queued until a host has room for it")
     
-    # Check if server is already running
-    if server.get("status") == "online" and server.get("pid"):
-        try:
-            # Check if process is still alive
-            os.kill(server["pid"], 0)
-            return {"message": "Server is already running", "status": "online", "pid": server["pid"]}
-        except OSError:
-            # Process is dead, continue with start
-            pass
-    
-    # Create server directory structure
-    server_dir = Path(server["install_path"])
-    logs_dir = server_dir / "logs"
-    configs_dir = server_dir / "configs"
-    profiles_dir = server_dir / "profiles"
-    
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    configs_dir.mkdir(parents=True, exist_ok=True)
-    profiles_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Check if server executable exists
-    if server["game_type"] == "arma_reforger":
-        server_executable = server_dir / "ArmaReforgerServer"
-    else:  # arma_4 (for future)
-        server_executable = server_dir / "Arma4Server"
-    
-    if not server_executable.exists():
-        raise HTTPException(
-            status_code=400,
-            detail=f"Server executable not found at {server_executable}. Please install the server files first using SteamCMD (App ID: 1874900 for Arma Reforger)."
-        )
+    host = await server_host(server)
     
-    # Make executable if not already
-    server_executable.chmod(0o755)
-    
-    # Create server configuration file if it doesn't exist
-    config_file = configs_dir / "server.json"
-    if not config_file.exists():
-        config_data = {
-            "bindAddress": "0.0.0.0",
-            "bindPort": server["port"],
-            "publicAddress": "",  # Leave empty for auto-detection
-            "publicPort": server["port"],
-            "a2s": {
-                "address": "",
-                "port": server["port"] + 16  # A2S port typically game_port + 16
-            },
-            "game": {
-                "name": server["name"],
-                "password": "",
-                "passwordAdmin": "changeme",
-                "maxPlayers": server["max_players"],
-                "visible": True
-            },
-            "mods": []
-        }
-        
-        import json
-        with open(config_file, "w") as f:
-            json.dump(config_data, f, indent=2)
-    
-    # Prepare start command
-    log_file = logs_dir / f"server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
-    cmd = [
-        str(server_executable),
-        f"-config={config_file}",
-        f"-profile={profiles_dir}",
-        "-maxFPS=60"
-    ]
+    # Check if server is already running; a dead process falls through to a fresh start
+    if server.get("status") == "online" and server.get("pid") and await host.is_running(server):
+        return {"message": "Server is already running", "status": "online", "pid": server["pid"]}
     
-    # Start the server process
-    try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=open(log_file, "w"),
-            stderr=subprocess.STDOUT,
-            cwd=str(server_dir),
-            preexec_fn=os.setsid  # Create new process group for proper cleanup
-        )
-        
-        # Wait a moment to check if process started successfully
-        await asyncio.sleep(2)
-        
-        # Check if process is still running
-        if process.poll() is not None:
-            # Process died immediately
-            with open(log_file, "r") as f:
-                error_log = f.read()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Server failed to start. Check log file: {log_file}. Error: {error_log[-500:]}"
-            )
-        
-        # Update server status
-        await db.servers.update_one(
-            {"id": server_id},
-            {"$set": {"status": "online", "current_players": 0, "pid": process.pid}}
-        )
-        
-        return {
-            "message": "Server started successfully",
-            "status": "online",
-            "pid": process.pid,
-            "log_file": str(log_file)
-        }
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to start server: {str(e)}"
-        )
+    if host is local_processes:
+        await mod_list_sync.sync([server_id])
+    started = await host.start(server)
+    await mod_list_sync.started(server_id)
+    
+    # Update server status
+    await db.servers.update_one(
+        {"id": server_id},
+        {"$set": {"status": "online", "current_players": 0, "pid": started["pid"], "host": started["host"]}}
+    )
+    await servers_changed(user_id)
+    
+    return {
+        "message": "Server started successfully",
+        "status": "online",
+        "pid": started["pid"],
+        "log_file": started["log_file"]
+    }
 
-@api_router.post("/servers/{server_id}/stop")
-async def stop_server(
-    server_id: str,
-    current_user: dict = Depends(get_current_user)
-):
+async def stop_server_process(server_id: str, user_id: str) -> dict:
+    """Stop a server's process group (runs on the supervisor leader)"""
     server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
+        {"id": server_id, "user_id": user_id},
         {"_id": 0}
     )
     
@@ -933,181 +1480,262 @@ async def stop_server(
     
     # Kill the process if it exists
     if server.get("pid"):
-        try:
-            # Send SIGTERM first (graceful shutdown)
-            os.killpg(os.getpgid(server["pid"]), signal.SIGTERM)
-            
-            # Wait up to 10 seconds for process to terminate
-            for _ in range(10):
-                try:
-                    os.kill(server["pid"], 0)  # Check if process still exists
-                    await asyncio.sleep(1)
-                except OSError:
-                    break  # Process is dead
-            else:
-                # Process still alive after 10 seconds, force kill
-                try:
-                    os.killpg(os.getpgid(server["pid"]), signal.SIGKILL)
-                    logger.warning(f"Server {server_id} required SIGKILL to stop")
-                except ProcessLookupError:
-                    pass
-        except ProcessLookupError:
-            pass  # Process already dead
-        except Exception as e:
-            logger.warning(f"Error stopping server {server_id} (PID: {server['pid']}): {e}")
+        host = await server_host(server)
+        await host.stop(server)
     
     # Update server status
     await db.servers.update_one(
         {"id": server_id},
-        {"$set": {"status": "offline", "current_players": 0, "pid": None}}
+        {"$set": {"status": "offline", "current_players": 0, "pid": None, "restart_required": False}}
     )
+    await servers_changed(user_id)
     
     return {"message": "Server stopped successfully", "status": "offline"}
 
-@api_router.post("/servers/{server_id}/restart")
-async def restart_server(
-    server_id: str,
-    current_user: dict = Depends(get_current_user)
-):
+async def restart_server_process(server_id: str, user_id: str) -> dict:
+    """Stop then relaunch a server's process (runs on the supervisor leader)"""
     server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
+        {"id": server_id, "user_id": user_id},
         {"_id": 0}
     )
     
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
+    if server.get("status") == "queued":
+        raise HTTPException(status_code=409, detail="Server is queued until a host has room for it")
+    
+    host = await server_host(server)
     
     # Set restarting status
     await db.servers.update_one(
         {"id": server_id},
         {"$set": {"status": "restarting"}}
     )
+    await servers_changed(user_id)
     
-    # Stop the server first
-    if server.get("pid"):
-        try:
-            # Send SIGTERM for graceful shutdown
-            os.killpg(os.getpgid(server["pid"]), signal.SIGTERM)
-            
-            # Wait up to 10 seconds for process to terminate
-            for _ in range(10):
-                try:
-                    os.kill(server["pid"], 0)
-                    await asyncio.sleep(1)
-                except OSError:
-                    break
-            else:
-                # Force kill if still alive
-                try:
-                    os.killpg(os.getpgid(server["pid"]), signal.SIGKILL)
-                except ProcessLookupError:
-                    pass
-        except ProcessLookupError:
-            pass
-        except Exception as e:
-            logger.warning(f"Error stopping server during restart: {e}")
-    
-    # Wait a moment before restarting
-    await asyncio.sleep(2)
-    
-    # Start the server again (reuse start logic)
     try:
-        server_dir = Path(server["install_path"])
-        logs_dir = server_dir / "logs"
-        configs_dir = server_dir / "configs"
-        profiles_dir = server_dir / "profiles"
-        
-        if server["game_type"] == "arma_reforger":
-            server_executable = server_dir / "ArmaReforgerServer"
-        else:
-            server_executable = server_dir / "Arma4Server"
-        
-        if not server_executable.exists():
-            await db.servers.update_one(
-                {"id": server_id},
-                {"$set": {"status": "offline", "pid": None}}
-            )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Server executable not found at {server_executable}"
-            )
-        
-        config_file = configs_dir / "server.json"
-        log_file = logs_dir / f"server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        
-        cmd = [
-            str(server_executable),
-            f"-config={config_file}",
-            f"-profile={profiles_dir}",
-            "-maxFPS=60"
-        ]
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=open(log_file, "w"),
-            stderr=subprocess.STDOUT,
-            cwd=str(server_dir),
-            preexec_fn=os.setsid
-        )
+        if server.get("pid"):
+            await host.stop(server)
         
+        # Wait a moment before restarting
         await asyncio.sleep(2)
         
-        if process.poll() is not None:
-            await db.servers.update_one(
-                {"id": server_id},
-                {"$set": {"status": "offline", "pid": None}}
-            )
-            raise HTTPException(
-                status_code=500,
-                detail=f"Server failed to restart. Check log: {log_file}"
-            )
-        
-        await db.servers.update_one(
-            {"id": server_id},
-            {"$set": {"status": "online", "current_players": 0, "pid": process.pid}}
-        )
-        
-        return {
-            "message": "Server restarted successfully",
-            "status": "online",
-            "pid": process.pid,
-            "log_file": str(log_file)
-        }
+        if host is local_processes:
+            await mod_list_sync.sync([server_id])
+        started = await host.start({**server, "pid": None})
+        await mod_list_sync.started(server_id)
     except Exception as e:
         await db.servers.update_one(
             {"id": server_id},
             {"$set": {"status": "offline", "pid": None}}
         )
+        await servers_changed(user_id)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(
             status_code=500,
             detail=f"Failed to restart server: {str(e)}"
         )
     
-    # Wait a bit
-    await asyncio.sleep(2)
-    
-    # Start the server
-    logs_dir = Path("/tmp/arma_servers") / server_id / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    log_file = logs_dir / "server.log"
-    
-    process = subprocess.Popen(
-        ["bash", "-c", f"while true; do echo '[$(date)] Server running on port {server['port']}...'; sleep 5; done"],
-        stdout=open(log_file, "a"),
-        stderr=subprocess.STDOUT,
-        preexec_fn=os.setsid
-    )
-    
     await db.servers.update_one(
         {"id": server_id},
-        {"$set": {"status": "online", "current_players": 0, "pid": process.pid}}
+        {"$set": {"status": "online", "current_players": 0, "pid": started["pid"], "host": started["host"]}}
     )
+    await servers_changed(user_id)
     
-    return {"message": "Server restarted successfully", "status": "online", "pid": process.pid}
+    return {
+        "message": "Server restarted successfully",
+        "status": "online",
+        "pid": started["pid"],
+        "log_file": started["log_file"]
+    }
+
+# Process control always runs on the supervisor leader (see supervisor.py);
+# on any other worker these forward the command and return the leader's answer
+@api_router.post("/servers/{server_id}/start")
+async def start_server(
+    server_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    return await process_supervisor.execute("start", server_id, current_user["user_id"])
+
+@api_router.post("/servers/{server_id}/stop")
+async def stop_server(
+    server_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    return await process_supervisor.execute("stop", server_id, current_user["user_id"])
+
+@api_router.post("/servers/{server_id}/restart")
+async def restart_server(
+    server_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    return await process_supervisor.execute("restart", server_id, current_user["user_id"])
+
+process_supervisor.register("start", start_server_process)
+process_supervisor.register("stop", stop_server_process)
+process_supervisor.register("restart", restart_server_process)
+
+# Node agents (Admin only)
+@api_router.get("/nodes", response_model=List[NodeInfo])
+async def list_nodes(current_user: dict = Depends(require_admin)):
+    return await db.nodes.find({}, {"_id": 0, "token": 0}).sort("created_at", 1).to_list(None)
+
+@api_router.post("/nodes", response_model=NodeInfo)
+async def register_node(node_data: NodeCreate, current_user: dict = Depends(require_admin)):
+    """Register a host running node_agent.py; the agent must answer with this token"""
+    if not node_data.url.startswith(("http://", "https://")) and node_data.url != LOOPBACK_URL:
+        raise HTTPException(status_code=400, detail=f"Node URL must be http(s)://... or {LOOPBACK_URL}")
+    
+    node = {
+        "id": str(uuid.uuid4()),
+        "name": node_data.name,
+        "url": node_data.url,
+        "token": node_data.token,
+        "created_at": datetime.now(timezone.utc)
+    }
+    client = NodeClient(node, timeout=NODE_REQUEST_TIMEOUT_SECONDS)
+    try:
+        health = await client.health()
+    finally:
+        await client.close()
+    node["hostname"] = health["hostname"]
+    
+    await db.nodes.insert_one(node)
+    await placement.register_host(node["id"], node["name"], health["cpu_count"], health["memory_total_bytes"])
+    return node
+
+@api_router.get("/nodes/{node_id}/health")
+async def get_node_health(node_id: str, current_user: dict = Depends(require_admin)):
+    if not await db.nodes.find_one({"id": node_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Node not found")
+    return await refresh_node_capacity(node_id)
+
+@api_router.delete("/nodes/{node_id}")
+async def delete_node(node_id: str, current_user: dict = Depends(require_admin)):
+    if await db.servers.find_one(
+        {"$or": [{"node_id": node_id}, {"placement_host": node_id}]}, {"_id": 0, "id": 1}
+    ):
+        raise HTTPException(status_code=409, detail="Node still has servers assigned")
+    
+    result = await db.nodes.delete_one({"id": node_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    await placement.remove_host(node_id)
+    await node_pool.forget(node_id)
+    await cluster_events.publish("nodes", {"node_id": node_id})
+    return {"message": "Node removed successfully"}
+
+async def refresh_node_capacity(node_id: str) -> dict:
+    """Health-check a node and record its capacity; unreachable nodes stop taking new servers"""
+    node = await db.nodes.find_one({"id": node_id}, {"_id": 0, "name": 1})
+    client = await node_pool.client(node_id)
+    try:
+        health = await client.health()
+    except HTTPException:
+        await placement.set_schedulable(node_id, False)
+        raise
+    await placement.register_host(node_id, node["name"], health["cpu_count"], health["memory_total_bytes"])
+    return health
+
+# Placement (Admin only)
+@api_router.get("/placement")
+async def get_placement(
+    cpu_cores: Optional[float] = None,
+    ram_gb: Optional[float] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Per-host capacity, queued servers and consolidation moves; with cpu_cores/ram_gb,
+    also where such a server would go or which moves would make room for it"""
+    return await placement.report(cpu_cores, ram_gb)
+
+@api_router.post("/placement/recount")
+async def recount_placement(current_user: dict = Depends(require_admin)):
+    """Recompute allocations from the servers collection, e.g. after editing documents by hand"""
+    return {"hosts": await placement.recount()}
+
+async def register_local_host():
+    memory = psutil.virtual_memory()
+    await placement.register_host(LOCAL_HOST_ID, HOSTNAME, psutil.cpu_count(), memory.total)
+
+async def run_placement():
+    """On the supervisor leader: refresh node capacity once per term, then retry queued servers"""
+    refreshed_term = None
+    while True:
+        await asyncio.sleep(PLACEMENT_RETRY_SECONDS)
+        if not leader_lease.is_leader:
+            continue
+        try:
+            if refreshed_term != leader_lease.term:
+                refreshed_term = leader_lease.term
+                async for node in db.nodes.find({}, {"_id": 0, "id": 1}):
+                    try:
+                        await refresh_node_capacity(node["id"])
+                    except HTTPException as e:
+                        logger.warning(f"Node {node['id']} capacity refresh failed: {e.detail}")
+            for server in await placement.drain_queue():
+                logger.info(f"Placed queued server {server['id']} on {server['host']}")
+                await assign_queued_ports(server)
+                await servers_changed(server["user_id"])
+        except Exception as e:
+            logger.warning(f"Placing queued servers failed: {e}")
+
+async def assign_queued_ports(server: dict):
+    """Ports for a server that just left the queue; a requested port that is now taken is replaced"""
+    server["node_id"] = None if server["host"] == LOCAL_HOST_ID else server["host"]
+    requested = server.get("port") or None
+    try:
+        try:
+            await assign_ports(server, requested)
+        except HTTPException as e:
+            if requested is None:
+                raise
+            logger.warning(f"Queued server {server['id']} cannot use port {requested} ({e.detail}); picking a free one")
+            await assign_ports(server)
+    except HTTPException as e:
+        logger.warning(f"No ports for placed server {server['id']}: {e.detail}")
+        return
+    await db.servers.update_one({"id": server["id"]}, {"$set": {"port": server["port"]}})
+
+async def sync_mod_lists():
+    """Bring every local server.json up to date with its mods (mostly stat() calls)"""
+    server_ids = [server["id"] async for server in db.servers.find({"node_id": None}, {"_id": 0, "id": 1})]
+    if server_ids:
+        await mod_list_sync.sync(server_ids)
+
+async def backfill_port_allocations():
+    """Record ports of servers created before allocations were tracked (first start only)"""
+    if await db.port_allocations.find_one({}, {"_id": 0, "port": 1}):
+        return
+    conflicts = await port_allocator.backfill(
+        db.servers.find({}, {"_id": 0, "id": 1, "port": 1, "node_id": 1, "status": 1})
+    )
+    if conflicts:
+        logger.warning(f"{conflicts} servers share ports with another server on the same host")
+
+# Ports (Admin only)
+@api_router.get("/ports")
+async def get_port_allocations(node_id: str = LOCAL_HOST_ID, current_user: dict = Depends(require_admin)):
+    """Ports held by servers on a host ("local" or a node id), and which of them are bound right now"""
+    if node_id != LOCAL_HOST_ID and not await db.nodes.find_one({"id": node_id}, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=404, detail="Node not found")
+    allocations = await port_allocator.allocations(node_id)
+    bound = set(await (await server_host({"node_id": None if node_id == LOCAL_HOST_ID else node_id})).bound_ports())
+    for allocation in allocations:
+        allocation["bound"] = allocation["port"] in bound
+    return {
+        "host": node_id,
+        "range": [port_allocator.range_start, port_allocator.range_end],
+        "port_kinds": server_ports(0),
+        "allocations": allocations,
+        "stats": port_allocator.stats,
+    }
 
 # System resources
-@api_router.get("/system/resources", response_model=SystemResources)
-async def get_system_resources(current_user: dict = Depends(get_current_user)):
+def sample_system_resources() -> dict:
+    """Blocking psutil sample (cpu_percent measures over half a second)"""
     cpu_percent = psutil.cpu_percent(interval=0.5)
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage('/')
@@ -1120,30 +1748,40 @@ async def get_system_resources(current_user: dict = Depends(get_current_user)):
         disk_percent=disk.percent,
         disk_used_gb=round(disk.used / (1024**3), 2),
         disk_total_gb=round(disk.total / (1024**3), 2)
-    )
+    ).model_dump()
 
-# Server configuration management
-@api_router.get("/servers/{server_id}/config", response_model=ServerConfig)
-async def get_server_config(
-    server_id: str,
-    current_user: dict = Depends(get_current_user)
-):
-    server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
+async def get_cached_resources() -> dict:
+    """Host resources, sampled off the event loop and shared by every caller"""
+    return await dashboard_cache.get("resources", lambda: asyncio.to_thread(sample_system_resources))
+
+async def load_dashboard_servers(user_id: str) -> list:
+    docs = await db.servers.find({"user_id": user_id}, SERVER_LIST_PROJECTION).sort("created_at", 1).to_list(None)
+    return [with_defaults(doc, SERVER_LIST_DEFAULTS) for doc in docs]
+
+@api_router.get("/system/resources", response_model=SystemResources)
+async def get_system_resources(current_user: dict = Depends(get_current_user)):
+    return await get_cached_resources()
+
+@api_router.get("/dashboard")
+async def get_dashboard(current_user: dict = Depends(get_current_user)):
+    """Everything the landing page renders, gathered concurrently in one call"""
+    user_id = current_user["user_id"]
+    servers, resources = await asyncio.gather(
+        dashboard_cache.get(("servers", user_id), lambda: load_dashboard_servers(user_id)),
+        get_cached_resources()
     )
     
-    if not server:
-        raise HTTPException(status_code=404, detail="Server not found")
-    
-    # Create config directory if it doesn't exist
-    config_dir = Path("/tmp/arma_servers") / server_id
-    config_dir.mkdir(parents=True, exist_ok=True)
-    config_file = config_dir / "server.cfg"
-    
-    # Create default config if doesn't exist
-    if not config_file.exists():
-        default_config = f"""// Server Configuration for {server['name']}
+    return Response(
+        dumps_json({"servers": servers, "resources": resources}),
+        media_type="application/json"
+    )
+
+# Server configuration management
+JSON_PATCH_TYPE = "application/json-patch+json"
+MERGE_PATCH_TYPE = "application/merge-patch+json"
+
+def default_server_cfg(server: dict) -> str:
+    return f"""// Server Configuration for {server['name']}
 hostname = "{server['name']}";
 password = "";
 passwordAdmin = "admin123";
@@ -1166,55 +1804,179 @@ maxPing = 200;
 maxDesync = 150;
 maxPacketLoss = 50;
 """
-        config_file.write_text(default_config)
-    
-    content = config_file.read_text()
-    return ServerConfig(content=content)
 
-@api_router.put("/servers/{server_id}/config")
-async def update_server_config(
+def version_conflict(e: VersionMismatch) -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail="The configuration was changed since it was loaded; reload it and try again",
+        headers={"ETag": e.current} if e.current else None
+    )
+
+@api_router.get("/servers/{server_id}/config", response_model=ServerConfig)
+async def get_server_config(
     server_id: str,
-    config: ServerConfig,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
+    # Ownership first: server_id comes from the path, so nothing is read before
+    # it is known to be one of the caller's servers. The lookup also carries
+    # what the default config needs.
     server = await db.servers.find_one(
         {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
+        {"_id": 0, "name": 1, "max_players": 1, "port": 1}
     )
     
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     
-    config_dir = Path("/tmp/arma_servers") / server_id
-    config_dir.mkdir(parents=True, exist_ok=True)
-    config_file = config_dir / "server.cfg"
+    config_file = Path("/tmp/arma_servers") / server_id / "server.cfg"
     
-    config_file.write_text(config.content)
+    # Served from memory while the file's mtime, size and inode are unchanged
+    content, etag = await asyncio.to_thread(config_files.read, config_file)
+    if content is not None:
+        cached = not_modified("config", if_none_match, etag)
+        if cached:
+            return cached
+    else:
+        content, etag = await asyncio.to_thread(config_files.create, config_file, default_server_cfg(server))
     
-    return {"message": "Configuration updated successfully"}
+    response.headers.update(conditional_headers(etag))
+    return ServerConfig(content=content)
 
-# Mod management
-@api_router.get("/servers/{server_id}/mods", response_model=List[ServerMod])
-async def get_server_mods(
+@api_router.put("/servers/{server_id}/config")
+async def update_server_config(
     server_id: str,
+    config: ServerConfig,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    # Verify server exists
+    """Replace the config file atomically; with If-Match, only if it is still the version loaded"""
+    await verify_server_owner(server_id, current_user["user_id"])
+    
+    config_file = Path("/tmp/arma_servers") / server_id / "server.cfg"
+    try:
+        etag = await asyncio.to_thread(config_files.write, config_file, config.content, if_match)
+    except VersionMismatch as e:
+        raise version_conflict(e)
+    
+    response.headers.update(conditional_headers(etag))
+    return {"message": "Configuration updated successfully"}
+
+async def local_server_json(server_id: str, user_id: str):
+    """Path of a local server's configs/server.json, created with its mods if missing"""
     server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
+        {"id": server_id, "user_id": user_id}, {"_id": 0, "id": 1, "install_path": 1, "node_id": 1}
     )
-    
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
+    if server.get("node_id"):
+        raise HTTPException(status_code=400, detail="server.json of a server on a node is not managed here")
+    if not server.get("install_path") or not Path(server["install_path"]).is_dir():
+        raise HTTPException(status_code=404, detail="Server is not installed yet")
+    path = config_path(server)
+    if not path.exists():
+        await mod_list_sync.sync([server_id])
+    return path
+
+@api_router.get("/servers/{server_id}/config/json")
+async def get_server_json_config(
+    server_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """The server's configs/server.json, with an ETag for If-Match on PATCH"""
+    path = await local_server_json(server_id, current_user["user_id"])
+    content, etag = await asyncio.to_thread(config_files.read, path)
+    if content is None:
+        raise HTTPException(status_code=404, detail="server.json not found")
+    cached = not_modified("config_json", if_none_match, etag)
+    if cached:
+        return cached
+    return Response(content, media_type="application/json", headers=conditional_headers(etag))
+
+@api_router.patch("/servers/{server_id}/config/json")
+async def patch_server_json_config(
+    server_id: str,
+    request: Request,
+    if_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Change only some keys of server.json
+    
+    application/json-patch+json takes a JSON Patch (RFC 6902) list of ops;
+    application/merge-patch+json or application/json take a merge patch
+    (RFC 7396) object, where null removes a key. `mods` is written from the
+    server's enabled mods and cannot be patched. With If-Match the patch is
+    applied only to the version the client loaded.
+    """
+    path = await local_server_json(server_id, current_user["user_id"])
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    kind = "json-patch" if content_type == JSON_PATCH_TYPE else "merge"
+    try:
+        patch = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if kind == "merge" and not isinstance(patch, dict):
+        raise HTTPException(status_code=422, detail="A merge patch must be a JSON object")
+    touched = patched_paths(kind, patch)
+    if "mods" in touched or "" in touched:
+        raise HTTPException(
+            status_code=422,
+            detail="mods are written from the server's enabled mods; use the mods endpoints instead"
+        )
+    def change(config):
+        if kind == "json-patch":
+            config = apply_json_patch(config, patch)
+        else:
+            config = apply_merge_patch(config, patch)
+        if not isinstance(config, dict):
+            raise PatchError("server.json must stay a JSON object")
+        return config
     
-    mods = await db.mods.find({"server_id": server_id}, {"_id": 0}).to_list(1000)
-    
-    for mod in mods:
-        if isinstance(mod['created_at'], str):
-            mod['created_at'] = datetime.fromisoformat(mod['created_at'])
-    
-    return mods
+    try:
+        config, etag = await asyncio.to_thread(config_files.update_json, path, change, if_match)
+    except VersionMismatch as e:
+        raise version_conflict(e)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="server.json not found")
+    except PatchConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"server.json is not valid JSON: {e}")
+    
+    return Response(dumps_json(config), media_type="application/json", headers=conditional_headers(etag))
+
+# Mod management
+@api_router.get("/servers/{server_id}/mods", response_model=List[ServerMod])
+async def get_server_mods(
+    server_id: str,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    # Verify server ownership
+    await verify_server_owner(server_id, current_user["user_id"])
+    
+    etag = resource_etag(("mods", server_id), after, limit, stream)
+    cached = not_modified("mods", if_none_match, etag)
+    if cached:
+        return cached
+    
+    response = await list_documents(
+        db.mods,
+        {"server_id": server_id},
+        MOD_LIST_PROJECTION,
+        after, limit, stream,
+        defaults=MOD_LIST_DEFAULTS
+    )
+    response.headers.update(conditional_headers(etag))
+    return response
 
 @api_router.post("/servers/{server_id}/mods", response_model=ServerMod)
 async def add_server_mod(
@@ -1222,23 +1984,16 @@ async def add_server_mod(
     mod_data: ServerModCreate,
     current_user: dict = Depends(get_current_user)
 ):
-    # Verify server exists
-    server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
-    )
-    
-    if not server:
-        raise HTTPException(status_code=404, detail="Server not found")
+    # Verify server ownership
+    await verify_server_owner(server_id, current_user["user_id"])
     
     mod = ServerMod(
         **mod_data.model_dump(),
         server_id=server_id
     )
     
-    doc = mod.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.mods.insert_one(doc)
+    await db.mods.insert_one(mod.model_dump())
+    await mods_changed(server_id)
     
     return mod
 
@@ -1248,20 +2003,26 @@ async def delete_server_mod(
     mod_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    # Verify server exists
+    # Ownership and where the mod links live, in one lookup
     server = await db.servers.find_one(
         {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
+        {"_id": 0, "install_path": 1, "node_id": 1}
     )
-    
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     
-    result = await db.mods.delete_one({"id": mod_id, "server_id": server_id})
+    mod = await db.mods.find_one_and_delete({"id": mod_id, "server_id": server_id}, projection={"_id": 0, "workshop_id": 1})
     
-    if result.deleted_count == 0:
+    if mod is None:
         raise HTTPException(status_code=404, detail="Mod not found")
     
+    # Unlink the cached copy unless another of this server's mods uses it;
+    # the cache evicts it later if no other server does either
+    if not server.get("node_id") and not await db.mods.find_one(
+        {"server_id": server_id, "workshop_id": mod["workshop_id"]}, {"_id": 0, "id": 1}
+    ):
+        await asyncio.to_thread(ModCache.unlink, server["install_path"], mod["workshop_id"])
+    await mods_changed(server_id)
     return {"message": "Mod deleted successfully"}
 
 @api_router.patch("/servers/{server_id}/mods/{mod_id}/toggle")
@@ -1270,35 +2031,28 @@ async def toggle_server_mod(
     mod_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    # Verify server exists
-    server = await db.servers.find_one(
-        {"id": server_id, "user_id": current_user["user_id"]},
-        {"_id": 0}
+    # Verify server ownership
+    await verify_server_owner(server_id, current_user["user_id"])
+    
+    # Flip enabled atomically in one update pipeline (missing counts as enabled)
+    mod = await db.mods.find_one_and_update(
+        {"id": mod_id, "server_id": server_id},
+        [{"$set": {"enabled": {"$eq": [{"$ifNull": ["$enabled", True]}, False]}}}],
+        projection={"_id": 0, "enabled": 1},
+        return_document=ReturnDocument.AFTER
     )
     
-    if not server:
-        raise HTTPException(status_code=404, detail="Server not found")
-    
-    # Get current mod state
-    mod = await db.mods.find_one({"id": mod_id, "server_id": server_id}, {"_id": 0})
-    
     if not mod:
         raise HTTPException(status_code=404, detail="Mod not found")
     
-    # Toggle enabled state
-    new_state = not mod.get("enabled", True)
-    await db.mods.update_one(
-        {"id": mod_id},
-        {"$set": {"enabled": new_state}}
-    )
-    
-    return {"message": "Mod toggled successfully", "enabled": new_state}
+    await mods_changed(server_id)
+    return {"message": "Mod toggled successfully", "enabled": mod["enabled"]}
 
 # Log viewer
 @api_router.get("/servers/{server_id}/logs", response_model=ServerLogs)
 async def get_server_logs(
     server_id: str,
-    lines: int = 100,
+    lines: int = Query(100, ge=1, le=MAX_LOG_LINES),
     current_user: dict = Depends(get_current_user)
 ):
     server = await db.servers.find_one(
@@ -1309,27 +2063,41 @@ async def get_server_logs(
     if not server:
         raise HTTPException(status_code=404, detail="Server not found")
     
-    log_file = Path("/tmp/arma_servers") / server_id / "logs" / "server.log"
+    host = await server_host(server)
+    return ServerLogs(**await host.logs(server, lines))
+
+@api_router.get("/servers/{server_id}/logs/stream")
+async def stream_server_logs(
+    server_id: str,
+    lines: int = Query(100, ge=1, le=MAX_LOG_LINES),
+    current_user: dict = Depends(get_current_user)
+):
+    """Last `lines` lines, then new output as it is written (chunked text)"""
+    server = await db.servers.find_one(
+        {"id": server_id, "user_id": current_user["user_id"]},
+        {"_id": 0}
+    )
     
-    if not log_file.exists():
-        return ServerLogs(logs="No logs available yet. Start the server to generate logs.", lines=0)
+    if not server:
+        raise HTTPException(status_code=404, detail="Server not found")
     
-    # Read last N lines
-    try:
-        with open(log_file, 'r') as f:
-            all_lines = f.readlines()
-            last_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            logs_content = ''.join(last_lines)
-        
-        return ServerLogs(logs=logs_content, lines=len(last_lines))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading logs: {str(e)}")
+    host = await server_host(server)
+    chunks = host.follow_logs(server, lines, LOG_STREAM_MAX_SECONDS)
+    # Pull the first chunk now so node errors become a proper status, not a cut-off stream
+    first = await anext(chunks, b"")
+    
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
 
 # SteamCMD management
 @api_router.get("/steamcmd/status", response_model=SteamCMDStatus)
 async def get_steamcmd_status(current_user: dict = Depends(get_current_user)):
-    steamcmd_path = Path.home() / "steamcmd"
-    installed = (steamcmd_path / "steamcmd.sh").exists()
+    steamcmd_path = STEAMCMD_DIR
+    installed = installers.steamcmd_script(steamcmd_path).exists()
     
     return SteamCMDStatus(
         installed=installed,
@@ -1338,39 +2106,257 @@ async def get_steamcmd_status(current_user: dict = Depends(get_current_user)):
     )
 
 @api_router.post("/steamcmd/install")
-async def install_steamcmd(current_user: dict = Depends(get_current_user)):
-    steamcmd_path = Path.home() / "steamcmd"
+async def install_steamcmd(response: Response, current_user: dict = Depends(get_current_user)):
+    """Start installing SteamCMD in the background; follow it through /api/jobs/{job_id}"""
+    if installers.steamcmd_script(STEAMCMD_DIR).exists():
+        return {"message": "SteamCMD is already installed", "path": str(STEAMCMD_DIR)}
+    
+    job = await job_queue.submit(
+        "steamcmd_install",
+        {"path": str(STEAMCMD_DIR), "url": STEAMCMD_URL, "sha256": STEAMCMD_SHA256},
+        current_user["user_id"],
+        key="steamcmd_install"
+    )
+    response.status_code = 202
+    return {"message": "SteamCMD installation started", "job_id": job["id"], "job": job}
+
+async def materialize_server(server: dict, app_id: str, build_id: str) -> dict:
+    """Link one local server's install_path to a content build"""
+    result = await asyncio.to_thread(content_store.materialize, app_id, build_id, server["install_path"])
+    await db.servers.update_one({"id": server["id"]}, {"$set": {"content_build": build_id}})
+    await servers_changed(server["user_id"])
+    return {
+        "server_id": server["id"],
+        "name": server["name"],
+        **result,
+        # A running process keeps the files it opened; it needs a restart to pick up the new build
+        "restart_required": server.get("status") == "online" and result["previous_build_id"] != build_id,
+    }
+
+async def run_game_install(ctx) -> dict:
+    """Job: update the shared content if asked (or if there is none yet), then link the servers to it"""
+    params = ctx.params
+    app_id = params["app_id"]
+    build_id = content_store.current_build(app_id)
+    update = None
+    if build_id is None or params.get("update") or params.get("validate"):
+        update = await installers.update_content(ctx, content_store, STEAMCMD_DIR, app_id, params.get("validate", False))
+        build_id = update["build_id"]
     
-    # Check if already installed
-    if (steamcmd_path / "steamcmd.sh").exists():
-        return {"message": "SteamCMD is already installed", "path": str(steamcmd_path)}
+    servers = await db.servers.find(
+        {"id": {"$in": params["server_ids"]}, "node_id": None},
+        {"_id": 0, "id": 1, "name": 1, "user_id": 1, "status": 1, "install_path": 1}
+    ).to_list(None)
+    results = []
+    for done, server in enumerate(servers):
+        await ctx.progress(done / len(servers), message=f"Linking {server['name']} to build {build_id}")
+        results.append(await materialize_server(server, app_id, build_id))
+    return {"app_id": app_id, "build_id": build_id, "update": update, "servers": results}
+
+job_queue.register("game_install", run_game_install)
+
+@api_router.post("/servers/{server_id}/install")
+async def install_server_files(
+    server_id: str,
+    response: Response,
+    update: bool = False,
+    validate: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Link a server to the shared game files, as a job; update=true fetches the latest build
+    first, validate=true also verifies the shared files"""
+    server = await db.servers.find_one(
+        {"id": server_id, "user_id": current_user["user_id"]},
+        {"_id": 0, "game_type": 1, "node_id": 1}
+    )
+    if not server:
+        raise HTTPException(status_code=404, detail="Server not found")
+    if server.get("node_id"):
+        raise HTTPException(status_code=400, detail="Installing game files on a node is not supported; run SteamCMD on the node")
+    app_id = installers.GAME_SERVER_APPS.get(server["game_type"])
+    if app_id is None:
+        raise HTTPException(status_code=400, detail=f"No dedicated server app is known for {server['game_type']}")
+    
+    job = await job_queue.submit(
+        "game_install",
+        {"app_id": app_id, "update": update, "validate": validate, "server_ids": [server_id]},
+        current_user["user_id"],
+        key=f"game_install:{server_id}"
+    )
+    response.status_code = 202
+    return {"message": "Game file installation started", "job_id": job["id"], "job": job}
+
+async def run_mod_download(ctx) -> dict:
+    """Job: fetch a workshop item through the shared mod cache and link it into the server"""
+    params = ctx.params
+    workshop_id = params["workshop_id"]
+    entry, outcome = await mod_cache.ensure(
+        workshop_id,
+        lambda: installers.download_mod(ctx, params["steamcmd_dir"], params["app_id"], workshop_id),
+        refresh=params.get("refresh", False)
+    )
+    server = await db.servers.find_one({"id": params["server_id"]}, {"_id": 0, "install_path": 1})
+    if server is None:
+        raise JobError("The server was deleted")
+    path = await asyncio.to_thread(ModCache.link, entry, server["install_path"])
+    await db.mods.update_many(
+        {"server_id": params["server_id"], "workshop_id": workshop_id},
+        {"$set": {"cached_version": entry["version"]}}
+    )
+    await mods_changed(params["server_id"])
+    evicted = await mod_cache.evict()
+    return {
+        "workshop_id": workshop_id,
+        "version": entry["version"],
+        "cache": outcome,
+        "bytes": entry["bytes"],
+        "path": path,
+        "evicted": evicted,
+    }
+
+job_queue.register("mod_download", run_mod_download)
+
+@api_router.post("/servers/{server_id}/mods/sync")
+async def sync_server_mods(server_id: str, current_user: dict = Depends(get_current_user)):
+    """Write the server's enabled mods into its server.json now, if they differ"""
+    await verify_server_owner(server_id, current_user["user_id"])
+    reports = await mod_list_sync.sync([server_id])
+    return reports[0]
+
+@api_router.post("/mods/sync")
+async def sync_all_server_mods(current_user: dict = Depends(get_current_user)):
+    """Sync the mod lists of all of the user's servers in one pass; lists the ones needing a restart"""
+    server_ids = [
+        server["id"] async for server in db.servers.find({"user_id": current_user["user_id"]}, {"_id": 0, "id": 1})
+    ]
+    reports = await mod_list_sync.sync(server_ids)
+    return {
+        "servers": reports,
+        "changed": sum(1 for report in reports if report.get("changed")),
+        "restart_required": [report["server_id"] for report in reports if report.get("restart_required")],
+    }
+
+@api_router.post("/servers/{server_id}/mods/{mod_id}/download")
+async def download_server_mod(
+    server_id: str,
+    mod_id: str,
+    response: Response,
+    refresh: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Link a mod into the server from the shared mod cache, downloading it on a miss, as a job;
+    refresh=true checks the workshop for a newer version"""
+    server = await db.servers.find_one(
+        {"id": server_id, "user_id": current_user["user_id"]}, {"_id": 0, "node_id": 1}
+    )
+    if not server:
+        raise HTTPException(status_code=404, detail="Server not found")
+    if server.get("node_id"):
+        raise HTTPException(status_code=400, detail="Downloading mods on a node is not supported")
+    mod = await db.mods.find_one({"id": mod_id, "server_id": server_id}, {"_id": 0, "workshop_id": 1})
+    if not mod:
+        raise HTTPException(status_code=404, detail="Mod not found")
     
-    try:
-        # Create directory
-        steamcmd_path.mkdir(parents=True, exist_ok=True)
-        
-        # Download steamcmd
-        tar_path = steamcmd_path / "steamcmd_linux.tar.gz"
-        url = "https://steamcdn-a.akamaihd.net/client/installer/steamcmd_linux.tar.gz"
-        
-        urllib.request.urlretrieve(url, tar_path)
-        
-        # Extract
-        with tarfile.open(tar_path, "r:gz") as tar:
-            tar.extractall(path=steamcmd_path)
-        
-        # Remove tar file
-        tar_path.unlink()
-        
-        # Make executable
-        (steamcmd_path / "steamcmd.sh").chmod(0o755)
-        
-        return {
-            "message": "SteamCMD installed successfully",
-            "path": str(steamcmd_path)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Installation failed: {str(e)}")
+    job = await job_queue.submit(
+        "mod_download",
+        {
+            "steamcmd_dir": str(STEAMCMD_DIR),
+            "app_id": installers.REFORGER_WORKSHOP_APP_ID,
+            "workshop_id": mod["workshop_id"],
+            "server_id": server_id,
+            "refresh": refresh,
+        },
+        current_user["user_id"],
+        key=f"mod_download:{server_id}:{mod['workshop_id']}"
+    )
+    response.status_code = 202
+    return {"message": "Mod download started", "job_id": job["id"], "job": job}
+
+# Shared workshop mod cache (Admin only)
+@api_router.get("/mod-cache")
+async def get_mod_cache(current_user: dict = Depends(require_admin)):
+    """Cached mod versions on this host, whether a server uses each, and hit/miss stats"""
+    return await mod_cache.usage()
+
+@api_router.post("/mod-cache/evict")
+async def evict_mod_cache(budget_gb: Optional[float] = None, current_user: dict = Depends(require_admin)):
+    """Evict unused mods, least recently used first, down to the budget (or budget_gb)"""
+    budget = None if budget_gb is None else int(budget_gb * 1024 ** 3)
+    return {"evicted": await mod_cache.evict(budget)}
+
+# Shared game content (Admin only)
+@api_router.get("/content")
+async def get_content_store(current_user: dict = Depends(require_admin)):
+    """Builds in the shared content store, their size, and which servers use each"""
+    usage = await asyncio.to_thread(content_store.usage)
+    servers_by_build: dict = {}
+    async for server in db.servers.find({"content_build": {"$ne": None}}, {"_id": 0, "id": 1, "content_build": 1}):
+        servers_by_build.setdefault(server["content_build"], []).append(server["id"])
+    for app in usage["apps"].values():
+        for build in app["builds"]:
+            build["servers"] = servers_by_build.get(build["build_id"], [])
+    return usage
+
+@api_router.post("/content/{game_type}/update")
+async def update_game_content(
+    game_type: str,
+    response: Response,
+    validate: bool = False,
+    current_user: dict = Depends(require_admin)
+):
+    """Download the latest build once and relink every server of this game on the panel host"""
+    app_id = installers.GAME_SERVER_APPS.get(game_type)
+    if app_id is None:
+        raise HTTPException(status_code=404, detail=f"No dedicated server app is known for {game_type}")
+    server_ids = [
+        server["id"] async for server in db.servers.find({"game_type": game_type, "node_id": None}, {"_id": 0, "id": 1})
+    ]
+    job = await job_queue.submit(
+        "game_install",
+        {"app_id": app_id, "update": True, "validate": validate, "server_ids": server_ids},
+        current_user["user_id"],
+        key=f"content_update:{app_id}"
+    )
+    response.status_code = 202
+    return {"message": f"Updating {len(server_ids)} servers", "job_id": job["id"], "job": job}
+
+@api_router.post("/content/{game_type}/prune")
+async def prune_game_content(game_type: str, current_user: dict = Depends(require_admin)):
+    """Delete builds that no server is linked to any more (the current build is always kept)"""
+    app_id = installers.GAME_SERVER_APPS.get(game_type)
+    if app_id is None:
+        raise HTTPException(status_code=404, detail=f"No dedicated server app is known for {game_type}")
+    in_use = {
+        server["content_build"]
+        async for server in db.servers.find({"content_build": {"$ne": None}}, {"_id": 0, "content_build": 1})
+    }
+    return {"removed": await asyncio.to_thread(content_store.prune, app_id, in_use)}
+
+# Background jobs
+@api_router.get("/jobs")
+async def list_jobs(limit: int = 50, current_user: dict = Depends(get_current_user)):
+    """The caller's most recent jobs, newest first"""
+    return await job_queue.recent(current_user["user_id"], min(max(limit, 1), 200))
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return await job_queue.get(job_id, current_user["user_id"])
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Cancel a queued job at once, or ask the worker running it to stop"""
+    return await job_queue.cancel(job_id, current_user["user_id"])
+
+@api_router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, after: int = 0, current_user: dict = Depends(get_current_user)):
+    """Newline-delimited JSON progress events until the job finishes; reconnect with after=<last seq>"""
+    await job_queue.get(job_id, current_user["user_id"])
+    
+    async def body():
+        async for event in job_queue.watch(job_id, after, JOB_STREAM_MAX_SECONDS):
+            yield dumps_json(event) + b"\n"
+    
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 
 ###############################################################################
@@ -1402,12 +2388,7 @@ async def create_sub_admin(
         server_permissions=sub_admin.server_permissions
     )
     
-    doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('last_login'):
-        doc['last_login'] = doc['last_login'].isoformat()
-    
-    await db.users.insert_one(doc)
+    await db.users.insert_one(user.model_dump())
     
     return {
         "message": "Sub-admin created successfully",
@@ -1416,18 +2397,23 @@ async def create_sub_admin(
     }
 
 @api_router.get("/admin/sub-admins")
-async def list_sub_admins(current_user: dict = Depends(get_current_user)):
+async def list_sub_admins(
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
     """List all sub-admins created by current admin"""
     admin = await db.users.find_one({"id": current_user["user_id"]}, {"_id": 0})
     if not admin or not admin.get("is_admin"):
         raise HTTPException(status_code=403, detail="Only admins can view sub-admins")
     
-    sub_admins = await db.users.find(
+    return await list_documents(
+        db.users,
         {"parent_admin_id": current_user["user_id"], "is_sub_admin": True},
-        {"_id": 0, "hashed_password": 0, "totp_secret": 0}
-    ).to_list(1000)
-    
-    return sub_admins
+        {"_id": 0, "hashed_password": 0, "totp_secret": 0},
+        after, limit, stream
+    )
 
 @api_router.get("/admin/sub-admins/{sub_admin_id}")
 async def get_sub_admin(
@@ -1480,6 +2466,9 @@ async def update_sub_admin(
             {"$set": update_fields}
         )
     
+    if "hashed_password" in update_fields:
+        await revoke_sessions({"user_id": sub_admin_id})
+    
     return {"message": "Sub-admin updated successfully"}
 
 @api_router.delete("/admin/sub-admins/{sub_admin_id}")
@@ -1500,35 +2489,140 @@ async def delete_sub_admin(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Sub-admin not found")
     
+    await revoke_sessions({"user_id": sub_admin_id})
+    
     return {"message": "Sub-admin deleted successfully"}
 
+###############################################################################
+# Database Maintenance Routes
+###############################################################################
+
+@api_router.get("/system/indexes")
+async def get_index_status(refresh: bool = False, current_user: dict = Depends(require_admin)):
+    """Report the build status of every declared index (Admin only)"""
+    if refresh or not index_status:
+        await ensure_indexes(db)
+    
+    statuses = list(index_status.values())
+    return {
+        "ready": all(status["state"] != "failed" for status in statuses),
+        "indexes": statuses
+    }
+
+@api_router.get("/system/request-metrics")
+async def get_request_metrics(current_user: dict = Depends(require_admin)):
+    """Per-route latency and response size histograms plus recent slow requests (Admin only)"""
+    return request_metrics.snapshot()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request, authorization: Optional[str] = Header(None)):
+    """Prometheus text exposition, rendered from in-memory aggregates"""
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to allow remote scrapes")
+    
+    body = render_metrics(metrics_sampler, request_metrics, conditional_get_stats, pool_stats.snapshot())
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api_router.get("/system/event-loop")
+async def get_event_loop_report(limit: int = 20, current_user: dict = Depends(require_admin)):
+    """Event loop lag and the top blocking calls seen since startup (Admin only)"""
+    return loop_monitor.report(limit=max(1, min(limit, 200)))
+
+@api_router.get("/system/supervisor")
+async def get_supervisor_status(current_user: dict = Depends(require_admin)):
+    """Process supervisor leadership, tracked processes and cross-worker sync (Admin only)"""
+    return {
+        **await process_supervisor.status(),
+        "jobs": await job_queue.status(),
+        "downloads": downloader.status(),
+        "mod_list_sync": {**mod_list_sync.stats, "pending": len(mod_list_sync.pending)},
+        "cluster_events": {
+            "seq": cluster_events.seq,
+            "published": cluster_events.published,
+            "applied": cluster_events.applied,
+            "resyncs": cluster_events.resyncs,
+        }
+    }
+
+@api_router.get("/system/startup")
+async def get_startup_report(current_user: dict = Depends(require_admin)):
+    """Cold-start phase timings and which lazily loaded modules are in use (Admin only)"""
+    return startup_report.report()
+
+@api_router.get("/system/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(require_admin)):
+    """Conditional GET, dashboard cache and compression stats since startup (Admin only)"""
+    conditional = {
+        resource: {
+            **stats,
+            "hit_rate": round(stats["not_modified"] / stats["requests"], 3) if stats["requests"] else 0.0
+        }
+        for resource, stats in conditional_get_stats.items()
+    }
+    lookups = dashboard_cache.hits + dashboard_cache.misses
+    return {
+        "conditional_get": conditional,
+        "dashboard_cache": {
+            "hits": dashboard_cache.hits,
+            "misses": dashboard_cache.misses,
+            "hit_rate": round(dashboard_cache.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(dashboard_cache.entries)
+        },
+        "mod_cache": mod_cache.stats,
+        "config_files": {**config_files.stats, "entries": len(config_files.entries)},
+        "compression": {
+            **compression_stats,
+            "ratio": round(compression_stats["bytes_out"] / compression_stats["bytes_in"], 3) if compression_stats["bytes_in"] else None
+        }
+    }
+
 ###############################################################################
 # Changelog/Updates Route
 ###############################################################################
 
+# Parsed changelog keyed by the file's ETag, so it is only re-read after it changes
+changelog_cache: dict = {}
+
 @api_router.get("/changelog")
-async def get_changelog():
+async def get_changelog(response: Response, if_none_match: Optional[str] = Header(None)):
     """Get changelog for display on login page"""
     changelog_path = Path("/app/CHANGELOG.md")
     
-    if not changelog_path.exists():
+    try:
+        stat = changelog_path.stat()
+    except FileNotFoundError:
         return {"content": "# No updates available\n\nCheck back later for updates and fixes."}
     
-    content = changelog_path.read_text()
-    
-    # Parse and return recent entries (last 50 lines or until [Previous])
-    lines = content.split('\n')
-    recent_lines = []
-    for line in lines:
-        if '[Previous]' in line:
-            break
-        recent_lines.append(line)
-        if len(recent_lines) >= 100:  # Limit to prevent huge responses
-            break
+    etag = file_etag(stat)
+    cached = not_modified("changelog", if_none_match, etag)
+    if cached:
+        return cached
+    
+    content = changelog_cache.get(etag)
+    if content is None:
+        # Parse and return recent entries (last 50 lines or until [Previous])
+        lines = (await asyncio.to_thread(changelog_path.read_text)).split('\n')
+        recent_lines = []
+        for line in lines:
+            if '[Previous]' in line:
+                break
+            recent_lines.append(line)
+            if len(recent_lines) >= 100:  # Limit to prevent huge responses
+                break
+        
+        content = '\n'.join(recent_lines)
+        changelog_cache.clear()
+        changelog_cache[etag] = content
     
-    return {"content": '\n'.join(recent_lines)}
+    response.headers.update(conditional_headers(etag))
+    return {"content": content}
+
 
 
+startup_report.mark("models_and_routes")
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -1539,8 +2633,18 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_BYTES,
+    offload_size=COMPRESSION_OFFLOAD_BYTES
+)
+
+# Outermost, so recorded latency and sizes include compression
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1548,6 +2652,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup_report.mark("app_setup")
+
 
 
 # Global exception handlers
@@ -1570,6 +2676,40 @@ async def jwt_exception_handler(request, exc):
         headers={"WWW-Authenticate": "Bearer"}
     )
 
+@app.on_event("startup")
+async def init_database():
+    """Create or migrate indexes and reload the session revocation list"""
+    with startup_report.step("ensure_indexes"):
+        await ensure_indexes(db)
+    
+    # Baseline for cross-worker broadcasts before loading the state they update
+    await cluster_events.poll()
+    with startup_report.step("load_revoked_sessions"):
+        await load_revoked_sessions()
+    with startup_report.step("register_local_host"):
+        await register_local_host()
+    
+    # Convert legacy ISO string timestamps without delaying startup
+    asyncio.create_task(migrate_datetimes(db))
+    asyncio.create_task(backfill_port_allocations())
+    asyncio.create_task(sync_mod_lists())
+    
+    asyncio.create_task(metrics_sampler.run(db))
+    asyncio.create_task(cluster_events.run())
+    # Servers the supervisor marks offline after a failover must reach caches and other workers
+    process_supervisor.on_server_changed = servers_changed
+    asyncio.create_task(process_supervisor.run())
+    asyncio.create_task(run_placement())
+    asyncio.create_task(job_queue.run())
+    loop_monitor.start(asyncio.get_running_loop())
+    
+    startup_report.ready()
+    logger.info(f"Ready {startup_report.process_to_ready_ms:.0f}ms after process start")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    loop_monitor.stop()
+    # Hand process supervision to another worker right away instead of after the lease expires
+    await leader_lease.release()
+    await node_pool.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Cold-start breakdown: where the time between process start and "ready" goes.
+
+server.py marks phases as it loads (framework imports, panel modules, app
+setup, routes) and times each startup step. The report also lists which
+lazily imported subsystems have been loaded so far, so an eager import
+slipping back in is easy to spot.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Modules that should only appear once their feature is used
+LAZY_MODULES = ("qrcode", "PIL", "pyotp", "tarfile")
+
+
+class StartupReport:
+    def __init__(self):
+        self.module_started = time.perf_counter()
+        self._last_mark = self.module_started
+        self.phases: list = []
+        self.ready_at = None
+        self.process_to_ready_ms = None
+
+    def mark(self, name: str):
+        """Close a phase that started at the previous mark"""
+        now = time.perf_counter()
+        self.phases.append({"phase": name, "ms": round((now - self._last_mark) * 1000, 1)})
+        self._last_mark = now
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({"phase": name, "ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    def ready(self):
+        import psutil
+
+        self.ready_at = datetime.now(timezone.utc)
+        # Includes interpreter start-up and site imports before server.py ran
+        process_started = psutil.Process().create_time()
+        self.process_to_ready_ms = round((self.ready_at.timestamp() - process_started) * 1000, 1)
+
+    def report(self) -> dict:
+        return {
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+            "process_to_ready_ms": self.process_to_ready_ms,
+            "phases": self.phases,
+            "lazy_modules_loaded": {name: name in sys.modules for name in LAZY_MODULES},
+        }
+
+
+startup_report = StartupReport()
@@ -0,0 +1,45 @@
+"""
+Storage backends for the panel.
+
+Routes talk to collections (db.users, db.servers, db.mods, db.sessions,
+db.metrics, ...) through the subset of the Motor API they already use:
+find/find_one with projections, sort/limit/batch_size cursors, insert,
+update (operators and simple pipelines), delete, find_one_and_update,
+count_documents, bulk_write and index management.
+
+Two implementations are available, selected with STORAGE_BACKEND:
+
+- mongo (default): Motor against MONGO_URL/DB_NAME
+- sqlite: an embedded SQLite database in WAL mode at SQLITE_PATH, for
+  single-host installs that should not need a MongoDB container
+"""
+
+import os
+from pathlib import Path
+
+from storage.instrumented import InstrumentedDatabase
+from storage.pool_stats import pool_stats
+from storage.sqlite import SQLiteClient
+
+STORAGE_BACKENDS = ("mongo", "sqlite")
+
+
+def open_storage(root_dir: Path):
+    """Return (client, db) for the backend chosen by STORAGE_BACKEND
+
+    db is wrapped so per-request database time can be attributed.
+    """
+    backend = os.environ.get("STORAGE_BACKEND", "mongo").lower()
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}, got {backend!r}")
+
+    if backend == "sqlite":
+        path = os.environ.get("SQLITE_PATH", str(root_dir / "panel.db"))
+        client = SQLiteClient(path)
+        return client, InstrumentedDatabase(client[os.environ.get("DB_NAME", "tactical_panel")])
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    # Datetimes come back as aware UTC; pool events feed /metrics
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, event_listeners=[pool_stats])
+    return client, InstrumentedDatabase(client[os.environ["DB_NAME"]])
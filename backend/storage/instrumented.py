@@ -0,0 +1,113 @@
+"""
+Per-request database timing.
+
+InstrumentedDatabase wraps either backend's database handle. Every awaited
+collection call (and every cursor batch) adds its wall time to the
+DbTimer in the current context, which the request metrics middleware sets
+for the duration of each request. Outside a request nothing is recorded.
+Concurrent calls within one request (asyncio.gather) are summed, so db_ms
+can exceed the request's wall time.
+"""
+
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DbTimer:
+    __slots__ = ("ms", "calls")
+
+    def __init__(self):
+        self.ms = 0.0
+        self.calls = 0
+
+
+db_timer: ContextVar[Optional[DbTimer]] = ContextVar("db_timer", default=None)
+
+# Collection methods that return a cursor synchronously
+CURSOR_METHODS = frozenset({"find", "aggregate", "list_indexes"})
+
+
+async def _timed(awaitable):
+    timer = db_timer.get()
+    if timer is None:
+        return await awaitable
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timer.ms += (time.perf_counter() - started) * 1000
+        timer.calls += 1
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if result is self._cursor:
+                # Chained builders (sort, limit, batch_size, ...) keep the wrapper
+                return self
+            if inspect.isawaitable(result):
+                return _timed(result)
+            return result
+        return call
+
+    def __aiter__(self):
+        self._iterator = self._cursor.__aiter__()
+        return self
+
+    async def __anext__(self):
+        return await _timed(self._iterator.__anext__())
+
+
+class InstrumentedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if name in CURSOR_METHODS:
+                return InstrumentedCursor(result)
+            if inspect.isawaitable(result):
+                return _timed(result)
+            return result
+        return call
+
+
+class InstrumentedDatabase:
+    def __init__(self, db):
+        self._db = db
+        self._collections: dict = {}
+
+    def __getitem__(self, name: str) -> InstrumentedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InstrumentedCollection(self._db[name])
+        return collection
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._db, name)
+        if hasattr(attr, "find"):
+            return self[name]
+        if callable(attr):
+            # Database-level methods (command, list_collection_names, ...)
+            def call(*args, **kwargs):
+                result = attr(*args, **kwargs)
+                return _timed(result) if inspect.isawaitable(result) else result
+            return call
+        return attr
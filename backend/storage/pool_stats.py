@@ -0,0 +1,73 @@
+"""
+MongoDB connection pool counters, fed by a pymongo pool event listener.
+
+Callbacks run on pymongo's threads, so updates take a lock; readers get a
+copied snapshot. The SQLite backend has no pool and leaves this empty.
+"""
+
+import threading
+
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: dict = {}  # "host:port" -> counters
+
+    def _bump(self, address, **deltas):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = {
+                    "open": 0,
+                    "checked_out": 0,
+                    "created_total": 0,
+                    "closed_total": 0,
+                    "checkouts_total": 0,
+                    "checkout_failures_total": 0,
+                    "cleared_total": 0,
+                }
+            for field, delta in deltas.items():
+                pool[field] += delta
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+    def pool_created(self, event):
+        self._bump(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, cleared_total=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, open=1, created_total=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, open=-1, closed_total=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, checkout_failures_total=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, checked_out=1, checkouts_total=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, checked_out=-1)
+
+
+pool_stats = PoolStats()
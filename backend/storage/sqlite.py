@@ -0,0 +1,973 @@
+"""
+Embedded SQLite implementation of the collection API used by the panel.
+
+Each collection is a table of JSON documents. Top-level equality and range
+predicates on plain field names are pushed down to SQL as json_extract()
+expressions, which is what create_index() indexes, so the hot lookups
+(id, username, user_id+id, server_id+id, token_hash) are index seeks. The
+complete filter is then re-checked in Python, so operators that cannot be
+pushed down still behave like MongoDB. Pushed-down equality assumes the field
+holds a scalar; array membership is not matched on those fields.
+
+Datetimes are stored as {"$date": "<fixed-width UTC ISO string>"} so they
+round-trip as aware datetimes and sort chronologically as JSON text.
+
+Calls run synchronously on the event loop: indexed lookups take a few
+microseconds, far less than handing them to a thread. Writes run inside
+BEGIN IMMEDIATE transactions so they stay atomic across worker processes.
+An update or delete whose filter matches nothing returns after a plain
+SELECT, without taking the write lock, so polling loops (supervisor
+commands, job claims) do not contend for it. A write is first tried on the
+loop without waiting; if another worker holds the lock, the wait and the
+write move to a thread so the event loop never sits in busy_timeout. That
+thread writes on a connection of its own, so reads on the loop neither
+queue behind the waiting writer nor see its uncommitted changes.
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+_MISSING = object()
+_FIELD_RE = re.compile(r"^[A-Za-z0-9_.]+$")
+_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+_TTL_PURGE_INTERVAL = 60  # seconds between TTL sweeps per collection
+_BUSY_TIMEOUT_MS = 5000  # how long a write waits for another process's lock
+
+_TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "date": lambda v: isinstance(v, datetime),
+    "bool": lambda v: isinstance(v, bool),
+    "int": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "long": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "double": lambda v: isinstance(v, float),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "null": lambda v: v is None,
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+}
+
+
+###############################################################################
+# JSON encoding
+###############################################################################
+
+def _format_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime(_DATE_FORMAT)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": _format_date(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _object_hook(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _dumps(doc: dict) -> str:
+    return json.dumps(doc, default=_json_default, separators=(",", ":"))
+
+
+def _loads(text: str) -> dict:
+    return json.loads(text, object_hook=_object_hook)
+
+
+def _sql_value(value):
+    """Bind value comparable with json_extract() output, or _MISSING if unsupported"""
+    if isinstance(value, datetime):
+        # json_extract returns embedded objects as minified JSON text
+        return '{"$date":"%s"}' % _format_date(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return _MISSING
+
+
+###############################################################################
+# Document helpers
+###############################################################################
+
+def _get_path(doc, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return _MISSING
+    return value
+
+
+def _set_path(doc: dict, path: str, value):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = value
+
+
+def _unset_path(doc: dict, path: str):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        target = target.get(part)
+        if not isinstance(target, dict):
+            return
+    target.pop(parts[-1], None)
+
+
+def _compare(value, op: str, operand) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def _equals(value, expected) -> bool:
+    if expected is None:
+        return value is _MISSING or value is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value is not _MISSING and value == expected
+
+
+def _match_operators(value, conditions: dict) -> bool:
+    for op, operand in conditions.items():
+        if op == "$eq":
+            ok = _equals(value, operand)
+        elif op == "$ne":
+            ok = not _equals(value, operand)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _compare(value, op, operand)
+        elif op == "$in":
+            ok = any(_equals(value, candidate) for candidate in operand)
+        elif op == "$nin":
+            ok = not any(_equals(value, candidate) for candidate in operand)
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(operand)
+        elif op == "$type":
+            check = _TYPE_CHECKS.get(operand)
+            if check is None:
+                raise OperationFailure(f"Unsupported $type {operand!r} in SQLite backend")
+            ok = value is not _MISSING and check(value)
+        elif op == "$not":
+            ok = not _match_operators(value, operand)
+        else:
+            raise OperationFailure(f"Unsupported query operator {op} in SQLite backend")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """Evaluate a MongoDB-style filter against a document"""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, sub) for sub in condition):
+                return False
+        else:
+            value = _get_path(doc, key)
+            if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+                if not _match_operators(value, condition):
+                    return False
+            elif not _equals(value, condition):
+                return False
+    return True
+
+
+def _evaluate(expression, doc: dict):
+    """Evaluate the aggregation expressions allowed in update pipelines"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get_path(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, list):
+        return [_evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict) or len(expression) != 1:
+        if isinstance(expression, dict):
+            return {key: _evaluate(value, doc) for key, value in expression.items()}
+        return expression
+
+    op, args = next(iter(expression.items()))
+    if op == "$literal":
+        return args
+    if not op.startswith("$"):
+        return {op: _evaluate(args, doc)}
+
+    values = _evaluate(args, doc) if isinstance(args, list) else [_evaluate(args, doc)]
+    if op == "$eq":
+        return values[0] == values[1]
+    if op == "$ne":
+        return values[0] != values[1]
+    if op == "$not":
+        return not values[0]
+    if op == "$and":
+        return all(values)
+    if op == "$or":
+        return any(values)
+    if op == "$ifNull":
+        return next((v for v in values if v is not None), None)
+    if op == "$cond":
+        if isinstance(args, dict):
+            return _evaluate(args["then"] if _evaluate(args["if"], doc) else args["else"], doc)
+        return values[1] if values[0] else values[2]
+    if op == "$add":
+        return sum(values)
+    if op == "$subtract":
+        return values[0] - values[1]
+    if op in ("$max", "$min"):
+        present = [v for v in values if v is not None]
+        if not present:
+            return None
+        return max(present) if op == "$max" else min(present)
+    raise OperationFailure(f"Unsupported expression {op} in SQLite backend")
+
+
+def _apply_update(doc: dict, update, inserting: bool = False) -> dict:
+    """Return a copy of doc with an update document or pipeline applied"""
+    doc = json.loads(_dumps(doc), object_hook=_object_hook)
+
+    if isinstance(update, list):
+        for stage in update:
+            for op, fields in stage.items():
+                if op in ("$set", "$addFields"):
+                    values = {path: _evaluate(expression, doc) for path, expression in fields.items()}
+                    for path, value in values.items():
+                        _set_path(doc, path, value)
+                elif op == "$unset":
+                    for path in ([fields] if isinstance(fields, str) else fields):
+                        _unset_path(doc, path)
+                else:
+                    raise OperationFailure(f"Unsupported pipeline stage {op} in SQLite backend")
+        return doc
+
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for path, value in fields.items():
+                _set_path(doc, path, value)
+        elif op == "$setOnInsert":
+            continue
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING or current is None else current) + amount)
+        elif op in ("$max", "$min"):
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                if current is _MISSING or current is None or (value > current if op == "$max" else value < current):
+                    _set_path(doc, path, value)
+        elif op == "$push":
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                items = [] if current is _MISSING or current is None else list(current)
+                if isinstance(value, dict) and "$each" in value:
+                    items.extend(value["$each"])
+                    if "$slice" in value:
+                        size = value["$slice"]
+                        items = items[size:] if size < 0 else items[:size]
+                else:
+                    items.append(value)
+                _set_path(doc, path, items)
+        elif op == "$addToSet":
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                items = [] if current is _MISSING or current is None else list(current)
+                if value not in items:
+                    items.append(value)
+                _set_path(doc, path, items)
+        elif op == "$pull":
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                if isinstance(current, list):
+                    _set_path(doc, path, [item for item in current if not _equals(item, value)])
+        else:
+            raise OperationFailure(f"Unsupported update operator {op} in SQLite backend")
+    return doc
+
+
+def _load_row(rowid: int, text: str) -> dict:
+    """Decode a stored document; rows without a custom _id use their rowid"""
+    doc = _loads(text)
+    doc.setdefault("_id", rowid)
+    return doc
+
+
+def _storable(doc: dict) -> str:
+    """Encode a document, dropping rowid-based _id values (custom _ids must not be ints)"""
+    if isinstance(doc.get("_id"), int) or doc.get("_id", _MISSING) is None:
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+    return _dumps(doc)
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return dict(doc)
+
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if any(fields.values()) or (not fields and include_id):
+        projected = {}
+        for path, flag in fields.items():
+            if not flag:
+                continue
+            if "." not in path:
+                # Top-level fields are the common case; skip the path walk
+                if path in doc:
+                    projected[path] = doc[path]
+                continue
+            value = _get_path(doc, path)
+            if value is not _MISSING:
+                _set_path(projected, path, value)
+    else:
+        projected = dict(doc)
+        for path in fields:
+            _unset_path(projected, path)
+    if include_id:
+        projected["_id"] = doc["_id"]
+    else:
+        projected.pop("_id", None)
+    return projected
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+        self.acknowledged = True
+
+
+###############################################################################
+# Collections and cursors
+###############################################################################
+
+def _field_sql(field: str, operand=None) -> str:
+    if field == "_id" and (operand is None or isinstance(operand, int)):
+        return "rowid"
+    return f"json_extract(doc, '$.{field}')"
+
+
+def _sort_spec(key_or_list, direction=None) -> list:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(key, value) for key, value in key_or_list]
+
+
+class SQLiteCursor:
+    """Lazy cursor mirroring Motor's find() cursor"""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+        self._skip = 0
+        self._batch_size = 500
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    def skip(self, skip: int):
+        self._skip = skip
+        return self
+
+    def batch_size(self, batch_size: int):
+        self._batch_size = batch_size
+        return self
+
+    def _rows(self):
+        """Yield (rowid, doc) pairs, fetching from SQLite in batches"""
+        sql, params, exact = self._collection._select_sql(self._query, self._sort)
+        if exact and self._limit:
+            sql += f" LIMIT {int(self._limit)} OFFSET {int(self._skip)}"
+        cursor = self._collection._db._conn.execute(sql, params)
+        skipped = 0 if not exact else self._skip
+        produced = 0
+        while True:
+            rows = cursor.fetchmany(self._batch_size)
+            if not rows:
+                return
+            for rowid, text in rows:
+                doc = _load_row(rowid, text)
+                if not exact and not matches(doc, self._query):
+                    continue
+                if skipped < self._skip:
+                    skipped += 1
+                    continue
+                yield rowid, doc
+                produced += 1
+                if self._limit and produced >= self._limit:
+                    return
+
+    async def to_list(self, length=None):
+        self._collection._purge_expired()
+        docs = []
+        for rowid, doc in self._rows():
+            docs.append(_project(doc, self._projection))
+            if length and len(docs) >= length:
+                break
+        return docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        self._collection._purge_expired()
+        count = 0
+        for rowid, doc in self._rows():
+            yield _project(doc, self._projection)
+            count += 1
+            if count % self._batch_size == 0:
+                # Let other requests run while a long listing streams
+                await asyncio.sleep(0)
+
+
+class _IndexCursor:
+    def __init__(self, indexes):
+        self._indexes = indexes
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index in self._indexes:
+            yield index
+
+    async def to_list(self, length=None):
+        return list(self._indexes)
+
+
+class SQLiteCollection:
+    def __init__(self, db, name: str):
+        self._db = db
+        self.name = name
+        self._table = f'"c_{name}"'
+        self._last_purge = 0.0
+        db._conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (rowid INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+
+    # -- query planning -----------------------------------------------------
+
+    def _where(self, query: dict):
+        """Translate pushable top-level predicates into SQL; exact=False if Python must re-check"""
+        clauses, params = [], []
+        exact = True
+        for key, condition in query.items():
+            if key.startswith("$") or not _FIELD_RE.match(key):
+                exact = False
+                continue
+            if isinstance(condition, dict) and condition:
+                column = _field_sql(key, next(iter(condition.values())))
+            else:
+                column = _field_sql(key, condition)
+            if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+                for op, operand in condition.items():
+                    sql_op = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$eq": "="}.get(op)
+                    if sql_op and operand is not None and _sql_value(operand) is not _MISSING:
+                        clauses.append(f"{column} {sql_op} ?")
+                        params.append(_sql_value(operand))
+                    elif op == "$in" and operand and all(
+                        v is not None and _sql_value(v) is not _MISSING for v in operand
+                    ):
+                        clauses.append(f"{column} IN ({','.join('?' * len(operand))})")
+                        params.extend(_sql_value(v) for v in operand)
+                    else:
+                        exact = False
+                    if op in ("$gt", "$gte", "$lt", "$lte"):
+                        # SQLite orders mixed types where Mongo would not match
+                        exact = False
+            elif condition is None:
+                clauses.append(f"{column} IS NULL")
+            elif _sql_value(condition) is not _MISSING and not isinstance(condition, float):
+                clauses.append(f"{column} = ?")
+                params.append(_sql_value(condition))
+            else:
+                exact = False
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params, exact
+
+    def _select_sql(self, query: dict, sort: list):
+        where, params, exact = self._where(query)
+        sql = f"SELECT rowid, doc FROM {self._table}{where}"
+        order = []
+        for field, direction in sort:
+            if not _FIELD_RE.match(field):
+                raise OperationFailure(f"Unsupported sort key {field!r} in SQLite backend")
+            order.append(f"{_field_sql(field)} {'DESC' if direction == -1 else 'ASC'}")
+        if order:
+            sql += " ORDER BY " + ", ".join(order)
+        return sql, params, exact
+
+    def _matching(self, query: dict, sort=None, limit: int = 0):
+        sql, params, exact = self._select_sql(query or {}, sort or [])
+        if exact and limit:
+            sql += f" LIMIT {int(limit)}"
+        found = []
+        for rowid, text in self._db._conn.execute(sql, params):
+            doc = _load_row(rowid, text)
+            if exact or matches(doc, query or {}):
+                found.append((rowid, doc))
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    # -- TTL -------------------------------------------------------------------
+
+    def _purge_expired(self):
+        ttl = self._db._ttl.get(self.name)
+        if not ttl:
+            return
+        now = time.monotonic()
+        if now - self._last_purge < _TTL_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        field, seconds = ttl
+        cutoff = datetime.now(timezone.utc).timestamp() - seconds
+        cutoff_value = _sql_value(datetime.fromtimestamp(cutoff, tz=timezone.utc))
+        try:
+            with _WriteTransaction(self._db, wait=False):
+                self._db._conn.execute(
+                    f"DELETE FROM {self._table} WHERE json_type(doc, '$.{field}') = 'object' "
+                    f"AND {_field_sql(field)} < ?",
+                    (cutoff_value,)
+                )
+        except _Busy:
+            pass  # best effort; the next sweep catches up
+
+    # -- reads -----------------------------------------------------------------
+
+    def find(self, filter=None, projection=None, **kwargs):
+        cursor = SQLiteCursor(self, filter, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter=None, projection=None, **kwargs):
+        self._purge_expired()
+        found = self._matching(filter or {}, _sort_spec(kwargs["sort"]) if kwargs.get("sort") else None, 1)
+        if not found:
+            return None
+        return _project(found[0][1], projection)
+
+    async def count_documents(self, filter=None, **kwargs):
+        self._purge_expired()
+        where, params, exact = self._where(filter or {})
+        if exact:
+            return self._db._conn.execute(f"SELECT COUNT(*) FROM {self._table}{where}", params).fetchone()[0]
+        return len(self._matching(filter or {}))
+
+    async def estimated_document_count(self):
+        return self._db._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    # -- writes ----------------------------------------------------------------
+
+    def _exists(self, filter) -> bool:
+        """Whether anything matches; checked before taking the write lock"""
+        return bool(self._matching(filter or {}, limit=1))
+
+    def _insert(self, doc: dict):
+        try:
+            cursor = self._db._conn.execute(f"INSERT INTO {self._table} (doc) VALUES (?)", (_storable(doc),))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e), 11000)
+        custom_id = doc.get("_id")
+        return custom_id if custom_id is not None and not isinstance(custom_id, int) else cursor.lastrowid
+
+    def _replace(self, rowid: int, doc: dict):
+        try:
+            self._db._conn.execute(f"UPDATE {self._table} SET doc = ? WHERE rowid = ?", (_storable(doc), rowid))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e), 11000)
+
+    def _upsert_base(self, query: dict) -> dict:
+        base = {}
+        for key, condition in query.items():
+            if key.startswith("$"):
+                continue
+            if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+                if "$eq" in condition:
+                    _set_path(base, key, condition["$eq"])
+                continue
+            _set_path(base, key, condition)
+        return base
+
+    async def insert_one(self, document: dict, **kwargs):
+        rowid = await self._db._transaction(lambda: self._insert(document))
+        return _Result(inserted_id=rowid)
+
+    async def insert_many(self, documents, ordered=True, **kwargs):
+        ids = await self._db._transaction(lambda: [self._insert(document) for document in documents])
+        return _Result(inserted_ids=ids)
+
+    def _update(self, filter, update, many: bool, upsert: bool):
+        matched = modified = 0
+        upserted_id = None
+        targets = self._matching(filter, limit=0 if many else 1)
+        for rowid, doc in targets:
+            matched += 1
+            updated = _apply_update(doc, update)
+            if updated != doc:
+                self._replace(rowid, updated)
+                modified += 1
+        if not targets and upsert:
+            doc = _apply_update(self._upsert_base(filter), update, inserting=True)
+            upserted_id = self._insert(doc)
+        return _Result(matched_count=matched, modified_count=modified, upserted_id=upserted_id)
+
+    async def update_one(self, filter, update, upsert=False, **kwargs):
+        if not upsert and not self._exists(filter):
+            return _Result(matched_count=0, modified_count=0, upserted_id=None)
+        return await self._db._transaction(lambda: self._update(filter, update, many=False, upsert=upsert))
+
+    async def update_many(self, filter, update, upsert=False, **kwargs):
+        if not upsert and not self._exists(filter):
+            return _Result(matched_count=0, modified_count=0, upserted_id=None)
+        return await self._db._transaction(lambda: self._update(filter, update, many=True, upsert=upsert))
+
+    async def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        if not upsert and not self._exists(filter):
+            return _Result(matched_count=0, modified_count=0, upserted_id=None)
+
+        def replace():
+            targets = self._matching(filter, limit=1)
+            if targets:
+                self._replace(targets[0][0], {**replacement, "_id": targets[0][1]["_id"]})
+                return _Result(matched_count=1, modified_count=1, upserted_id=None)
+            if upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=self._insert(replacement))
+            return _Result(matched_count=0, modified_count=0, upserted_id=None)
+
+        return await self._db._transaction(replace)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None,
+                                  upsert=False, return_document=False, **kwargs):
+        if not upsert and not self._exists(filter):
+            return None
+
+        def update_first():
+            targets = self._matching(filter, _sort_spec(sort) if sort else None, 1)
+            if targets:
+                rowid, before = targets[0]
+                after = _apply_update(before, update)
+                self._replace(rowid, after)
+                return before, after
+            if upsert:
+                after = _apply_update(self._upsert_base(filter), update, inserting=True)
+                after["_id"] = self._insert(after)
+                return None, after
+            return None, None  # taken by another worker since the check
+
+        before, after = await self._db._transaction(update_first)
+        if after is None:
+            return None
+        # pymongo's ReturnDocument.AFTER is True
+        if return_document:
+            return _project(after, projection)
+        return None if before is None else _project(before, projection)
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        if not self._exists(filter):
+            return None
+
+        def delete_first():
+            targets = self._matching(filter, _sort_spec(sort) if sort else None, 1)
+            if not targets:
+                return None
+            rowid, doc = targets[0]
+            self._db._conn.execute(f"DELETE FROM {self._table} WHERE rowid = ?", (rowid,))
+            return doc
+
+        doc = await self._db._transaction(delete_first)
+        return None if doc is None else _project(doc, projection)
+
+    async def _delete(self, filter, many: bool):
+        if not self._exists(filter):
+            return _Result(deleted_count=0)
+
+        def delete():
+            rowids = [rowid for rowid, _ in self._matching(filter or {}, limit=0 if many else 1)]
+            if rowids:
+                self._db._conn.execute(
+                    f"DELETE FROM {self._table} WHERE rowid IN ({','.join('?' * len(rowids))})",
+                    rowids
+                )
+            return len(rowids)
+
+        return _Result(deleted_count=await self._db._transaction(delete))
+
+    async def delete_one(self, filter, **kwargs):
+        return await self._delete(filter, many=False)
+
+    async def delete_many(self, filter, **kwargs):
+        return await self._delete(filter, many=True)
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        return await self._db._transaction(lambda: self._bulk_write(requests))
+
+    def _bulk_write(self, requests):
+        matched = modified = inserted = deleted = 0
+        for request in requests:
+            kind = type(request).__name__
+            if kind in ("UpdateOne", "UpdateMany"):
+                result = self._update(request._filter, request._doc, many=kind == "UpdateMany",
+                                      upsert=bool(request._upsert))
+                matched += result.matched_count
+                modified += result.modified_count
+            elif kind == "InsertOne":
+                self._insert(request._doc)
+                inserted += 1
+            elif kind in ("DeleteOne", "DeleteMany"):
+                rowids = [rowid for rowid, _ in self._matching(request._filter, limit=0 if kind == "DeleteMany" else 1)]
+                for rowid in rowids:
+                    self._db._conn.execute(f"DELETE FROM {self._table} WHERE rowid = ?", (rowid,))
+                deleted += len(rowids)
+            else:
+                raise OperationFailure(f"Unsupported bulk operation {kind} in SQLite backend")
+        return _Result(matched_count=matched, modified_count=modified,
+                       inserted_count=inserted, deleted_count=deleted)
+
+    # -- indexes -----------------------------------------------------------------
+
+    async def create_index(self, keys, name=None, unique=False, sparse=False,
+                           expireAfterSeconds=None, **kwargs):
+        keys = _sort_spec(keys, 1)
+        for field, _ in keys:
+            if not _FIELD_RE.match(field):
+                raise OperationFailure(f"Unsupported index key {field!r} in SQLite backend")
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        columns = ", ".join(_field_sql(field) for field, _ in keys)
+        with self._db._write():
+            try:
+                self._db._conn.execute(
+                    f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{self.name}__{name}" '
+                    f"ON {self._table} ({columns})"
+                )
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(str(e), 11000)
+            spec = {"v": 2, "key": dict(keys), "name": name}
+            if unique:
+                spec["unique"] = True
+            if sparse:
+                spec["sparse"] = True
+            if expireAfterSeconds is not None:
+                spec["expireAfterSeconds"] = expireAfterSeconds
+                self._db._ttl[self.name] = (keys[0][0], expireAfterSeconds)
+            self._db._conn.execute(
+                "INSERT OR REPLACE INTO _indexes (collection, name, spec) VALUES (?, ?, ?)",
+                (self.name, name, json.dumps(spec))
+            )
+        return name
+
+    def list_indexes(self):
+        indexes = [{"v": 2, "key": {"_id": 1}, "name": "_id_"}]
+        for (spec,) in self._db._conn.execute(
+            "SELECT spec FROM _indexes WHERE collection = ? ORDER BY rowid", (self.name,)
+        ):
+            indexes.append(json.loads(spec))
+        return _IndexCursor(indexes)
+
+    async def index_information(self):
+        return {index["name"]: index async for index in self.list_indexes()}
+
+    async def drop_index(self, name):
+        with self._db._write():
+            self._db._conn.execute(f'DROP INDEX IF EXISTS "{self.name}__{name}"')
+            self._db._conn.execute("DELETE FROM _indexes WHERE collection = ? AND name = ?", (self.name, name))
+        ttl = self._db._ttl.get(self.name)
+        if ttl:
+            self._db._ttl.pop(self.name, None)
+            self._db._load_ttl()
+
+    async def drop(self):
+        with self._db._write():
+            self._db._conn.execute(f"DROP TABLE IF EXISTS {self._table}")
+            self._db._conn.execute("DELETE FROM _indexes WHERE collection = ?", (self.name,))
+        self._db._collections.pop(self.name, None)
+        self._db._ttl.pop(self.name, None)
+
+
+class SQLiteDatabase:
+    def __init__(self, client, path: str):
+        self.client = client
+        self.name = path
+        self._loop_conn = self._connect()
+        self._loop_conn.execute("PRAGMA journal_mode=WAL")
+        self._thread_conn = None  # opened for the first write that has to wait
+        self._local = threading.local()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _indexes (collection TEXT, name TEXT, spec TEXT, "
+            "PRIMARY KEY (collection, name))"
+        )
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.contended_writes = 0  # writes that had to wait for another holder of the lock
+        self._collections = {}
+        self._ttl = {}
+        self._load_ttl()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.name, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The connection for the calling thread: the loop's, or the waiting writer's"""
+        return getattr(self._local, "conn", None) or self._loop_conn
+
+    def _load_ttl(self):
+        for collection, spec in self._conn.execute("SELECT collection, spec FROM _indexes"):
+            spec = json.loads(spec)
+            if "expireAfterSeconds" in spec:
+                self._ttl[collection] = (next(iter(spec["key"])), spec["expireAfterSeconds"])
+
+    def _write(self):
+        return _WriteTransaction(self)
+
+    async def _transaction(self, fn):
+        """Run fn() in a write transaction, waiting for a held lock on a thread"""
+        try:
+            with _WriteTransaction(self, wait=False):
+                return fn()
+        except _Busy:
+            self.contended_writes += 1
+        return await asyncio.to_thread(self._transaction_blocking, fn)
+
+    def _transaction_blocking(self, fn):
+        with self._lock:
+            if self._thread_conn is None:
+                self._thread_conn = self._connect()
+            self._local.conn = self._thread_conn
+            try:
+                with self._write():
+                    return fn()
+            finally:
+                del self._local.conn
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = SQLiteCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> SQLiteCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self):
+        return [
+            row[0][2:] for row in
+            self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'c\\_%' ESCAPE '\\'")
+        ]
+
+    async def command(self, command, *args, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"Unsupported command {name!r} in SQLite backend")
+
+
+class _Busy(Exception):
+    """The write lock is held elsewhere and the caller asked not to wait"""
+
+
+class _WriteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, re-entrant within the process
+
+    wait=False raises _Busy instead of blocking when the lock is held by
+    another thread or another process.
+    """
+
+    def __init__(self, db: SQLiteDatabase, wait: bool = True):
+        self._db = db
+        self._wait = wait
+
+    def __enter__(self):
+        if not self._db._lock.acquire(blocking=self._wait):
+            raise _Busy()
+        try:
+            if self._db._depth == 0:
+                self._begin()
+        except BaseException:
+            self._db._lock.release()
+            raise
+        self._db._depth += 1
+
+    def _begin(self):
+        conn = self._db._conn
+        if self._wait:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        conn.execute("PRAGMA busy_timeout=0")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                raise _Busy() from e
+            raise
+        finally:
+            conn.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+
+    def __exit__(self, exc_type, exc, tb):
+        self._db._depth -= 1
+        try:
+            if self._db._depth == 0:
+                self._db._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._db._lock.release()
+
+
+class SQLiteClient:
+    """Stands in for AsyncIOMotorClient; every database name maps to the same file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = SQLiteDatabase(self, path)
+
+    def __getitem__(self, name: str) -> SQLiteDatabase:
+        return self._db
+
+    def get_database(self, name: str = None) -> SQLiteDatabase:
+        return self._db
+
+    async def drop_database(self, name):
+        for collection in await self._db.list_collection_names():
+            await self._db[collection].drop()
+
+    def close(self):
+        self._db._loop_conn.close()
+        if self._db._thread_conn is not None:
+            self._db._thread_conn.close()
@@ -0,0 +1,226 @@
+"""
+Game server process supervision, owned by one elected panel worker.
+
+A server process belongs to whichever worker called Popen, and only that
+worker can reap it. With several workers, stop/restart on another worker
+only worked if it happened to be the parent. So process control runs on a
+single leader, chosen with a LeaderLease:
+
+- Control requests on the leader run directly. Any other worker queues
+  them in `process_commands`; the leader claims them in order and writes
+  the result (or the HTTP error) back, and the requesting worker returns it
+  as if it had run the command itself.
+- Commands for one server are serialized, so a stop and a start cannot
+  interleave no matter which workers received them.
+- When a worker becomes leader it re-adopts servers whose processes are
+  still running (by pid and working directory, on this host), marks the
+  rest offline, and fails commands the previous leader claimed but never
+  finished, so callers do not wait for them until they time out.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from cluster import HOSTNAME, WORKER_ID, ClusterEvents, LeaderLease
+from process_control import LocalProcesses
+
+logger = logging.getLogger(__name__)
+
+COMMAND_POLL_SECONDS = 0.1
+# Finished commands are kept this long for inspection, then removed by a TTL index
+COMMAND_RETENTION = timedelta(hours=1)
+
+
+class ProcessSupervisor:
+    def __init__(self, db, lease: LeaderLease, events: ClusterEvents, processes: LocalProcesses,
+                 command_timeout: float = 90.0):
+        self.db = db
+        self.lease = lease
+        self.events = events
+        self.processes = processes
+        self.command_timeout = command_timeout
+        self.handlers: dict = {}  # action -> async handler(server_id, user_id) -> dict
+        self.on_server_changed = None  # async callable(user_id)
+        self.adopted: dict = {}  # server_id -> pid found running after an election
+        self._locks: dict = {}  # server_id -> asyncio.Lock
+        self._tasks: set = set()
+        self.stats = {"executed": 0, "forwarded": 0, "claimed": 0, "timed_out": 0}
+
+    def register(self, action: str, handler):
+        self.handlers[action] = handler
+
+    # -- commands --------------------------------------------------------------
+
+    async def execute(self, action: str, server_id: str, user_id: str) -> dict:
+        """Run a control action on the leader, wherever this request landed"""
+        if self.lease.is_leader:
+            return await self._run_local(action, server_id, user_id)
+        return await self._forward(action, server_id, user_id)
+
+    async def _run_local(self, action: str, server_id: str, user_id: str) -> dict:
+        lock = self._locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            self.stats["executed"] += 1
+            return await self.handlers[action](server_id, user_id)
+
+    async def _forward(self, action: str, server_id: str, user_id: str) -> dict:
+        now = datetime.now(timezone.utc)
+        command_id = str(uuid.uuid4())
+        await self.db.process_commands.insert_one({
+            "id": command_id,
+            "action": action,
+            "server_id": server_id,
+            "user_id": user_id,
+            "status": "pending",
+            "origin": WORKER_ID,
+            "created_at": now,
+            "expires_at": now + COMMAND_RETENTION,
+        })
+        self.stats["forwarded"] += 1
+
+        deadline = time.monotonic() + self.command_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(COMMAND_POLL_SECONDS)
+            command = await self.db.process_commands.find_one(
+                {"id": command_id, "status": {"$in": ["done", "failed"]}},
+                {"_id": 0, "status": 1, "result": 1, "error_status": 1, "error_detail": 1}
+            )
+            if command is None:
+                continue
+            # The leader broadcast its cache invalidations before finishing; apply them
+            # here so the caller's next read on this worker is already current
+            await self.events.poll()
+            if command["status"] == "failed":
+                raise HTTPException(status_code=command["error_status"], detail=command["error_detail"])
+            return command["result"]
+
+        # Withdraw it unless the leader has already started on it
+        await self.db.process_commands.update_one(
+            {"id": command_id, "status": "pending"},
+            {"$set": {"status": "cancelled"}}
+        )
+        self.stats["timed_out"] += 1
+        raise HTTPException(
+            status_code=504,
+            detail="No process supervisor answered in time; check the server status and retry"
+        )
+
+    async def _claim_commands(self):
+        while self.lease.is_leader:
+            command = await self.db.process_commands.find_one_and_update(
+                {"status": "pending"},
+                {"$set": {
+                    "status": "running",
+                    "claimed_by": WORKER_ID,
+                    "term": self.lease.term,
+                    "claimed_at": datetime.now(timezone.utc),
+                }},
+                projection={"_id": 0, "id": 1, "action": 1, "server_id": 1, "user_id": 1},
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if command is None:
+                return
+            self.stats["claimed"] += 1
+            task = asyncio.create_task(self._run_command(command))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_command(self, command: dict):
+        try:
+            result = await self._run_local(command["action"], command["server_id"], command["user_id"])
+            update = {"status": "done", "result": result}
+        except HTTPException as e:
+            update = {"status": "failed", "error_status": e.status_code, "error_detail": e.detail}
+        except Exception as e:
+            logger.error(f"Process command {command['action']} for {command['server_id']} failed: {e}", exc_info=True)
+            update = {"status": "failed", "error_status": 500, "error_detail": str(e)}
+        update["finished_at"] = datetime.now(timezone.utc)
+        await self.db.process_commands.update_one({"id": command["id"]}, {"$set": update})
+
+    # -- leadership --------------------------------------------------------------
+
+    async def _on_elected(self):
+        failed = await self.db.process_commands.update_many(
+            {"status": "running", "claimed_by": {"$ne": WORKER_ID}},
+            {"$set": {
+                "status": "failed",
+                "error_status": 503,
+                "error_detail": "The process supervisor changed while this command was running; "
+                                "check the server status and retry",
+                "finished_at": datetime.now(timezone.utc),
+            }}
+        )
+
+        servers = await self.db.servers.find(
+            {"status": {"$in": ["online", "restarting"]}},
+            {"_id": 0, "id": 1, "user_id": 1, "pid": 1, "host": 1, "install_path": 1, "node_id": 1}
+        ).to_list(None)
+        self.adopted = {}
+        stopped = remote = 0
+        for server in servers:
+            if server.get("node_id") or server.get("host", HOSTNAME) != HOSTNAME:
+                # Runs under a node agent or another panel's host; not ours to judge
+                remote += 1
+                continue
+            pid = server.get("pid")
+            if pid and self.processes.is_alive(pid) and self.processes.is_server_process(pid, server["install_path"]):
+                self.adopted[server["id"]] = pid
+                continue
+            await self.db.servers.update_one(
+                {"id": server["id"], "pid": pid},
+                {"$set": {"status": "offline", "current_players": 0, "pid": None}}
+            )
+            stopped += 1
+            if self.on_server_changed is not None:
+                await self.on_server_changed(server["user_id"])
+
+        logger.info(
+            f"Process supervisor term {self.lease.term}: adopted {len(self.adopted)} running servers, "
+            f"marked {stopped} offline, skipped {remote} on other hosts or nodes, "
+            f"failed {failed.modified_count} interrupted commands"
+        )
+
+    async def run(self):
+        """Hold or contend for the lease, and while leader, execute queued commands"""
+        next_renewal = 0.0
+        while True:
+            self.processes.reap()
+            if time.monotonic() >= next_renewal:
+                was_leader = self.lease.is_leader
+                try:
+                    await self.lease.acquire_or_renew()
+                except Exception as e:
+                    logger.warning(f"Lease renewal failed, stepping down: {e}")
+                    self.lease.step_down()
+                next_renewal = time.monotonic() + self.lease.renew_interval
+                if self.lease.is_leader and not was_leader:
+                    try:
+                        await self._on_elected()
+                    except Exception as e:
+                        logger.error(f"Re-adopting servers failed: {e}", exc_info=True)
+
+            if self.lease.is_leader:
+                try:
+                    await self._claim_commands()
+                except Exception as e:
+                    logger.warning(f"Claiming process commands failed: {e}")
+            await asyncio.sleep(COMMAND_POLL_SECONDS)
+
+    async def status(self) -> dict:
+        return {
+            "worker": WORKER_ID,
+            "is_leader": self.lease.is_leader,
+            "term": self.lease.term,
+            "lease": await self.lease.current(),
+            "children": sorted(self.processes.children),
+            "adopted": self.adopted,
+            "pending_commands": await self.db.process_commands.count_documents({"status": "pending"}),
+            "stats": self.stats,
+        }
@@ -9,10 +9,13 @@ import PasswordResetPage from "./pages/PasswordResetPage";
 import TOTPSetupModal from "./components/TOTPSetupModal";
 import { useSessionTimeout, SessionTimeoutWarning } from "./hooks/useSessionTimeout";
 import { Toaster } from "@/components/ui/sonner";
+import { installAuthInterceptor } from "@/lib/auth";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+installAuthInterceptor();
+
 function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -42,8 +45,11 @@ function App() {
     }
   };
 
-  const handleLogin = (token, username, requires_totp_setup, session_timeout) => {
+  const handleLogin = (token, username, requires_totp_setup, session_timeout, refresh_token) => {
     localStorage.setItem('token', token);
+    if (refresh_token) {
+      localStorage.setItem('refresh_token', refresh_token);
+    }
     localStorage.setItem('username', username);
     localStorage.setItem('login_time', Date.now().toString());
     localStorage.setItem('session_timeout', session_timeout.toString());
@@ -56,16 +62,23 @@ function App() {
   };
 
   function handleLogout() {
+    const token = localStorage.getItem('token');
+    if (token) {
+      axios
+        .post(`${API}/auth/logout`, {}, { headers: { Authorization: `Bearer ${token}` } })
+        .catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('username');
     localStorage.removeItem('login_time');
     localStorage.removeItem('session_timeout');
     setIsAuthenticated(false);
   }
 
-  const handleFirstTimeSetup = (token, username, requires_totp_setup, session_timeout) => {
+  const handleFirstTimeSetup = (token, username, requires_totp_setup, session_timeout, refresh_token) => {
     setIsFirstRun(false);
-    handleLogin(token, username, requires_totp_setup, session_timeout);
+    handleLogin(token, username, requires_totp_setup, session_timeout, refresh_token);
   };
 
   const handlePasswordResetSuccess = () => {
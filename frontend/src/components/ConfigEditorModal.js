@@ -10,6 +10,8 @@ export default function ConfigEditorModal({ serverId, onClose }) {
   const [config, setConfig] = useState("");
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
+  // Version of the file as loaded; saving is refused if it changed since
+  const [etag, setEtag] = useState(null);
 
   const getAuthHeader = () => ({
     headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
@@ -26,6 +28,7 @@ export default function ConfigEditorModal({ serverId, onClose }) {
         getAuthHeader()
       );
       setConfig(response.data.content);
+      setEtag(response.headers.etag || null);
     } catch (error) {
       toast.error("Failed to load configuration");
     } finally {
@@ -36,15 +39,20 @@ export default function ConfigEditorModal({ serverId, onClose }) {
   const handleSave = async () => {
     setSaving(true);
     try {
+      const auth = getAuthHeader();
       await axios.put(
         `${API}/servers/${serverId}/config`,
         { content: config },
-        getAuthHeader()
+        { headers: { ...auth.headers, ...(etag ? { "If-Match": etag } : {}) } }
       );
       toast.success("Configuration saved successfully");
       onClose();
     } catch (error) {
-      toast.error("Failed to save configuration");
+      if (error.response?.status === 412) {
+        toast.error("Configuration was changed elsewhere; reopen the editor to load the latest version");
+      } else {
+        toast.error("Failed to save configuration");
+      }
     } finally {
       setSaving(false);
     }
@@ -10,6 +10,7 @@ export default function SteamCMDModal({ onClose }) {
   const [status, setStatus] = useState(null);
   const [installing, setInstalling] = useState(false);
   const [loading, setLoading] = useState(true);
+  const [progress, setProgress] = useState(null);
 
   const getAuthHeader = () => ({
     headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
@@ -30,16 +31,37 @@ export default function SteamCMDModal({ onClose }) {
     fetchStatus();
   }, []);
 
+  // The install runs as a background job; poll it until it finishes
+  const waitForJob = async (jobId) => {
+    for (;;) {
+      const { data: job } = await axios.get(`${API}/jobs/${jobId}`, getAuthHeader());
+      setProgress(job.progress?.fraction);
+      if (["succeeded", "failed", "cancelled"].includes(job.status)) {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleInstall = async () => {
     setInstalling(true);
     try {
       const response = await axios.post(`${API}/steamcmd/install`, {}, getAuthHeader());
-      toast.success(response.data.message);
+      if (response.data.job_id) {
+        const job = await waitForJob(response.data.job_id);
+        if (job.status !== "succeeded") {
+          throw new Error(job.error || `Installation ${job.status}`);
+        }
+        toast.success("SteamCMD installed successfully");
+      } else {
+        toast.success(response.data.message);
+      }
       await fetchStatus();
     } catch (error) {
-      toast.error(error.response?.data?.detail || "Installation failed");
+      toast.error(error.response?.data?.detail || error.message || "Installation failed");
     } finally {
       setInstalling(false);
+      setProgress(null);
     }
   };
 
@@ -123,7 +145,9 @@ export default function SteamCMDModal({ onClose }) {
                 className="w-full bg-primary hover:bg-primary/90 text-primary-foreground font-secondary uppercase tracking-wider rounded-sm shadow-sm transition-all active:scale-95 h-10 disabled:opacity-50 disabled:cursor-not-allowed glow-primary flex items-center justify-center gap-2"
               >
                 {installing ? (
-                  <span>INSTALLING...</span>
+                  <span>
+                    INSTALLING{progress != null ? ` ${Math.round(progress * 100)}%` : "..."}
+                  </span>
                 ) : (
                   <>
                     <Download size={16} />
@@ -6,12 +6,11 @@ import { toast } from "sonner";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
-export default function SubAdminManagementModal({ onClose }) {
+export default function SubAdminManagementModal({ servers, onClose }) {
   const [subAdmins, setSubAdmins] = useState([]);
   const [loading, setLoading] = useState(true);
   const [showCreateForm, setShowCreateForm] = useState(false);
   const [editingId, setEditingId] = useState(null);
-  const [servers, setServers] = useState([]);
 
   const [formData, setFormData] = useState({
     username: "",
@@ -29,13 +28,10 @@ export default function SubAdminManagementModal({ onClose }) {
       const token = localStorage.getItem('token');
       const headers = { Authorization: `Bearer ${token}` };
       
-      const [subAdminsRes, serversRes] = await Promise.all([
-        axios.get(`${API}/admin/sub-admins`, { headers }),
-        axios.get(`${API}/servers`, { headers })
-      ]);
+      // The server list comes from the dashboard that opened this modal
+      const subAdminsRes = await axios.get(`${API}/admin/sub-admins`, { headers });
       
       setSubAdmins(subAdminsRes.data);
-      setServers(serversRes.data);
     } catch (error) {
       toast.error("Failed to load data");
     } finally {
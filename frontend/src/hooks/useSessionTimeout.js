@@ -1,6 +1,7 @@
 import { useState, useEffect, useCallback } from "react";
 import axios from "axios";
 import { toast } from "sonner";
+import { refreshAccessToken } from "@/lib/auth";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -61,6 +62,7 @@ export function useSessionTimeout({ onTimeout }) {
   const handleSessionExpired = useCallback(() => {
     toast.error("Your session has expired. Please log in again.");
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('username');
     localStorage.removeItem('login_time');
     localStorage.removeItem('session_timeout');
@@ -69,12 +71,22 @@ export function useSessionTimeout({ onTimeout }) {
     }
   }, [onTimeout]);
 
-  const refreshSession = useCallback(() => {
+  const refreshSession = useCallback(async () => {
+    // Rotate the refresh token so the server-side session is extended too
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      try {
+        await refreshAccessToken();
+      } catch (error) {
+        handleSessionExpired();
+        return;
+      }
+    }
     // Reset login time
     localStorage.setItem('login_time', Date.now().toString());
     setShowWarning(false);
     toast.success("Session refreshed");
-  }, []);
+  }, [handleSessionExpired]);
 
   return {
     showWarning,
@@ -0,0 +1,77 @@
+import axios from "axios";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Access tokens are short-lived; renew them with the refresh token on 401.
+// Concurrent failures share one in-flight refresh so the token rotates once.
+// Tabs share the tokens in localStorage, so a refresh also holds a cross-tab
+// lock and is skipped if another tab rotated the token while this one waited.
+let refreshPromise = null;
+
+const rotate = (seenRefreshToken) => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) {
+    return Promise.reject(new Error("No refresh token"));
+  }
+  if (refreshToken !== seenRefreshToken) {
+    return Promise.resolve(localStorage.getItem('token'));
+  }
+  return axios
+    .post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+    .then((response) => {
+      localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
+      return response.data.access_token;
+    });
+};
+
+export const refreshAccessToken = () => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) {
+    return Promise.reject(new Error("No refresh token"));
+  }
+  if (!refreshPromise) {
+    const run = () => rotate(refreshToken);
+    // Web Locks only exist in secure contexts; over plain HTTP two tabs can
+    // still race, and the backend rejects the loser without ending the session
+    refreshPromise = (navigator.locks ? navigator.locks.request('auth-refresh', run) : run())
+      .catch((error) => {
+        const stored = localStorage.getItem('refresh_token');
+        if (stored && stored !== refreshToken) {
+          return localStorage.getItem('token');  // another tab won the race
+        }
+        throw error;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
+export const installAuthInterceptor = () => {
+  axios.interceptors.response.use(
+    (response) => response,
+    async (error) => {
+      const original = error.config;
+      if (
+        error.response?.status === 401 &&
+        original &&
+        !original._retried &&
+        !original.url?.includes('/auth/refresh') &&
+        !original.url?.includes('/auth/login')
+      ) {
+        original._retried = true;
+        try {
+          const token = await refreshAccessToken();
+          original.headers = { ...original.headers, Authorization: `Bearer ${token}` };
+          return axios(original);
+        } catch (refreshError) {
+          return Promise.reject(error);
+        }
+      }
+      return Promise.reject(error);
+    }
+  );
+};
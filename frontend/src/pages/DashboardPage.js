@@ -36,32 +36,24 @@ export default function DashboardPage({ onLogout }) {
     headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
   });
 
-  const fetchServers = async () => {
+  const fetchDashboard = async () => {
     try {
-      const response = await axios.get(`${API}/servers`, getAuthHeader());
-      setServers(response.data);
+      const response = await axios.get(`${API}/dashboard`, getAuthHeader());
+      setServers(response.data.servers);
+      setResources(response.data.resources);
     } catch (error) {
       if (error.response?.status === 401) {
         toast.error("Session expired. Please login again.");
         onLogout();
       } else {
-        toast.error("Failed to fetch servers");
+        toast.error("Failed to fetch dashboard");
       }
     }
   };
 
-  const fetchResources = async () => {
-    try {
-      const response = await axios.get(`${API}/system/resources`, getAuthHeader());
-      setResources(response.data);
-    } catch (error) {
-      console.error("Failed to fetch resources", error);
-    }
-  };
-
   useEffect(() => {
     const init = async () => {
-      await Promise.all([fetchServers(), fetchResources()]);
+      await fetchDashboard();
       setLoading(false);
     };
     init();
@@ -72,13 +64,13 @@ export default function DashboardPage({ onLogout }) {
       setShowOnboarding(true);
     }
 
-    // Refresh resources every 5 seconds
-    const interval = setInterval(fetchResources, 5000);
+    // Refresh servers and resources every 5 seconds
+    const interval = setInterval(fetchDashboard, 5000);
     return () => clearInterval(interval);
   }, []);
 
   const handleRefresh = async () => {
-    await Promise.all([fetchServers(), fetchResources()]);
+    await fetchDashboard();
     toast.success("Dashboard refreshed");
   };
 
@@ -86,7 +78,7 @@ export default function DashboardPage({ onLogout }) {
     try {
       await axios.post(`${API}/servers/${serverId}/${action}`, {}, getAuthHeader());
       toast.success(`Server ${action} successful`);
-      await fetchServers();
+      await fetchDashboard();
     } catch (error) {
       toast.error(`Failed to ${action} server`);
     }
@@ -97,7 +89,7 @@ export default function DashboardPage({ onLogout }) {
       await axios.post(`${API}/servers`, serverData, getAuthHeader());
       toast.success("Server added successfully");
       setShowAddModal(false);
-      await fetchServers();
+      await fetchDashboard();
     } catch (error) {
       toast.error(error.response?.data?.detail || "Failed to add server");
     }
@@ -107,7 +99,7 @@ export default function DashboardPage({ onLogout }) {
     try {
       await axios.delete(`${API}/servers/${serverId}`, getAuthHeader());
       toast.success("Server deleted successfully");
-      await fetchServers();
+      await fetchDashboard();
     } catch (error) {
       toast.error("Failed to delete server");
     }
@@ -333,7 +325,10 @@ export default function DashboardPage({ onLogout }) {
       )}
 
       {showSubAdminManagement && (
-        <SubAdminManagementModal onClose={() => setShowSubAdminManagement(false)} />
+        <SubAdminManagementModal
+          servers={servers}
+          onClose={() => setShowSubAdminManagement(false)}
+        />
       )}
 
       {showResourceManagement && selectedServerForResources && (
@@ -343,10 +338,7 @@ export default function DashboardPage({ onLogout }) {
             setShowResourceManagement(false);
             setSelectedServerForResources(null);
           }}
-          onUpdate={() => {
-            fetchServers();
-            fetchResources();
-          }}
+          onUpdate={fetchDashboard}
         />
       )}
 
@@ -89,7 +89,8 @@ export default function FirstTimeSetupPage({ onComplete }) {
         response.data.access_token, 
         response.data.username,
         response.data.requires_totp_setup || false,
-        response.data.session_timeout_minutes || 60
+        response.data.session_timeout_minutes || 60,
+        response.data.refresh_token
       );
     } catch (error) {
       toast.error(error.response?.data?.detail || "Setup failed");
@@ -40,7 +40,8 @@ export default function LoginPage({ onLogin, onForgotPassword }) {
         response.data.access_token, 
         response.data.username,
         response.data.requires_totp_setup,
-        response.data.session_timeout_minutes
+        response.data.session_timeout_minutes,
+        response.data.refresh_token
       );
     } catch (error) {
       const errorMsg = error.response?.data?.detail || "Authentication failed";
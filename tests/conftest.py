@@ -0,0 +1,79 @@
+"""
+Shared fixtures. Everything runs on the embedded SQLite backend, so the
+suite needs no MongoDB or other external service.
+
+The panel reads its settings at import time, so they are set here, before
+any test imports `server`.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+_scratch = Path(tempfile.mkdtemp(prefix="panel-tests-"))
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": str(_scratch / "panel.db"),
+    "DB_NAME": "tests",
+    "BCRYPT_ROUNDS": "4",
+    "CONTENT_STORE_DIR": str(_scratch / "content"),
+    "STEAMCMD_DIR": str(_scratch / "steamcmd"),
+    "PLACEMENT_CPU_OVERCOMMIT": "100",
+    "PLACEMENT_RAM_RESERVE_GB": "-1000",
+})
+
+from db_indexes import ensure_indexes  # noqa: E402
+from storage.sqlite import SQLiteClient  # noqa: E402
+
+ADMIN = {"username": "admin1", "password": "Passw0rd!x"}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(tmp_path):
+    """A fresh SQLite database with the panel's indexes"""
+    client = SQLiteClient(str(tmp_path / "test.db"))
+    database = client["tests"]
+    await ensure_indexes(database)
+    yield database
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def api():
+    """TestClient against the panel app, with the admin account set up"""
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as client:
+        response = client.post("/api/auth/first-time-setup", json={**ADMIN, "security_questions": {"q": "a"}})
+        assert response.status_code == 200, response.text
+        client.admin_tokens = response.json()
+        yield client
+
+
+@pytest.fixture
+def login(api):
+    """Call to open a new admin session; returns its tokens"""
+    def open_session():
+        response = api.post("/api/auth/login", json=ADMIN)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return open_session
+
+
+@pytest.fixture
+def auth(login):
+    """Authorization header of a fresh admin session"""
+    return {"Authorization": f"Bearer {login()['access_token']}"}
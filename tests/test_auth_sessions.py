@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "REFRESH_REUSE_GRACE_SECONDS", 0)
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_rotates_the_token(api, login):
+    tokens = login()
+    response = api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert api.get("/api/servers", headers=bearer(rotated)).status_code == 200
+    # The new refresh token rotates again
+    response = api.post("/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 200
+
+
+def test_replayed_refresh_token_revokes_the_session(api, login, no_grace):
+    tokens = login()
+    rotated = api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    replay = api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replay.status_code == 401
+    # The whole session is gone: its access token and its current refresh token
+    assert api.get("/api/servers", headers=bearer(rotated)).status_code == 401
+    assert api.post("/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+
+
+def test_replay_leaves_other_sessions_alone(api, login, no_grace):
+    other = login()
+    tokens = login()
+    api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert api.get("/api/servers", headers=bearer(other)).status_code == 200
+
+
+def test_second_tab_refreshing_at_once_keeps_the_session(api, login):
+    tokens = login()
+    first_tab = api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    # The other tab sent the same token a moment later: rejected, but not treated as a leak
+    second_tab = api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert second_tab.status_code == 401
+    assert api.get("/api/servers", headers=bearer(first_tab)).status_code == 200
+    assert api.post("/api/auth/refresh", json={"refresh_token": first_tab["refresh_token"]}).status_code == 200
+
+
+def test_unknown_refresh_token_is_rejected(api):
+    assert api.post("/api/auth/refresh", json={"refresh_token": "not-a-token"}).status_code == 401
+
+
+def test_logout_revokes_the_access_token(api, login):
+    tokens = login()
+    assert api.post("/api/auth/logout", headers=bearer(tokens)).status_code == 200
+    assert api.get("/api/servers", headers=bearer(tokens)).status_code == 401
+    assert api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+
+def test_revoking_many_sessions_is_not_capped(api):
+    import server
+
+    user_id = "bulk-revoke-user"
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    api.portal.call(server.db.sessions.insert_many, [
+        {"id": f"bulk-{i}", "user_id": user_id, "token_hash": f"bulk-hash-{i}", "revoked": False, "expires_at": expires}
+        for i in range(1200)
+    ])
+
+    assert api.portal.call(server.revoke_sessions, {"user_id": user_id}) == 1200
+    assert all(f"bulk-{i}" in server.revoked_session_ids for i in range(1200))
+    assert api.portal.call(server.db.sessions.count_documents, {"user_id": user_id, "revoked": False}) == 0
@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from starlette.responses import JSONResponse, StreamingResponse
+
+from compression import CompressionMiddleware, choose_encoding
+
+pytestmark = pytest.mark.anyio
+
+GZIP = [(b"accept-encoding", b"gzip")]
+
+
+def http_scope(headers=GZIP):
+    return {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers}
+
+
+async def no_body():
+    # A client that never disconnects
+    await asyncio.Event().wait()
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, br;q=0.5", ["zstd", "br", "gzip"]) == "gzip"
+    assert choose_encoding("*", ["zstd", "gzip"]) == "zstd"
+    assert choose_encoding("gzip;q=0, identity", ["gzip"]) is None
+
+
+async def test_small_bodies_pass_through():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await CompressionMiddleware(JSONResponse({"ok": True}))(http_scope(), no_body, send)
+    headers = dict(sent[0]["headers"])
+    assert b"content-encoding" not in headers
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert json.loads(sent[1]["body"]) == {"ok": True}
+
+
+async def test_large_bodies_are_compressed_with_a_weak_etag():
+    payload = {"rows": ["x" * 64] * 100}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    app = JSONResponse(payload, headers={"ETag": '"v1"'})
+    await CompressionMiddleware(app)(http_scope(), no_body, send)
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"etag"] == b'W/"v1"'
+    assert json.loads(gzip.decompress(sent[1]["body"])) == payload
+
+
+async def test_each_streamed_chunk_reaches_the_client_at_once():
+    lines = asyncio.Queue()
+    received = asyncio.Queue()
+
+    async def events():
+        while (line := await lines.get()) is not None:
+            yield line
+
+    async def send(message):
+        await received.put(message)
+
+    app = StreamingResponse(events(), media_type="application/x-ndjson")
+    handler = asyncio.create_task(CompressionMiddleware(app)(http_scope(), no_body, send))
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    text = b""
+    for n in range(5):
+        line = json.dumps({"n": n}).encode() + b"\n"
+        await lines.put(line)
+        if n == 0:
+            start = await asyncio.wait_for(received.get(), 5)
+            assert dict(start["headers"])[b"content-encoding"] == b"gzip"
+        # The stream is still open, yet the line decodes in full
+        while not text.endswith(line):
+            message = await asyncio.wait_for(received.get(), 5)
+            assert message["more_body"]
+            text += decoder.decompress(message["body"])
+
+    await lines.put(None)
+    await asyncio.wait_for(handler, 5)
+    while not received.empty():
+        text += decoder.decompress((await received.get())["body"])
+    assert decoder.eof
+    assert [json.loads(line)["n"] for line in text.splitlines()] == [0, 1, 2, 3, 4]
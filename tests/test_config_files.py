@@ -0,0 +1,240 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+
+from config_files import (
+    ConfigFiles, PatchConflict, PatchError, VersionMismatch, apply_json_patch, apply_merge_patch, patched_paths,
+)
+
+
+# RFC 6902 appendix A
+@pytest.mark.parametrize("doc, patch, expected", [
+    ({"foo": "bar"}, [{"op": "add", "path": "/baz", "value": "qux"}], {"baz": "qux", "foo": "bar"}),
+    ({"foo": ["bar", "baz"]}, [{"op": "add", "path": "/foo/1", "value": "qux"}], {"foo": ["bar", "qux", "baz"]}),
+    ({"baz": "qux", "foo": "bar"}, [{"op": "remove", "path": "/baz"}], {"foo": "bar"}),
+    ({"foo": ["bar", "qux", "baz"]}, [{"op": "remove", "path": "/foo/1"}], {"foo": ["bar", "baz"]}),
+    ({"baz": "qux", "foo": "bar"}, [{"op": "replace", "path": "/baz", "value": "boo"}], {"baz": "boo", "foo": "bar"}),
+    ({"foo": {"bar": "baz", "waldo": "fred"}, "qux": {"corge": "grault"}},
+     [{"op": "move", "from": "/foo/waldo", "path": "/qux/thud"}],
+     {"foo": {"bar": "baz"}, "qux": {"corge": "grault", "thud": "fred"}}),
+    ({"foo": ["all", "grass", "cows", "eat"]}, [{"op": "move", "from": "/foo/1", "path": "/foo/3"}],
+     {"foo": ["all", "cows", "eat", "grass"]}),
+    ({"foo": "bar"}, [{"op": "add", "path": "/child", "value": {"grandchild": {}}}],
+     {"foo": "bar", "child": {"grandchild": {}}}),
+    ({"foo": ["bar"]}, [{"op": "add", "path": "/foo/-", "value": ["abc", "def"]}], {"foo": ["bar", ["abc", "def"]]}),
+    ({"/": 1, "m~n": 2}, [{"op": "copy", "from": "/m~0n", "path": "/a~1b"}], {"/": 1, "m~n": 2, "a/b": 2}),
+    ({"baz": "qux"}, [{"op": "test", "path": "/baz", "value": "qux"}], {"baz": "qux"}),
+])
+def test_json_patch(doc, patch, expected):
+    assert apply_json_patch(doc, patch) == expected
+
+
+@pytest.mark.parametrize("patch", [
+    [{"op": "add", "path": "/baz/bat", "value": "qux"}],  # parent missing
+    [{"op": "remove", "path": "/missing"}],
+    [{"op": "replace", "path": "/missing", "value": 1}],
+    [{"op": "add", "path": "/list/5", "value": 1}],
+    [{"op": "add", "path": "/list/01", "value": 1}],
+    [{"op": "move", "from": "/obj", "path": "/obj/inside"}],
+    [{"op": "frobnicate", "path": "/a"}],
+    [{"op": "add", "path": "no-slash", "value": 1}],
+    [{"op": "add", "path": "/a"}],
+    {"op": "add", "path": "/a", "value": 1},
+])
+def test_invalid_json_patch(patch):
+    with pytest.raises(PatchError):
+        apply_json_patch({"list": [1], "obj": {}}, patch)
+
+
+def test_failed_test_op_is_a_conflict():
+    with pytest.raises(PatchConflict):
+        apply_json_patch({"baz": "qux"}, [{"op": "test", "path": "/baz", "value": "bar"}])
+
+
+# RFC 7396 appendix A
+@pytest.mark.parametrize("target, patch, expected", [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    (["a", "b"], ["c", "d"], ["c", "d"]),
+    ({"a": "b"}, ["c"], ["c"]),
+    ({"a": "foo"}, None, None),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+])
+def test_merge_patch(target, patch, expected):
+    assert apply_merge_patch(target, patch) == expected
+
+
+def test_patched_paths():
+    assert patched_paths("merge", {"game": {}, "mods": None}) == {"game", "mods"}
+    ops = [{"op": "move", "from": "/mods/0", "path": "/game/x"}, {"op": "replace", "path": "", "value": {}}]
+    assert patched_paths("json-patch", ops) == {"mods", "game", ""}
+
+
+@pytest.fixture
+def server_json(tmp_path):
+    path = tmp_path / "configs" / "server.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps({"game": {"name": "a"}, "mods": []}))
+    return path
+
+
+def test_reads_are_cached_until_the_file_changes(server_json):
+    files = ConfigFiles()
+    text, version = files.read(server_json)
+    assert files.read(server_json) == (text, version)
+    assert (files.stats["hits"], files.stats["misses"]) == (1, 1)
+
+    server_json.write_text(json.dumps({"game": {"name": "edited outside"}}))
+    config, new_version = files.read_json(server_json)
+    assert config["game"]["name"] == "edited outside"
+    assert new_version != version
+
+
+def test_read_json_returns_a_copy(server_json):
+    files = ConfigFiles()
+    config, _ = files.read_json(server_json)
+    config["game"]["name"] = "scribbled"
+    assert files.read_json(server_json)[0]["game"]["name"] == "a"
+
+
+def test_missing_file_reads_as_none(tmp_path):
+    assert ConfigFiles().read(tmp_path / "nope.json") == (None, None)
+
+
+def test_writes_honour_if_match(server_json):
+    files = ConfigFiles()
+    _, version = files.read(server_json)
+    new_version = files.write(server_json, "{}", if_match=version)
+    assert new_version != version
+    with pytest.raises(VersionMismatch) as raised:
+        files.write(server_json, "{}", if_match=version)
+    assert raised.value.current == new_version
+    assert files.stats["conflicts"] == 1
+    # Without If-Match the write is unconditional; "*" only needs the file to exist
+    files.write(server_json, "[]")
+    files.write(server_json, "{}", if_match="*")
+    # A weakened tag (W/"...") names the same version
+    files.write(server_json, "[]", if_match="W/" + files.read(server_json)[1])
+    with pytest.raises(VersionMismatch):
+        files.write(server_json.with_name("other.json"), "{}", if_match="*")
+
+
+def test_version_changes_even_with_identical_size_and_mtime(server_json):
+    files = ConfigFiles()
+    first = files.write(server_json, '{"a": 1}')
+    mtime_ns = server_json.stat().st_mtime_ns
+    files.write(server_json, '{"a": 2}')
+    os.utime(server_json, ns=(mtime_ns, mtime_ns))
+    # Same size and mtime as the first write, but the rename gave the file a new inode
+    text, version = files.read(server_json)
+    assert version != first
+    assert text == '{"a": 2}'
+
+
+def test_update_json_applies_the_change_atomically(server_json):
+    files = ConfigFiles()
+    _, version = files.read(server_json)
+    config, new_version = files.update_json(
+        server_json, lambda doc: apply_merge_patch(doc, {"game": {"maxPlayers": 32}}), if_match=version
+    )
+    assert config == {"game": {"name": "a", "maxPlayers": 32}, "mods": []}
+    assert json.loads(server_json.read_text()) == config
+    assert files.read(server_json)[1] == new_version
+    assert not [p for p in server_json.parent.iterdir() if p.name.endswith(".tmp")]
+
+    with pytest.raises(VersionMismatch):
+        files.update_json(server_json, lambda doc: doc, if_match=version)
+
+
+def test_failed_patch_leaves_the_file_untouched(server_json):
+    files = ConfigFiles()
+    before = server_json.read_text()
+    with pytest.raises(PatchError):
+        files.update_json(server_json, lambda doc: apply_json_patch(doc, [{"op": "remove", "path": "/nope"}]))
+    assert server_json.read_text() == before
+
+
+def test_config_of_an_unknown_server_is_never_read(api, auth):
+    import server
+
+    stray = Path("/tmp/arma_servers") / str(uuid.uuid4()) / "server.cfg"
+    stray.parent.mkdir(parents=True)
+    try:
+        stray.write_text("secret")
+        assert api.get(f"/api/servers/{stray.parent.name}/config", headers=auth).status_code == 404
+        assert api.get("/api/servers/%2e%2e/config", headers=auth).status_code == 404
+        # Not even read into the cache
+        assert str(stray) not in server.config_files.entries
+    finally:
+        stray.unlink()
+        stray.parent.rmdir()
+
+
+def test_config_api_round_trip(api, auth, tmp_path):
+    install = tmp_path / "install"
+    install.mkdir()
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "cfg", "game_type": "arma_reforger", "max_players": 8, "install_path": str(install), "node_id": "local",
+    }).json()
+    base = f"/api/servers/{server['id']}/config"
+
+    loaded = api.get(base, headers=auth)
+    assert "hostname" in loaded.json()["content"]
+    saved = api.put(base, headers={**auth, "If-Match": loaded.headers["etag"]}, json={"content": "x = 1;"})
+    assert saved.status_code == 200
+    stale = api.put(base, headers={**auth, "If-Match": loaded.headers["etag"]}, json={"content": "x = 2;"})
+    assert stale.status_code == 412
+    assert api.get(base, headers=auth).json()["content"] == "x = 1;"
+
+    current = api.get(f"{base}/json", headers=auth)
+    assert current.json()["mods"] == []
+    merged = api.patch(f"{base}/json", headers={**auth, "If-Match": current.headers["etag"]},
+                       json={"game": {"name": "patched"}})
+    assert merged.status_code == 200 and merged.json()["game"]["name"] == "patched"
+    assert api.patch(f"{base}/json", headers={**auth, "If-Match": current.headers["etag"]},
+                     json={"game": {"name": "stale"}}).status_code == 412
+
+    ops = [{"op": "test", "path": "/game/name", "value": "other"}, {"op": "remove", "path": "/game"}]
+    patch_headers = {**auth, "Content-Type": "application/json-patch+json"}
+    assert api.patch(f"{base}/json", headers=patch_headers, content=json.dumps(ops)).status_code == 409
+    assert api.patch(f"{base}/json", headers=auth, json={"mods": []}).status_code == 422
+    assert json.loads((install / "configs" / "server.json").read_text())["game"]["name"] == "patched"
+
+
+def test_weak_if_match_from_the_compression_middleware(api, auth, tmp_path):
+    install = tmp_path / "install"
+    install.mkdir()
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "gz", "game_type": "arma_reforger", "max_players": 8, "install_path": str(install), "node_id": "local",
+    }).json()
+    base = f"/api/servers/{server['id']}/config"
+    gzip_auth = {**auth, "Accept-Encoding": "gzip"}
+    big = "// " + "x" * 2048 + "\n"
+    assert api.put(base, headers=auth, json={"content": big}).status_code == 200
+
+    loaded = api.get(base, headers=gzip_auth)
+    assert loaded.headers["content-encoding"] == "gzip"
+    assert loaded.headers["etag"].startswith('W/"')
+    saved = api.put(base, headers={**gzip_auth, "If-Match": loaded.headers["etag"]}, json={"content": big + "y"})
+    assert saved.status_code == 200
+    # The weakened tag of an old version is still stale
+    assert api.put(base, headers={**gzip_auth, "If-Match": loaded.headers["etag"]},
+                   json={"content": "z"}).status_code == 412
+
+    api.patch(f"{base}/json", headers=auth, json={"game": {"motd": "x" * 2048}})
+    current = api.get(f"{base}/json", headers=gzip_auth)
+    assert current.headers["etag"].startswith('W/"')
+    patched = api.patch(f"{base}/json", headers={**gzip_auth, "If-Match": current.headers["etag"]},
+                        json={"game": {"name": "weak"}})
+    assert patched.status_code == 200
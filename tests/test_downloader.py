@@ -0,0 +1,110 @@
+import hashlib
+import io
+import socket
+import tarfile
+
+import pytest
+
+import downloader
+from benchmarks.bench_downloader import build_archive, serve, tree_digest
+from downloader import DownloadError, Downloader, install_tree
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(scope="module")
+def archive():
+    return build_archive(2)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(downloader, "RETRY_BACKOFF_SECONDS", (0,))
+
+
+@pytest.fixture
+def standin(archive):
+    """Start the benchmark's local HTTP stand-in; returns its URL"""
+    servers = []
+
+    def start(drop_every=0, ignore_range=False):
+        server = serve(archive, drop_every, ignore_range)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/steamcmd_linux.tar.gz"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def expected_tree(archive, tmp_path):
+    target = tmp_path / "expected"
+    tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz").extractall(target, filter="data")
+    return tree_digest(target)
+
+
+async def test_clean_download_extracts_and_verifies(archive, standin, expected_tree, tmp_path):
+    sha256 = hashlib.sha256(archive).hexdigest()
+    result = await Downloader().fetch_tar_gz(standin(), tmp_path / "staging", expected_sha256=sha256)
+    assert (result["bytes"], result["sha256"], result["resumes"]) == (len(archive), sha256, 0)
+    assert tree_digest(tmp_path / "staging") == expected_tree
+
+    install_tree(tmp_path / "staging", tmp_path / "steamcmd")
+    assert (tmp_path / "steamcmd" / "steamcmd.sh").exists()
+    assert not (tmp_path / "staging").exists()
+
+
+async def test_dropped_connections_resume_with_range(archive, standin, expected_tree, tmp_path):
+    sha256 = hashlib.sha256(archive).hexdigest()
+    fetcher = Downloader(retries=3)
+    result = await fetcher.fetch_tar_gz(standin(drop_every=300_000), tmp_path / "staging", expected_sha256=sha256)
+    assert result["resumes"] >= len(archive) // 300_000
+    assert result["sha256"] == sha256
+    assert tree_digest(tmp_path / "staging") == expected_tree
+    assert fetcher.stats["range_ignored"] == 0
+
+
+async def test_ignored_range_skips_bytes_already_received(archive, standin, expected_tree, tmp_path):
+    sha256 = hashlib.sha256(archive).hexdigest()
+    fetcher = Downloader(retries=3)
+    url = standin(drop_every=300_000, ignore_range=True)
+    result = await fetcher.fetch_tar_gz(url, tmp_path / "staging", expected_sha256=sha256)
+    assert result["bytes"] == len(archive)
+    assert fetcher.stats["range_ignored"] == result["resumes"] > 0
+    assert tree_digest(tmp_path / "staging") == expected_tree
+
+
+async def test_checksum_mismatch_fails_and_cleans_up(standin, tmp_path):
+    fetcher = Downloader()
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        await fetcher.fetch_tar_gz(standin(), tmp_path / "staging", expected_sha256="0" * 64)
+    assert not (tmp_path / "staging").exists()
+    assert fetcher.stats["checksum_failures"] == 1
+    assert fetcher.stats["failed"] == 1
+
+
+async def test_fetch_feeds_every_byte_once(archive, standin):
+    received = bytearray()
+
+    async def consume(chunk):
+        received.extend(chunk)
+
+    seen = []
+
+    async def progress(done, total):
+        seen.append((done, total))
+
+    await Downloader(retries=3).fetch(standin(drop_every=500_000, ignore_range=True), consume, progress=progress)
+    assert bytes(received) == archive
+    assert seen[-1] == (len(archive), len(archive))
+
+
+async def test_retries_are_bounded(tmp_path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]  # nothing listens here once closed
+    with pytest.raises(DownloadError, match="after 2 retries"):
+        await Downloader(retries=2).fetch_tar_gz(f"http://127.0.0.1:{port}/x.tar.gz", tmp_path / "staging")
+    assert not (tmp_path / "staging").exists()
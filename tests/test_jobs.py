@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from jobs import JobError, JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue(db):
+    queue = JobQueue(db, concurrency=2, poll_interval=0.05)
+    runner = asyncio.create_task(queue.run())
+    yield queue
+    runner.cancel()
+    for task in list(queue.running.values()):
+        task.cancel()
+    await asyncio.gather(runner, *queue.running.values(), return_exceptions=True)
+
+
+async def settled(queue, job_id, timeout=5.0):
+    async with asyncio.timeout(timeout):
+        while True:
+            job = await queue.get(job_id)
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                return job
+            await asyncio.sleep(0.02)
+
+
+async def test_job_runs_and_reports_progress(queue):
+    async def handler(ctx):
+        await ctx.progress(0.5, "halfway")
+        return {"echo": ctx.params["value"]}
+
+    queue.register("echo", handler)
+    job = await queue.submit("echo", {"value": 7}, user_id="u1")
+    assert job["status"] == "queued"
+
+    done = await settled(queue, job["id"])
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"echo": 7}
+    assert done["progress"]["fraction"] == 1.0
+    events = [event async for event in queue.watch(job["id"])]
+    assert [event.get("status") for event in events if event.get("status")] == ["queued", "running", "succeeded"]
+    assert {"fraction": 0.5, "message": "halfway"} in [event.get("progress") for event in events]
+
+
+async def test_job_errors_become_failed_jobs(queue):
+    async def handler(ctx):
+        raise JobError("SteamCMD is not installed")
+
+    queue.register("broken", handler)
+    job = await queue.submit("broken", {}, user_id="u1")
+    done = await settled(queue, job["id"])
+    assert (done["status"], done["error"]) == ("failed", "SteamCMD is not installed")
+
+
+async def test_keyed_jobs_are_deduplicated_while_active(queue):
+    release = asyncio.Event()
+
+    async def handler(ctx):
+        await release.wait()
+        return {}
+
+    queue.register("install", handler)
+    first = await queue.submit("install", {}, user_id="u1", key="install:a")
+    again = await queue.submit("install", {}, user_id="u1", key="install:a")
+    assert again["id"] == first["id"]
+    assert queue.stats["deduplicated"] == 1
+
+    release.set()
+    await settled(queue, first["id"])
+    # Once finished, the key is free for a new job
+    later = await queue.submit("install", {}, user_id="u1", key="install:a")
+    assert later["id"] != first["id"]
+
+
+async def test_cancelling_a_running_job_stops_its_handler(queue):
+    started, cleaned_up = asyncio.Event(), asyncio.Event()
+
+    async def handler(ctx):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        finally:
+            cleaned_up.set()
+
+    queue.register("slow", handler)
+    job = await queue.submit("slow", {}, user_id="u1")
+    await asyncio.wait_for(started.wait(), 5)
+    await queue.cancel(job["id"], "u1")
+    done = await settled(queue, job["id"])
+    assert done["status"] == "cancelled"
+    assert cleaned_up.is_set()
+
+
+async def test_cancelling_a_queued_job_settles_it_at_once(db):
+    queue = JobQueue(db)  # not running, so the job stays queued
+    queue.register("echo", lambda ctx: None)
+    job = await queue.submit("echo", {}, user_id="u1", key="echo")
+    cancelled = await queue.cancel(job["id"], "u1")
+    assert cancelled["status"] == "cancelled"
+    assert (await queue.submit("echo", {}, user_id="u1", key="echo"))["id"] != job["id"]
+
+
+async def test_jobs_belong_to_their_user(queue):
+    queue.register("echo", lambda ctx: None)
+    job = await queue.submit("echo", {}, user_id="u1")
+    with pytest.raises(HTTPException) as raised:
+        await queue.get(job["id"], user_id="someone-else")
+    assert raised.value.status_code == 404
+
+
+async def test_concurrency_limits_running_jobs(queue):
+    running, peak = 0, 0
+    release = asyncio.Event()
+
+    async def handler(ctx):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+        return {}
+
+    queue.register("work", handler)
+    jobs = [await queue.submit("work", {}, user_id="u1") for _ in range(5)]
+    await asyncio.sleep(0.3)
+    assert peak == 2
+    release.set()
+    for job in jobs:
+        assert (await settled(queue, job["id"]))["status"] == "succeeded"
@@ -0,0 +1,21 @@
+from metrics import MetricsSampler, render
+from request_metrics import RequestMetrics
+
+
+def status_samples(servers):
+    sampler = MetricsSampler()
+    sampler.servers = servers
+    text = render(sampler, RequestMetrics(), {}, {})
+    return {line for line in text.splitlines() if line.startswith("panel_server_status{")}
+
+
+def test_queued_servers_are_reported_as_queued():
+    samples = status_samples([{"id": "q", "status": "queued"}])
+    assert 'panel_server_status{server_id="q",status="queued"} 1' in samples
+    assert 'panel_server_status{server_id="q",status="offline"} 0' in samples
+
+
+def test_unknown_statuses_still_get_a_series():
+    samples = status_samples([{"id": "x", "status": "installing"}])
+    assert 'panel_server_status{server_id="x",status="installing"} 1' in samples
+    assert sum(line.endswith(" 1") for line in samples) == 1
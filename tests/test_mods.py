@@ -0,0 +1,28 @@
+import os
+
+
+def test_deleting_a_mod_unlinks_it_once_unused(api, auth, tmp_path):
+    install = tmp_path / "install"
+    (install / "mods").mkdir(parents=True)
+    cached = tmp_path / "cache" / "ABC123"
+    cached.mkdir(parents=True)
+    link = install / "mods" / "ABC123"
+    os.symlink(cached, link)
+
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "mods", "game_type": "arma_reforger", "max_players": 8, "install_path": str(install),
+    }).json()
+    base = f"/api/servers/{server['id']}/mods"
+    first, second = (
+        api.post(base, headers=auth, json={"workshop_id": "ABC123", "name": "Twice"}).json() for _ in range(2)
+    )
+
+    assert api.delete(f"{base}/{first['id']}", headers=auth).status_code == 200
+    assert link.is_symlink()  # the other entry still uses it
+    assert api.delete(f"{base}/{second['id']}", headers=auth).status_code == 200
+    assert not os.path.lexists(link)
+    assert cached.is_dir()  # the cache itself is left for eviction
+
+    assert api.delete(f"{base}/{second['id']}", headers=auth).status_code == 404
+    assert api.delete(f"/api/servers/not-a-server/mods/{first['id']}", headers=auth).status_code == 404
+    api.delete(f"/api/servers/{server['id']}", headers=auth)
@@ -0,0 +1,43 @@
+import asyncio
+import subprocess
+
+import pytest
+
+import node_agent
+from node_client import LOOPBACK_URL, NodeClient
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def loopback():
+    client = NodeClient({"id": "n1", "name": "loopback", "url": LOOPBACK_URL, "token": "t"})
+    yield client
+    await client.close()
+
+
+async def test_loopback_node_reaps_exited_servers(loopback):
+    # No ASGI startup event runs in-process, so the client starts the reaper
+    assert node_agent._reaper is not None and not node_agent._reaper.done()
+    process = subprocess.Popen(["true"])
+    node_agent.processes.track(process)
+    await asyncio.sleep(node_agent.REAP_INTERVAL_SECONDS * 2)
+    assert process.pid not in node_agent.processes.children
+
+
+async def test_loopback_log_follow_is_not_buffered(loopback, tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    log_file = logs / "server_20260101_000000.log"
+    log_file.write_text("first\n")
+    server = {"id": "s1", "install_path": str(tmp_path)}
+
+    chunks = loopback.follow_logs(server, 10, timeout=30)
+    assert await asyncio.wait_for(anext(chunks), 5) == b"first\n"
+    following = asyncio.create_task(anext(chunks))
+    await asyncio.sleep(0.2)  # now at the end of the file, waiting for more
+    with open(log_file, "a") as f:
+        f.write("second\n")
+    # Arrives while the follow still has most of its 30s to run
+    assert await asyncio.wait_for(following, 5) == b"second\n"
+    await chunks.aclose()
@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from placement import GB, Placement
+from ports import PortAllocator
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def placement(db):
+    placement = Placement(db, cpu_overcommit=1.0, ram_reserve_gb=0)
+    await placement.register_host("local", "panel", 4, 8 * GB)
+    await placement.register_host("node-a", "big box", 8, 16 * GB)
+    return placement
+
+
+async def host(placement, host_id):
+    return next(h for h in await placement.hosts() if h["id"] == host_id)
+
+
+async def test_best_fit_prefers_the_fullest_host_that_fits(placement):
+    assert await placement.place(2, 2) == "local"
+    # 2 CPU left on the panel host, so 3 only fits on the node
+    assert await placement.place(3, 2) == "node-a"
+    local = await host(placement, "local")
+    assert (local["cpu_free"], local["ram_free_gb"], local["servers"]) == (2, 6, 1)
+
+
+async def test_reservations_never_oversubscribe(placement):
+    await placement.set_schedulable("node-a", False)
+    placed = await asyncio.gather(*(placement.place(1, 1) for _ in range(10)))
+    assert placed.count("local") == 4
+    assert placed.count(None) == 6
+    assert (await host(placement, "local"))["cpu_free"] == 0
+
+
+async def test_place_server_rejects_or_queues_when_nothing_fits(placement):
+    with pytest.raises(HTTPException) as raised:
+        await placement.place_server({"cpu_cores": 64, "ram_gb": 1})
+    assert raised.value.status_code == 409
+
+    server = await placement.place_server({"cpu_cores": 64, "ram_gb": 1}, queue=True)
+    assert server["status"] == "queued"
+    assert placement.stats["queued"] == 1
+
+
+async def test_drain_queue_places_servers_once_room_frees_up(placement, db):
+    await placement.set_schedulable("node-a", False)
+    running = {"id": "a", "node_id": None, "cpu_cores": 3, "ram_gb": 1, "status": "offline", "created_at": 1}
+    assert await placement.place(3, 1) == "local"
+    await db.servers.insert_one(dict(running))
+    await db.servers.insert_one({"id": "q", "cpu_cores": 2, "ram_gb": 1, "status": "queued", "created_at": 2})
+
+    assert await placement.drain_queue() == []
+    await db.servers.delete_one({"id": "a"})
+    await placement.release(running)
+
+    placed = await placement.drain_queue()
+    assert [server["id"] for server in placed] == ["q"]
+    queued = await db.servers.find_one({"id": "q"}, {"_id": 0})
+    assert queued["status"] == "offline" and queued["node_id"] is None
+    local = await host(placement, "local")
+    assert (local["cpu_allocated"], local["servers"]) == (2, 1)
+    # Nothing left to place; a second drain must not reserve it again
+    assert await placement.drain_queue() == []
+    assert (await host(placement, "local"))["cpu_allocated"] == 2
+
+
+async def test_resize_grows_only_within_the_host(placement):
+    server = {"node_id": None, "cpu_cores": 2, "ram_gb": 2, "status": "offline"}
+    assert await placement.place(2, 2) == "local"
+    assert not await placement.resize(server, 8, 2)
+    assert await placement.resize(server, 4, 8)
+    local = await host(placement, "local")
+    assert (local["cpu_free"], local["ram_free_gb"], local["servers"]) == (0, 0, 1)
+
+
+async def test_recount_rebuilds_totals_from_servers(placement, db):
+    await db.servers.insert_many([
+        {"id": "a", "node_id": "node-a", "cpu_cores": 2, "ram_gb": 4, "status": "offline"},
+        {"id": "q", "node_id": "node-a", "cpu_cores": 8, "ram_gb": 8, "status": "queued"},
+    ])
+    hosts = {h["id"]: h for h in await placement.recount()}
+    assert (hosts["node-a"]["cpu_allocated"], hosts["node-a"]["ram_free_gb"], hosts["node-a"]["servers"]) == (2, 12, 1)
+    assert hosts["local"]["servers"] == 0
+
+
+@pytest.fixture
+def ports(db):
+    return PortAllocator(db, range_start=3000, range_end=3040)
+
+
+async def test_reserve_claims_game_and_a2s_ports(ports):
+    await ports.reserve("local", "a", 3000)
+    assert [(row["port"], row["kind"]) for row in await ports.allocations("local")] == [(3000, "game"), (3016, "a2s")]
+
+    # Another server's game port on our A2S port
+    with pytest.raises(HTTPException) as raised:
+        await ports.reserve("local", "b", 3016)
+    assert raised.value.status_code == 409
+    # A failed reservation leaves nothing behind
+    assert {row["server_id"] for row in await ports.allocations("local")} == {"a"}
+
+    # Ports are per host
+    await ports.reserve("node-a", "b", 3000)
+
+
+async def test_reserve_rejects_ports_bound_by_other_programs(ports):
+    with pytest.raises(HTTPException) as raised:
+        await ports.reserve("local", "a", 3000, bound=frozenset({3016}))
+    assert "bound by another program" in raised.value.detail
+    assert await ports.allocations("local") == []
+
+
+async def test_reserve_rejects_ports_out_of_range(ports):
+    with pytest.raises(HTTPException) as raised:
+        await ports.reserve("local", "a", 65530)
+    assert raised.value.status_code == 400
+
+
+async def test_moving_a_server_releases_its_old_ports(ports):
+    await ports.reserve("local", "a", 3000)
+    await ports.reserve("local", "a", 3002)
+    assert [row["port"] for row in await ports.allocations("local")] == [3002, 3018]
+    # Moving onto its own old A2S port is allowed
+    await ports.reserve("local", "a", 3018)
+    assert [(row["port"], row["kind"]) for row in await ports.allocations("local")] == [(3018, "game"), (3034, "a2s")]
+
+
+async def test_allocate_skips_taken_and_bound_ports(ports):
+    await ports.reserve("local", "a", 3000)
+    assert await ports.allocate("local", "b", bound=frozenset({3001})) == 3002
+    assert await ports.allocate("local", "c") == 3003
+    await ports.release("a")
+    assert await ports.allocate("local", "d") == 3004  # the cursor moves on before wrapping
+    assert {row["server_id"] for row in await ports.allocations("local")} == {"b", "c", "d"}
+
+
+async def test_allocate_fails_when_the_range_is_full(db):
+    ports = PortAllocator(db, range_start=3000, range_end=3001)
+    await ports.allocate("local", "a")
+    await ports.allocate("local", "b")
+    with pytest.raises(HTTPException) as raised:
+        await ports.allocate("local", "c")
+    assert raised.value.status_code == 409
+
+
+def test_status_cannot_be_patched_around_placement(api, auth):
+    def allocated():
+        hosts = api.get("/api/placement", headers=auth).json()["hosts"]
+        local = next(h for h in hosts if h["id"] == "local")
+        return local["cpu_allocated"], local["ram_allocated_gb"], local["servers"]
+
+    before = allocated()
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "placed", "game_type": "arma_reforger", "max_players": 8,
+        "install_path": "/tmp/placed", "cpu_cores": 1, "ram_gb": 1, "node_id": "local",
+    }).json()
+    api.patch(f"/api/servers/{server['id']}", headers=auth, json={"status": "queued"})
+    assert api.get(f"/api/servers/{server['id']}", headers=auth).json()["status"] == "offline"
+    assert allocated() == (before[0] + 1, before[1] + 1, before[2] + 1)
+
+    api.delete(f"/api/servers/{server['id']}", headers=auth)
+    assert allocated() == before
+
+
+def test_queued_servers_cannot_be_started_or_restarted(api, auth):
+    import server as panel
+
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "waiting", "game_type": "arma_reforger", "max_players": 8,
+        "install_path": "/tmp/waiting", "node_id": "local",
+    }).json()
+    # As if placement had found no room for it
+    api.portal.call(panel.db.servers.update_one, {"id": server["id"]}, {"$set": {"status": "queued"}})
+    for action in ("start", "restart"):
+        response = api.post(f"/api/servers/{server['id']}/{action}", headers=auth)
+        assert response.status_code == 409, response.text
+    # Still queued, so drain_queue can place it
+    assert api.get(f"/api/servers/{server['id']}", headers=auth).json()["status"] == "queued"
+    api.portal.call(panel.db.servers.update_one, {"id": server["id"]}, {"$set": {"status": "offline"}})
+    api.delete(f"/api/servers/{server['id']}", headers=auth)
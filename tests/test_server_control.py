@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def local_server(api, auth, tmp_path):
+    """A server on this host whose "game" is a shell script that sleeps"""
+    install = tmp_path / "install"
+    install.mkdir()
+    executable = install / "ArmaReforgerServer"
+    executable.write_text("#!/bin/sh\necho started\nexec sleep 60\n")
+    executable.chmod(0o755)
+    server = api.post("/api/servers", headers=auth, json={
+        "name": "control", "game_type": "arma_reforger", "max_players": 8, "install_path": str(install),
+    }).json()
+    assert server.get("node_id") is None
+    yield server
+    api.post(f"/api/servers/{server['id']}/stop", headers=auth)
+    api.delete(f"/api/servers/{server['id']}", headers=auth)
+
+
+def test_restart_applies_the_current_mod_list(api, auth, local_server):
+    import server as panel
+
+    server_id = local_server["id"]
+    # A mod enabled while the server ran; only a restart picks it up
+    api.portal.call(panel.db.mods.insert_one, {
+        "id": "mod-1", "server_id": server_id, "workshop_id": "5965550F24A0C152", "name": "Where Am I",
+        "enabled": True, "created_at": datetime.now(timezone.utc),
+    })
+    api.portal.call(panel.db.servers.update_one, {"id": server_id}, {"$set": {"restart_required": True}})
+
+    response = api.post(f"/api/servers/{server_id}/restart", headers=auth)
+    assert response.status_code == 200, response.text
+    config = json.loads((Path(local_server["install_path"]) / "configs" / "server.json").read_text())
+    assert [mod["modId"] for mod in config["mods"]] == ["5965550F24A0C152"]
+    restarted = api.get(f"/api/servers/{server_id}", headers=auth).json()
+    assert restarted["status"] == "online"
+    assert not restarted.get("restart_required")
+
+
+def test_failover_cleanup_reaches_the_caches(api, auth, local_server):
+    import server as panel
+
+    server_id = local_server["id"]
+    # Recorded as running under a process that is gone, as after the leader died
+    api.portal.call(panel.db.servers.update_one, {"id": server_id},
+                    {"$set": {"status": "online", "pid": 2 ** 22 + 1, "host": panel.HOSTNAME}})
+    before = api.get("/api/servers", headers=auth).headers["etag"]
+
+    api.portal.call(panel.process_supervisor._on_elected)
+    listing = api.get("/api/servers", headers={**auth, "If-None-Match": before})
+    assert listing.status_code == 200
+    assert next(s for s in listing.json() if s["id"] == server_id)["status"] == "offline"
+
+
+@pytest.mark.parametrize("lines", [-1, 0, 10 ** 6])
+def test_log_line_counts_are_bounded(api, auth, local_server, lines):
+    for path in ("logs", "logs/stream"):
+        response = api.get(f"/api/servers/{local_server['id']}/{path}", headers=auth, params={"lines": lines})
+        assert response.status_code == 422
@@ -0,0 +1,110 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_crud_and_operators(db):
+    await db.servers.insert_many([
+        {"id": "a", "user_id": "u1", "port": 2001, "status": "online", "tags": ["x"]},
+        {"id": "b", "user_id": "u1", "port": 2002, "status": "offline"},
+        {"id": "c", "user_id": "u2", "port": 2003, "status": "queued"},
+    ])
+    assert await db.servers.count_documents({"user_id": "u1"}) == 2
+    found = await db.servers.find({"status": {"$ne": "queued"}}, {"_id": 0, "id": 1}).sort("port", -1).to_list(None)
+    assert found == [{"id": "b"}, {"id": "a"}]
+    assert (await db.servers.find_one({"id": {"$in": ["c", "z"]}}, {"_id": 0}))["port"] == 2003
+
+    result = await db.servers.update_many({"user_id": "u1"}, {"$inc": {"port": 100}, "$set": {"checked": True}})
+    assert (result.matched_count, result.modified_count) == (2, 2)
+    after = await db.servers.find_one_and_update(
+        {"id": "a"}, {"$push": {"tags": "y"}}, projection={"_id": 0, "tags": 1}, return_document=ReturnDocument.AFTER
+    )
+    assert after == {"tags": ["x", "y"]}
+    assert (await db.servers.delete_many({"checked": True})).deleted_count == 2
+
+
+async def test_unique_indexes(db):
+    await db.users.insert_one({"id": "1", "username": "admin"})
+    with pytest.raises(DuplicateKeyError):
+        await db.users.insert_one({"id": "2", "username": "admin"})
+
+
+async def test_datetimes_round_trip_and_compare(db):
+    now = datetime.now(timezone.utc)
+    await db.sessions.insert_many([
+        {"id": "old", "expires_at": now - timedelta(minutes=1)},
+        {"id": "new", "expires_at": now + timedelta(minutes=1)},
+    ])
+    live = await db.sessions.find_one({"expires_at": {"$gt": now}}, {"_id": 0})
+    assert live["id"] == "new"
+    assert live["expires_at"] == now + timedelta(minutes=1)
+
+
+async def test_writes_that_match_nothing_do_not_take_the_lock(db, tmp_path):
+    await db.jobs.insert_one({"id": "a", "status": "queued"})
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # another worker holds the write lock
+    try:
+        started = time.perf_counter()
+        assert await db.jobs.find_one_and_update({"status": "running"}, {"$set": {"x": 1}}) is None
+        assert (await db.jobs.update_one({"id": "missing"}, {"$set": {"x": 1}})).matched_count == 0
+        assert (await db.jobs.delete_many({"status": "running"})).deleted_count == 0
+        assert await db.jobs.find_one_and_delete({"id": "missing"}) is None
+        assert time.perf_counter() - started < 0.5
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+
+async def test_waiting_for_another_workers_lock_does_not_block_the_loop(db, tmp_path):
+    await db.jobs.insert_one({"id": "a", "status": "queued"})
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.5, lambda: other.execute("COMMIT")).start()
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    claimed = await db.jobs.find_one_and_update(
+        {"status": "queued"}, {"$set": {"status": "running"}}, return_document=ReturnDocument.AFTER
+    )
+    ticker.cancel()
+    other.close()
+    assert claimed["status"] == "running"
+    # The loop kept running while the claim waited ~0.5s for the lock
+    assert ticks >= 10
+    assert db.contended_writes == 1
+
+
+async def test_reads_do_not_wait_behind_a_waiting_write(db, tmp_path):
+    await db.jobs.insert_one({"id": "a", "status": "queued"})
+    other = sqlite3.connect(str(tmp_path / "test.db"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.5, lambda: other.execute("COMMIT")).start()
+
+    claim = asyncio.create_task(db.jobs.find_one_and_update(
+        {"status": "queued"}, {"$set": {"status": "running"}}, return_document=ReturnDocument.AFTER
+    ))
+    await asyncio.sleep(0.1)  # the claim is now waiting for the lock on its thread
+    started = time.perf_counter()
+    assert (await db.jobs.find_one({"id": "a"}))["status"] == "queued"
+    assert await db.jobs.count_documents({"status": "queued"}) == 1
+    assert time.perf_counter() - started < 0.1
+    assert (await claim)["status"] == "running"
+    other.close()
+    # Once committed, the loop's connection sees the write
+    assert (await db.jobs.find_one({"id": "a"}))["status"] == "running"